@@ -1,21 +1,200 @@
+import asyncio
+import hashlib
 import os
+import posixpath
 import re
 import shutil
+import threading
+import uuid
 from collections import defaultdict
-from fastapi import FastAPI, File, Form, UploadFile, Request, Query
-from fastapi.responses import JSONResponse, FileResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, UploadFile, Request, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import Optional, List
-from git import Repo
+from pydantic import BaseModel, Field
+from typing import Callable, Optional, List
+from git import Git, Repo
+from tree_index import TreeIndex, start_watcher
+from dir_listing import DEFAULT_PAGE, DirListing
+from file_batch import BatchError, Journal, PlannedTree, disk_kind
+from commit_index import CommitIndex
+from git_reader import UNSAFE_SPEC_CHARS, GitReaderPool
+from git_trees import MarkdownTrees, diff_trees
+from content_cache import LRUCache, SharedCache
+from coordination import Leader, PathLocks
+from line_diff import compute_hunks, merge3, text_blob_sha
+from text_edits import EditError, apply_edits
+from work_pools import PoolSaturated, WorkPool
+from uploads import COPY_CHUNK, BodySizeLimit, ResumableUploads, UploadTooLarge, save_stream
+from change_events import ChangeHub, RefState, watch_changes
+from collab import CollabRelay, CollabStore, watch_documents
+from file_index import watch_index
+from link_graph import MEDIA_EXTS, LinkGraph, path_mapping, rewrite_links
+from image_store import HashingReader, ImageIndex
+from thumbnails import ThumbnailCache, fit_size
+from sphinx_builds import SphinxBuilder, sphinx_python, watch_builds
+from sphinx_render import RenderError, RenderPool, watch_render_config
+from search_index import SearchIndex
+from working_status import WorkingTreeStatus, watch_status
+import metrics
+from static_files import IMMUTABLE, REVALIDATE, CachedStaticFiles, content_hash, not_modified, serve_file
 
 # ---------------------- CONFIG ----------------------
 DOCS_DIR = "docs"
 BASE_DIR = os.path.abspath("../../" + DOCS_DIR)
 STATIC_FOLDER = "../dist"
-
-app = FastAPI()
+# Upper bound for decoded git blob text kept in memory
+BLOB_CACHE_MAX_BYTES = int(os.environ.get("MYST_BLOB_CACHE_MB", "64")) * 1024 * 1024
+# Upper bound for line-diff hunks kept in memory
+DIFF_CACHE_MAX_BYTES = int(os.environ.get("MYST_DIFF_CACHE_MB", "8")) * 1024 * 1024
+# Upper bound for the Markdown file lists of git trees kept in memory
+TREE_CACHE_MAX_BYTES = int(os.environ.get("MYST_TREE_CACHE_MB", "16")) * 1024 * 1024
+# Upper bound for sorted folder listings kept for /api/list pagination
+LISTING_CACHE_MAX_BYTES = int(os.environ.get("MYST_LISTING_CACHE_MB", "16")) * 1024 * 1024
+# Text of recently opened documents, the base that PATCH /api/file applies edits to
+DOCUMENT_CACHE_MAX_BYTES = int(os.environ.get("MYST_DOCUMENT_CACHE_MB", "32")) * 1024 * 1024
+# Texts of earlier document versions, the merge bases when two editors save the same file
+VERSION_CACHE_MAX_BYTES = int(os.environ.get("MYST_VERSION_CACHE_MB", "32")) * 1024 * 1024
+# Concurrency limits (running, queued) for blocking work kept off the event loop
+GIT_POOL_LIMITS = (int(os.environ.get("MYST_GIT_WORKERS", "4")), int(os.environ.get("MYST_GIT_QUEUE", "32")))
+DISK_POOL_LIMITS = (int(os.environ.get("MYST_DISK_WORKERS", "8")), int(os.environ.get("MYST_DISK_QUEUE", "64")))
+# Image decoding and resizing is CPU-bound, so it gets a pool of its own, sized for the cores it may take
+THUMBNAIL_POOL_LIMITS = (int(os.environ.get("MYST_THUMBNAIL_WORKERS", "2")),
+                         int(os.environ.get("MYST_THUMBNAIL_QUEUE", "64")))
+# Largest single-request upload (/save, /api/upload_image)
+UPLOAD_MAX_BYTES = int(os.environ.get("MYST_UPLOAD_MAX_MB", "50")) * 1024 * 1024
+# Largest asset sent through the chunked /api/upload API, and largest single chunk
+RESUMABLE_MAX_BYTES = int(os.environ.get("MYST_RESUMABLE_MAX_MB", "2048")) * 1024 * 1024
+UPLOAD_CHUNK_MAX_BYTES = 16 * 1024 * 1024
+# Unfinished chunked uploads, kept on the repo's filesystem so finishing one is a rename
+UPLOAD_STAGING_DIR = os.path.abspath("../../.git/myst-editor/uploads")
+UPLOAD_STAGING_TTL = 24 * 60 * 60
+# Entries a batch deletes or overwrites wait here until the whole batch has gone through
+BATCH_TRASH_DIR = os.path.abspath("../../.git/myst-editor/trash")
+# Worker processes (python app.py --workers N); with more than one the content caches are shared
+WORKERS = int(os.environ.get("MYST_WORKERS", "1"))
+# Cross-process write locks and the leader lock
+LOCK_DIR = os.path.abspath("../../.git/myst-editor/locks")
+# How often the leader re-syncs the commit index with the branch heads, ahead of /search-file
+COMMIT_INDEX_REFRESH_SECONDS = 5
+# Documents are edited through the collaboration relay only when this is set (it also needs pycrdt)
+COLLAB_ENABLED = os.environ.get("MYST_COLLAB", "0") == "1"
+# Update logs and snapshots of the documents edited through the collaboration relay
+COLLAB_DB = os.path.abspath("../../.git/myst-editor/collab.sqlite")
+# How often a worker picks up collaborative edits logged by the other workers
+COLLAB_POLL_SECONDS = 0.25
+# Full-text index of the docs served by /api/search
+SEARCH_DB = os.path.abspath("../../.git/myst-editor/search.sqlite")
+# How often the leader re-checks the whole docs folder, on top of the per-file updates
+SEARCH_SYNC_SECONDS = 15 * 60
+# Which document refers to which file, for link rewriting on renames and /api/unused-assets
+LINKS_DB = os.path.abspath("../../.git/myst-editor/links.sqlite")
+# Content hash, size, dimensions and type of every image, for duplicate uploads, free names and listings
+IMAGES_DB = os.path.abspath("../../.git/myst-editor/images.sqlite")
+# Thumbnails for the image picker, by source content hash and size, up to MYST_THUMBNAIL_CACHE_MB in total
+THUMBNAIL_DIR = os.path.abspath("../../.git/myst-editor/thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get("MYST_THUMBNAIL_CACHE_MB", "256")) * 1024 * 1024
+# Background HTML builds, into the same folders as build_sphinx.bat so both reuse one saved environment
+SPHINX_DIR = os.path.abspath("../../sphinx")
+SPHINX_CONF_DIR = os.path.join(SPHINX_DIR, "source")
+SPHINX_OUT_DIR = os.path.abspath("../../pfx_docs_build")
+SPHINX_PYTHON = os.environ.get("MYST_SPHINX_PYTHON") or sphinx_python(SPHINX_DIR)
+SPHINX_AUTOBUILD = os.environ.get("MYST_SPHINX_AUTOBUILD", "1") != "0"
+SPHINX_STATE_DIR = os.path.abspath("../../.git/myst-editor")
+# Sphinx processes kept loaded for /api/render, per server worker; 0 turns rendering off
+RENDER_WORKERS = int(os.environ.get("MYST_RENDER_WORKERS", "1"))
+RENDER_POOL_LIMITS = (max(RENDER_WORKERS, 1), int(os.environ.get("MYST_RENDER_QUEUE", "16")))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("MYST_RENDER_CACHE_MB", "16")) * 1024 * 1024
+
+# In-memory mirror of the docs tree served by /api/tree
+tree_index = TreeIndex(BASE_DIR, [".md"])
+
+# Headings, text, directives and front matter of every document, for /api/search
+search_index = SearchIndex(SEARCH_DB, BASE_DIR)
+
+# Links, images, includes and toctree entries of every document, both ways
+link_graph = LinkGraph(LINKS_DB, BASE_DIR)
+
+# Images by content hash and by folder
+image_index = ImageIndex(IMAGES_DB, BASE_DIR)
+
+thumbnail_cache = ThumbnailCache(THUMBNAIL_DIR, THUMBNAIL_CACHE_MAX_BYTES)
+
+# One folder level at a time for the image picker and other on-demand views
+dir_listing = DirListing(LISTING_CACHE_MAX_BYTES)
+
+# full path -> (mtime_ns, size, text, version); an entry only counts while the file's stat still matches
+document_cache = LRUCache(DOCUMENT_CACHE_MAX_BYTES)
+
+# Pushes file, tree and git ref changes to every open editor over /api/events
+change_hub = ChangeHub()
+
+# Blocking git and filesystem work runs here, never on the event loop
+git_pool = WorkPool("git", *GIT_POOL_LIMITS)
+disk_pool = WorkPool("disk", *DISK_POOL_LIMITS)
+thumbnail_pool = WorkPool("thumbnail", *THUMBNAIL_POOL_LIMITS)
+render_pool = WorkPool("render", *RENDER_POOL_LIMITS)
+
+resumable_uploads = ResumableUploads(UPLOAD_STAGING_DIR, RESUMABLE_MAX_BYTES, UPLOAD_STAGING_TTL)
+
+# Writes to the same path are serialized across threads and worker processes
+path_locks = PathLocks(LOCK_DIR)
+
+# One worker runs the background index and cleanup work for all of them
+leader = Leader(os.path.join(LOCK_DIR, "leader.lock"))
+
+# Debounced incremental Sphinx builds of the docs, run by the leader
+sphinx_builder = SphinxBuilder(SPHINX_PYTHON, SPHINX_DIR, SPHINX_CONF_DIR, BASE_DIR, SPHINX_OUT_DIR,
+                               SPHINX_STATE_DIR, lambda: leader.is_leader, enabled=SPHINX_AUTOBUILD)
+
+# Loaded Sphinx processes rendering single documents for /api/render, seeded with the build's environment
+sphinx_renderer = RenderPool(SPHINX_PYTHON, SPHINX_DIR, SPHINX_CONF_DIR, BASE_DIR,
+                             os.path.join(SPHINX_OUT_DIR, ".doctrees", "environment.pickle"), RENDER_WORKERS,
+                             os.path.join(SPHINX_STATE_DIR, "render-worker.log"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tree_index.rebuild()
+    ref_state.update()
+    change_hub.bind(asyncio.get_running_loop(), lambda: {
+        "type": "hello", **ref_state.snapshot(), "tree_etag": tree_index.etag,
+    })
+    tree_watcher = start_watcher(tree_index)
+    watch_changes(tree_watcher, change_hub, tree_index, ref_state)
+    watch_status(tree_watcher, working_status)
+    watch_index(tree_watcher, search_index, lambda: leader.is_leader)
+    watch_index(tree_watcher, link_graph, lambda: leader.is_leader)
+    watch_index(tree_watcher, image_index, lambda: leader.is_leader)
+    collab_relay.bind(asyncio.get_running_loop())
+    watch_documents(tree_watcher, collab_relay, BASE_DIR)
+    watch_builds(tree_watcher, sphinx_builder)
+    watch_render_config(tree_watcher, sphinx_renderer)
+    leader.every(COMMIT_INDEX_REFRESH_SECONDS, commit_index.refresh)
+    leader.every(60 * 60, resumable_uploads.expire)
+    leader.every(60 * 60, prune_collab_rooms)
+    leader.every(SEARCH_SYNC_SECONDS, search_index.sync)
+    leader.every(SEARCH_SYNC_SECONDS, link_graph.sync)
+    leader.every(SEARCH_SYNC_SECONDS, image_index.sync)
+    leader.every(10 * 60, thumbnail_cache.evict)
+    leader.start()
+    sphinx_builder.start()
+    sphinx_renderer.start()
+    yield
+    await collab_relay.close()
+    sphinx_builder.stop()
+    sphinx_renderer.close()
+    leader.stop()
+    tree_watcher.stop()
+    tree_watcher.join()
+    git_pool.shutdown()
+    thumbnail_pool.shutdown()
+    render_pool.shutdown()
+    disk_pool.shutdown()
+    git_reader.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,6 +204,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-route latency, status counts and the opt-in Server-Timing breakdown (X-Myst-Profile header)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Multipart framing adds a little on top of the file itself
+app.add_middleware(BodySizeLimit, limits={
+    "/save": UPLOAD_MAX_BYTES + 64 * 1024,
+    "/api/upload_image": UPLOAD_MAX_BYTES + 64 * 1024,
+    "/api/upload/": UPLOAD_CHUNK_MAX_BYTES,
+})
+
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse({"error": f"Server busy ({exc.pool}), retry later", "retry_after": exc.retry_after},
+                        status_code=503, headers={"Retry-After": str(exc.retry_after)})
+
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large_handler(request: Request, exc: UploadTooLarge):
+    return JSONResponse({"error": exc.detail}, status_code=413)
+
 
 # ---------------------- MODELS ----------------------
 class PathModel(BaseModel):
@@ -36,6 +236,7 @@ class RenameModel(BaseModel):
     oldPath: str
     newPath: str
     action: str = "check"  # "check" | "overwrite" | "increment"
+    updateLinks: bool = True  # rewrite the documents referring to the moved path
 
 
 # ---------------------- HELPERS ----------------------
@@ -65,18 +266,19 @@ def safe_join(base: str, *paths) -> str:
 
 def scan_dir(path: str, base: str, ext_filter: Optional[List[str]] = None):
     entries = []
-    for entry in os.listdir(path):
-        full_path = os.path.join(path, entry)
-        rel_path = os.path.relpath(full_path, base).replace("\\", "/")
-        if os.path.isdir(full_path):
-            entries.append({
-                "type": "folder",
-                "name": entry,
-                "path": rel_path,
-                "children": scan_dir(full_path, base, ext_filter)
-            })
-        elif not ext_filter or os.path.splitext(entry)[1].lower() in ext_filter:
-            entries.append({"type": "file", "name": entry, "path": rel_path})
+    # scandir reports the entry type itself, saving a stat per entry
+    with os.scandir(path) as it:
+        for entry in it:
+            rel_path = os.path.relpath(entry.path, base).replace("\\", "/")
+            if entry.is_dir():
+                entries.append({
+                    "type": "folder",
+                    "name": entry.name,
+                    "path": rel_path,
+                    "children": scan_dir(entry.path, base, ext_filter)
+                })
+            elif not ext_filter or os.path.splitext(entry.name)[1].lower() in ext_filter:
+                entries.append({"type": "file", "name": entry.name, "path": rel_path})
     return entries
 
 
@@ -86,7 +288,7 @@ def sanitize_filename(filename):
     return f"{name}{ext}"
 
 
-def increment_filename(path, filename):
+def increment_filename(path, filename, exists=os.path.exists):
     name, ext = os.path.splitext(filename)
     match = re.search(r"(.*?)(\d+)$", name)
     if match:
@@ -97,28 +299,358 @@ def increment_filename(path, filename):
         prefix, i, width = name + "_", 1, 4
     while True:
         new_name = f"{prefix}{i:0{width}d}{ext}"
-        if not os.path.exists(os.path.join(path, new_name)):
+        if not exists(os.path.join(path, new_name)):
             return new_name
         i += 1
 
+
+def free_filename(path, filename):
+    """
+    ``increment_filename`` for a folder on disk. For images the taken names come from the
+    image index, so only the name picked is probed.
+    """
+    if not image_index.accepts(filename):
+        return increment_filename(path, filename)
+    folder = os.path.relpath(path, BASE_DIR).replace("\\", "/")
+    taken = image_index.names("" if folder == "." else folder)
+    while True:
+        new_name = increment_filename(path, filename, lambda p: os.path.basename(p) in taken)
+        # The index can lag behind a change made outside the editor
+        if not os.path.exists(os.path.join(path, new_name)):
+            return new_name
+        taken.add(new_name)
+
+
+def path_changed(full_path: str):
+    """Apply a change made by this server to the in-memory indexes right away, ahead of the watcher."""
+    tree_index.refresh(full_path)
+    working_status.mark(full_path)
+    search_index.update(full_path)
+    link_graph.update(full_path)
+    image_index.update(full_path)
+    sphinx_builder.notify(full_path)
+
+
+def read_document_version(full_path: str):
+    """Text, version (git blob sha of the text) and stat of a document, from the cache while the file is unchanged."""
+    with open(full_path, "r", encoding="utf-8") as f:
+        st = os.fstat(f.fileno())
+        cached = document_cache.get(full_path)
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return cached[2], cached[3], st
+        text = f.read()
+    metrics.file_bytes("read", "/api/file", st.st_size)
+    return text, remember_document(full_path, text, st), st
+
+
+def remember_document(full_path: str, text: str, st: os.stat_result) -> str:
+    version = text_blob_sha(text)
+    document_cache.put(full_path, (st.st_mtime_ns, st.st_size, text, version), st.st_size)
+    version_cache.put(version, text, st.st_size)
+    return version
+
+
+def version_text(version: str) -> Optional[str]:
+    """Text of an earlier version, remembered by a worker or committed to git (versions are blob shas)."""
+    text = version_cache.get(version)
+    if text is None:
+        blob = git_reader.read(version) if re.fullmatch(r"[0-9a-f]{40}", version) else None
+        if blob is not None and blob[1] == "blob":
+            text = blob[2].decode("utf-8", errors="replace")
+    return text
+
+
+def write_text_atomic(full_path: str, text: str):
+    """Write through a temporary file that is renamed into place, so a crash never leaves a truncated document."""
+    folder, name = os.path.split(full_path)
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        with open(tmp_path, "x", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(full_path):
+            shutil.copymode(full_path, tmp_path)
+        os.replace(tmp_path, full_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_document(full_path: str, base: Optional[str], edit: Callable[[Optional[str]], str], route: str):
+    """
+    Conditional save. ``edit`` turns the text the client started from into the text to save.
+    With no ``base`` the file is overwritten. When ``base`` is no longer the file's version,
+    the client's change is merged three-way with what was saved meanwhile; only a merge with
+    conflicts (or a deleted file, or an unknown base) is refused, with 409.
+    """
+    with path_locks.hold(full_path):
+        try:
+            current, version, st = read_document_version(full_path)
+        except FileNotFoundError:
+            current = version = st = None
+        merged = False
+        if base is None or base == version:
+            text = edit(current)
+        else:
+            base_text = version_text(base) if current is not None else None
+            if base_text is None:
+                error = "File not found" if current is None else "File changed since the base version"
+                return JSONResponse({"error": error, "version": version,
+                                     "last_modified": st and int(st.st_mtime * 1000),
+                                     "content": current, "merged": None, "conflicts": None}, status_code=409)
+            text, conflicts = merge3(base_text, edit(base_text), current)
+            if conflicts:
+                return JSONResponse({"error": "Conflicting changes", "version": version,
+                                     "last_modified": int(st.st_mtime * 1000),
+                                     "content": current, "merged": text, "conflicts": conflicts}, status_code=409)
+            merged = True
+        write_text_atomic(full_path, text)
+        st = os.stat(full_path)
+        version = remember_document(full_path, text, st)
+    path_changed(full_path)
+    metrics.file_bytes("written", route, st.st_size)
+    result = {"status": "merged" if merged else "saved", "last_modified": int(st.st_mtime * 1000), "version": version}
+    if merged:
+        result["content"] = text
+    return result
+
+
+def if_match_version(request: Request) -> Optional[str]:
+    """Version named by an ``If-Match`` header (a quoted or bare content version), None if absent or ``*``."""
+    value = request.headers.get("if-match", "").strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    return value if value and value != "*" else None
+
 # ---------------------- ROUTES ----------------------
 
 
 @app.get("/api/tree")
-async def get_file_tree():
-    return scan_dir(BASE_DIR, BASE_DIR, [".md"])
+async def get_file_tree(request: Request):
+    etag, body = tree_index.snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/events")
+async def change_events(request: Request):
+    """
+    Server-sent events: a "hello" with HEAD and the tree etag, then file-modified,
+    tree-changed, head-moved and branch-updated as they happen. Replaces polling
+    /api/file/meta and /api/git-head.
+    """
+    return StreamingResponse(change_hub.stream(request), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/api/search")
+@disk_pool.offload
+def search_docs(q: str = "", limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    """
+    Ranked full-text search over the docs: every word must match, as a whole word or a
+    prefix. Titles and headings weigh more than body text. Each result has a snippet,
+    HTML-escaped with the matches in ``<mark>``.
+    """
+    return search_index.search(q, limit, offset)
+
+
+def docs_folder(path: str) -> str:
+    """Docs-relative form of a folder or file path from a query, "" for the docs root."""
+    rel = os.path.relpath(safe_join(BASE_DIR, path), BASE_DIR).replace("\\", "/")
+    return "" if rel == "." else rel
+
+
+@app.get("/api/references")
+@disk_pool.offload
+def get_references(path: str):
+    """What a document links to (with whether each target exists), and which documents link to ``path``."""
+    try:
+        rel = docs_folder(path)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    return {"path": rel, "targets": link_graph.targets(rel), "referrers": link_graph.referrers(rel)}
+
+
+@app.get("/api/unused-assets")
+@disk_pool.offload
+def unused_assets(folder: str = "", ext: Optional[List[str]] = Query(None)):
+    """
+    Files below ``folder`` that no document links to, embeds or includes, answered from
+    the link graph. Images and other media by default; ``ext`` picks other extensions.
+    """
+    try:
+        rel = docs_folder(folder)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    exts = {e.lower() if e.startswith(".") else "." + e.lower() for e in ext} if ext else MEDIA_EXTS
+    return {"folder": rel, "assets": link_graph.unused(rel, exts)}
+
+
+# ---------------------- SPHINX BUILDS AND PREVIEW ----------------------
+@app.get("/api/build-status")
+@disk_pool.offload
+def build_status():
+    """
+    State of the background Sphinx build: idle, waiting for changes to settle, or building;
+    the changes waiting for the next build; and the timing, document counts and warnings
+    of the last one.
+    """
+    return sphinx_builder.status()
+
+
+class BuildRequest(BaseModel):
+    full: bool = False
+
+
+@app.post("/api/build")
+@disk_pool.offload
+def request_build(req: Optional[BuildRequest] = None):
+    """Start a build now instead of after the debounce delay; ``full`` rebuilds from a fresh environment."""
+    if not sphinx_builder.available:
+        return JSONResponse({"error": "Sphinx is not installed"}, status_code=503)
+    sphinx_builder.request(full=req.full if req else False)
+    return {"status": "requested"}
+
+
+class RenderRequest(BaseModel):
+    path: str
+    content: Optional[str] = None
+
+
+@app.post("/api/render")
+async def render_document(req: RenderRequest):
+    """
+    HTML body of one document as the Sphinx build would render it, with the project's
+    configuration, in milliseconds: the text is handed to a render worker with Sphinx
+    already loaded. ``content`` renders unsaved text in place of the file's. Results are
+    cached by the configuration and the document's path and text.
+    """
+    try:
+        full_path = safe_join(BASE_DIR, req.path)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    rel, ext = posixpath.splitext(os.path.relpath(full_path, BASE_DIR).replace("\\", "/"))
+    if ext not in (".md", ".rst"):
+        return JSONResponse({"error": "Not a document"}, status_code=400)
+    if not sphinx_renderer.available:
+        return JSONResponse({"error": "Sphinx is not installed"}, status_code=503)
+    # Sphinx reads the file before the posted text replaces it, so it must exist either way
+    text = await disk_pool.run(read_document, rel + ext)
+    if text is None:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+    if req.content is not None:
+        text = req.content
+    stamp = await disk_pool.run(sphinx_renderer.stamp)
+    key = hashlib.sha256(f"{stamp}\0{rel}\0{text}".encode("utf-8")).hexdigest()
+    result = await disk_pool.run(render_cache.get, key)
+    cached = result is not None
+    if result is None:
+        try:
+            result = await render_pool.run(sphinx_renderer.render, rel, text)
+        except RenderError as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+        if "error" in result:
+            return JSONResponse({"error": result["error"]}, status_code=422)
+        await disk_pool.run(render_cache.put, key, result, len(result["html"]) + sum(map(len, result["warnings"])))
+    return {"path": rel + ext, "hash": key, "cached": cached, "html": result["html"], "title": result["title"],
+            "warnings": result["warnings"], "ms": result["ms"]}
+
+
+# ---------------------- COLLABORATION ----------------------
+def read_document(rel: str) -> Optional[str]:
+    try:
+        with open(safe_join(BASE_DIR, rel), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_document(rel: str, text: str):
+    """Write a collaboratively edited document back to docs/, unless it already has that content."""
+    full_path = safe_join(BASE_DIR, rel)
+    with path_locks.hold(full_path):
+        if read_document(rel) == text:
+            return
+        write_text_atomic(full_path, text)
+    path_changed(full_path)
+    metrics.file_bytes("written", "/api/collab", len(text.encode("utf-8")))
+
+
+def prune_collab_rooms():
+    collab_store.prune(lambda rel: os.path.isfile(safe_join(BASE_DIR, rel)))
+
+
+collab_store = CollabStore(COLLAB_DB)
+collab_relay = CollabRelay(collab_store, read_document, write_document,
+                           poll_seconds=COLLAB_POLL_SECONDS if WORKERS > 1 else None)
+
+
+def collab_enabled() -> bool:
+    return COLLAB_ENABLED and CollabRelay.available()
+
+
+@app.get("/api/collab-status")
+async def collab_status():
+    """Whether the collaboration relay serves rooms (MYST_COLLAB=1 and the pycrdt package)."""
+    return {"enabled": collab_enabled(), **collab_relay.stats()}
+
+
+@app.post("/api/collab-save")
+async def collab_save(req: PathModel):
+    """
+    Manual save of a document open in collaborative mode: the room's edits are written to the
+    file now instead of after the quiet period. The editor's own text never replaces the file,
+    as it may lack the edits of the others in the room.
+    """
+    if not collab_enabled():
+        return JSONResponse({"error": "Collaboration is not enabled"}, status_code=404)
+    try:
+        room = normalize_relative_path(req.path)
+        safe_join(BASE_DIR, room)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    # With several workers the room may live in another one, which writes it on its own schedule
+    return {"status": "saved" if await collab_relay.flush(room) else "not-open"}
+
+
+@app.websocket("/api/collab/{room:path}")
+async def collab_socket(websocket: WebSocket, room: str):
+    """
+    y-websocket endpoint: the room is the Markdown file's path below the docs folder.
+    Edits are relayed to the room's other clients and written back to the file.
+    """
+    try:
+        room = normalize_relative_path(room)
+        safe_join(BASE_DIR, room)
+    except ValueError:
+        room = ""
+    await websocket.accept()
+    if not collab_enabled() or not room.endswith(".md"):
+        await websocket.close(code=1008 if collab_enabled() else 1011)
+        return
+    try:
+        await collab_relay.serve(websocket, room)
+    except WebSocketDisconnect:
+        pass
 
 
 @app.get("/api/file")
-async def get_file(path: str):
+@disk_pool.offload
+def get_file(path: str):
     try:
         full_path = safe_join(BASE_DIR, path)
-        mtime = os.path.getmtime(full_path)  # seconds since epoch
-        with open(full_path, "r", encoding="utf-8") as f:
-            return {
-                "content": f.read(),
-                "last_modified": int(mtime * 1000)  # ms
-            }
+        content, version, st = read_document_version(full_path)
+        return {
+            "content": content,
+            "last_modified": int(st.st_mtime * 1000),  # ms
+            "version": version,
+        }
     except FileNotFoundError:
         return JSONResponse({"error": "File not found"}, status_code=404)
     except ValueError:
@@ -126,7 +658,8 @@ async def get_file(path: str):
 
 
 @app.get("/api/file/meta")
-async def get_file_meta(path: str):
+@disk_pool.offload
+def get_file_meta(path: str):
     try:
         full_path = safe_join(BASE_DIR, path)
         mtime = os.path.getmtime(full_path)
@@ -139,38 +672,108 @@ async def get_file_meta(path: str):
 
 @app.post("/api/file")
 async def save_file(path: str, request: Request):
+    """
+    Full-body save. With ``If-Match: "<version>"`` the save is conditional: a file changed
+    since that version is merged with the new content, and conflicts are refused with 409.
+    """
     try:
         full_path = safe_join(BASE_DIR, path)
     except ValueError:
         return JSONResponse({"error": "Invalid path"}, status_code=400)
     data = await request.json()
     content = data.get("content", "")
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    with open(full_path, "w", encoding="utf-8") as f:
-        f.write(content)
-    mtime = os.path.getmtime(full_path)
-    return {
-        "status": "saved",
-        "last_modified": int(mtime * 1000)
-    }
+    return await disk_pool.run(save_document, full_path, if_match_version(request), lambda _: content, "/api/file")
+
+
+class TextEdit(BaseModel):
+    from_: int = Field(alias="from")
+    to: int
+    insert: str = ""
+
+
+class PatchRequest(BaseModel):
+    base: str  # "version" from the last load or save
+    edits: List[TextEdit]
+
+
+@app.patch("/api/file")
+@disk_pool.offload
+def patch_file(path: str, req: PatchRequest):
+    """
+    Delta save: apply ``edits`` (CodeMirror offsets into the ``base`` version) to the
+    server's copy. If the file changed since ``base`` the edits are merged with that
+    change, as for a conditional POST.
+    """
+    try:
+        full_path = safe_join(BASE_DIR, path)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    edits = [(edit.from_, edit.to, edit.insert) for edit in req.edits]
+    try:
+        return save_document(full_path, req.base, lambda text: apply_edits(text, edits), "/api/file")
+    except EditError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
 
 @app.get("/api/images_in_folder")
-async def images_in_folder(folder: str = ""):
+@disk_pool.offload
+def images_in_folder(folder: str = ""):
+    """
+    Images below ``_static/<folder>`` as a tree like ``scan_dir``'s, paths relative to
+    ``_static``, from the image index. Each image carries its hash, size, dimensions, type
+    and the number of documents referring to it; folders without images are left out.
+    """
     try:
         folder = normalize_relative_path(folder)
     except ValueError:
         return []
-    static_dir = os.path.join(BASE_DIR, "_static")
-    folder_path = os.path.join(static_dir, folder)
-    if not os.path.isdir(folder_path):
-        return []
-    allowed_exts = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg"}
-    return scan_dir(folder_path, static_dir, allowed_exts)
+    folder = "" if folder == "." else folder
+    static_rel = f"_static/{folder}" if folder else "_static"
+    referrers = link_graph.referrer_counts(static_rel)
+    # Folders of the listing by path relative to _static, the one asked for standing for the root
+    folders = {folder: {"children": []}}
+    for image in image_index.listing(static_rel):
+        rel_path = image["path"][len("_static/"):]
+        parent = posixpath.dirname(rel_path)
+        missing = []
+        while parent not in folders:
+            missing.append(parent)
+            parent = posixpath.dirname(parent)
+        for folder_path in reversed(missing):
+            folders[folder_path] = {"type": "folder", "name": posixpath.basename(folder_path), "path": folder_path,
+                                    "children": []}
+            folders[posixpath.dirname(folder_path)]["children"].append(folders[folder_path])
+        folders[posixpath.dirname(rel_path)]["children"].append({
+            "type": "file", "name": posixpath.basename(rel_path), "path": rel_path,
+            **{key: image[key] for key in ("hash", "size", "width", "height", "mime")},
+            "referrers": referrers.get(image["path"], 0),
+        })
+    return folders[folder]["children"]
+
+
+@app.get("/api/list")
+@disk_pool.offload
+def list_folder(path: str = "", cursor: Optional[str] = None, limit: int = DEFAULT_PAGE,
+                kind: Optional[str] = None, ext: Optional[List[str]] = Query(None)):
+    """
+    One level of a folder below the docs root, folders first (with their child counts),
+    then files, ``limit`` entries at a time. Pass ``next_cursor`` back as ``cursor`` for
+    the next page. ``kind`` ("folder" / "file") and ``ext`` narrow the entries.
+    """
+    try:
+        full_path = safe_join(BASE_DIR, path)
+        rel = os.path.relpath(full_path, BASE_DIR).replace("\\", "/")
+        ext_filter = {e.lower() if e.startswith(".") else "." + e.lower() for e in ext} if ext else None
+        return dir_listing.page(BASE_DIR, "" if rel == "." else rel, cursor, limit, kind, ext_filter)
+    except (FileNotFoundError, NotADirectoryError):
+        return JSONResponse({"error": "Folder not found"}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
 
 
 @app.post("/api/create")
-async def create_file_or_folder(data: PathModel):
+@disk_pool.offload
+def create_file_or_folder(data: PathModel):
     try:
         full_path = safe_join(BASE_DIR, data.path)
     except ValueError:
@@ -180,110 +783,352 @@ async def create_file_or_folder(data: PathModel):
     elif data.type == "file":
         os.makedirs(os.path.dirname(full_path), exist_ok=True)
         open(full_path, "w", encoding="utf-8").close()
+    path_changed(full_path)
     return {"status": "created", "path": data.path}
 
 
 @app.post("/api/delete")
-async def delete_path(data: PathModel):
+@disk_pool.offload
+def delete_path(data: PathModel):
     try:
         full_path = safe_join(BASE_DIR, data.path)
     except ValueError:
         return JSONResponse({"error": "Invalid path"}, status_code=400)
-    if not os.path.exists(full_path):
-        return JSONResponse({"error": "File or folder does not exist"}, status_code=404)
-    if os.path.isfile(full_path):
-        os.remove(full_path)
-    else:
-        shutil.rmtree(full_path)
+    with path_locks.hold(full_path):
+        if not os.path.exists(full_path):
+            return JSONResponse({"error": "File or folder does not exist"}, status_code=404)
+        if os.path.isfile(full_path):
+            os.remove(full_path)
+        else:
+            shutil.rmtree(full_path)
+    path_changed(full_path)
     return {"status": "deleted", "path": data.path}
 
 
 # ------------------------------ COLLISION HANDLER ------------------------------
 def handle_collision(base_dir, old_path=None, file: UploadFile = None,
-                     new_path=None, action="check", move_file=False):
+                     new_path=None, action="check", move_file=False, staged_path=None):
+    def store(dest):
+        # Uploads land atomically: streamed to a temp file, or a fully staged file renamed in
+        if staged_path:
+            os.replace(staged_path, dest)
+        else:
+            metrics.file_bytes("written", "/api/upload_image", save_stream(file.file, dest, UPLOAD_MAX_BYTES))
+
     try:
         new_full_path = safe_join(base_dir, new_path)
         os.makedirs(os.path.dirname(new_full_path), exist_ok=True)
 
-        if action == "check":
-            if os.path.exists(new_full_path):
-                return JSONResponse({"collision": True}, status_code=409)
-            if move_file:
-                old_full_path = safe_join(base_dir, old_path)
-                if not os.path.exists(old_full_path):
-                    return JSONResponse({"error": "Source does not exist"}, status_code=404)
-                os.rename(old_full_path, new_full_path)
-            else:
-                with open(new_full_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
-            return {"status": "saved", "newPath": new_path}
-
-        elif action == "overwrite":
-            old_full_path = safe_join(base_dir, old_path)
-
-            # If source and destination are the same file → do nothing
-            if os.path.abspath(old_full_path) == os.path.abspath(new_full_path):
-                return {"status": "no_change", "newPath": new_path}
-
-            # If destination exists → delete it first
-            if os.path.exists(new_full_path):
-                os.remove(new_full_path)
-
-            # Move or copy
-            if move_file:
-                os.rename(old_full_path, new_full_path)
-            else:
-                with open(new_full_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
-
-            return {"status": "saved", "newPath": new_path}
-
-        elif action == "increment":
-            dir_path = os.path.dirname(new_full_path)
-            filename = os.path.basename(new_full_path)
-            new_name = increment_filename(dir_path, filename)
-            final_path = os.path.join(dir_path, new_name)
-            if move_file:
-                old_full_path = safe_join(base_dir, old_path)
-                os.rename(old_full_path, final_path)
-            else:
-                with open(final_path, "wb") as f:
-                    shutil.copyfileobj(file.file, f)
-            rel_path = os.path.relpath(final_path, base_dir).replace("\\", "/")
-            return {"status": "saved", "newPath": rel_path}
-
-        return JSONResponse({"error": "Invalid action"}, status_code=400)
-
+        old_full_path = safe_join(base_dir, old_path) if move_file else None
+
+        # Both ends of a move are locked, so a concurrent save or upload cannot land in between
+        with path_locks.hold(new_full_path, old_full_path):
+            if action == "check":
+                if os.path.exists(new_full_path):
+                    return JSONResponse({"collision": True}, status_code=409)
+                if move_file:
+                    if not os.path.exists(old_full_path):
+                        return JSONResponse({"error": "Source does not exist"}, status_code=404)
+                    os.rename(old_full_path, new_full_path)
+                    path_changed(old_full_path)
+                else:
+                    store(new_full_path)
+                path_changed(new_full_path)
+                return {"status": "saved", "newPath": new_path}
+
+            elif action == "overwrite":
+                if move_file:
+                    # If source and destination are the same file → do nothing
+                    if os.path.abspath(old_full_path) == os.path.abspath(new_full_path):
+                        return {"status": "no_change", "newPath": new_path}
+
+                # If destination exists → delete it first
+                if os.path.exists(new_full_path):
+                    os.remove(new_full_path)
+
+                # Move or copy
+                if move_file:
+                    os.rename(old_full_path, new_full_path)
+                    path_changed(old_full_path)
+                else:
+                    store(new_full_path)
+                path_changed(new_full_path)
+
+                return {"status": "saved", "newPath": new_path}
+
+            elif action == "increment":
+                dir_path = os.path.dirname(new_full_path)
+                filename = os.path.basename(new_full_path)
+                new_name = free_filename(dir_path, filename)
+                final_path = os.path.join(dir_path, new_name)
+                if move_file:
+                    os.rename(old_full_path, final_path)
+                    path_changed(old_full_path)
+                else:
+                    store(final_path)
+                path_changed(final_path)
+                rel_path = os.path.relpath(final_path, base_dir).replace("\\", "/")
+                return {"status": "saved", "newPath": rel_path}
+
+            return JSONResponse({"error": "Invalid action"}, status_code=400)
+
+    except UploadTooLarge as e:
+        return JSONResponse({"error": e.detail}, status_code=413)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return JSONResponse({"error": f"Internal Server Error: {str(e)}"}, status_code=500)
 
 
+def update_references(affected: List[str], moves: List[tuple]) -> List[str]:
+    """
+    Rewrite the documents ``affected`` by ``moves`` ((old, new) docs-relative paths, in
+    order) so that their links point where the targets went. Each document is read where
+    it is now, after the moves. Returns the rewritten documents.
+    """
+    mapping = path_mapping(moves)
+    updated = []
+    for doc_old in affected:
+        doc_new = mapping(doc_old)
+        full_path = os.path.join(BASE_DIR, doc_new)
+        with path_locks.hold(full_path):
+            try:
+                text, _, _ = read_document_version(full_path)
+            except (FileNotFoundError, UnicodeDecodeError):
+                continue  # deleted along the way, or not text
+            new_text = rewrite_links(text, doc_old, doc_new, mapping)
+            if new_text == text:
+                continue
+            write_text_atomic(full_path, new_text)
+            st = os.stat(full_path)
+            remember_document(full_path, new_text, st)
+        path_changed(full_path)
+        metrics.file_bytes("written", "link-rewrite", st.st_size)
+        updated.append(doc_new)
+    return updated
+
+
 @app.post("/api/rename")
-async def rename_path(data: RenameModel):
+@disk_pool.offload
+def rename_path(data: RenameModel):
+    """
+    Rename or move a file or folder. Unless ``updateLinks`` is false, the documents that
+    link to it (found in the link graph) and the documents moved along are rewritten to
+    match; they are listed in ``updatedLinks``.
+    """
     try:
         # Normalize input paths
         old_path_clean = data.oldPath.lstrip("/").replace("\\", "/")
         new_path_clean = data.newPath.lstrip("/").replace("\\", "/")
 
-        return handle_collision(
+        # Taken before the move, while the graph still has the old paths
+        affected = link_graph.affected([normalize_relative_path(old_path_clean)]) if data.updateLinks else []
+        result = handle_collision(
             base_dir=BASE_DIR,
             old_path=old_path_clean,
             new_path=new_path_clean,
             action=data.action,
             move_file=True
         )
+        if isinstance(result, dict) and result["status"] == "saved":
+            moves = [(normalize_relative_path(old_path_clean), normalize_relative_path(result["newPath"]))]
+            result["updatedLinks"] = update_references(affected, moves)
+        return result
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+# ---------------------- BATCH FILE OPERATIONS ----------------------
+class BatchOperation(BaseModel):
+    op: str  # "create" | "rename" | "move" | "delete"
+    path: Optional[str] = None  # create, delete
+    type: Optional[str] = None  # create: "file" | "folder"
+    oldPath: Optional[str] = None  # rename, move
+    newPath: Optional[str] = None
+    action: str = "check"  # "check" | "overwrite" | "increment", as for /api/rename
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    updateLinks: bool = True  # rewrite the documents referring to moved paths, as /api/rename does
+
+
+def batch_path(path: Optional[str]) -> str:
+    full_path = safe_join(BASE_DIR, path or "")
+    if full_path == BASE_DIR:
+        raise BatchError("Invalid path", 400)
+    return full_path
+
+
+def plan_destination(planned: PlannedTree, full_path: str, action: str):
+    """Where an entry meant for ``full_path`` goes, and whether something there is overwritten."""
+    if action not in ("check", "overwrite", "increment"):
+        raise BatchError("Invalid action", 400)
+    if not planned.exists(full_path):
+        return full_path, False
+    if action == "check":
+        raise BatchError("Destination exists", 409, collision=True)
+    if action == "overwrite":
+        return full_path, True
+    folder = os.path.dirname(full_path)
+    return os.path.join(folder, increment_filename(folder, os.path.basename(full_path), planned.exists)), False
+
+
+def plan_batch(planned: PlannedTree, op: BatchOperation):
+    """Check one operation against the tree the earlier ones leave; returns its step and result."""
+    rel = lambda full_path: os.path.relpath(full_path, BASE_DIR).replace("\\", "/")
+    if op.op == "delete":
+        full_path = batch_path(op.path)
+        if not planned.exists(full_path):
+            raise BatchError("File or folder does not exist", 404)
+        planned.delete(full_path)
+        return ("delete", full_path), {"op": op.op, "path": rel(full_path)}
+
+    if op.op == "create":
+        if op.type not in ("file", "folder"):
+            raise BatchError("Invalid type", 400)
+        full_path, overwrite = plan_destination(planned, batch_path(op.path), op.action)
+        planned.create(full_path, op.type)
+        return ("create", full_path, op.type, overwrite), {"op": op.op, "path": rel(full_path)}
+
+    if op.op in ("rename", "move"):
+        old_full_path, new_full_path = batch_path(op.oldPath), batch_path(op.newPath)
+        if not planned.exists(old_full_path):
+            raise BatchError("Source does not exist", 404)
+        if old_full_path == new_full_path and op.action == "overwrite":
+            return None, {"op": op.op, "oldPath": rel(old_full_path), "newPath": rel(new_full_path), "status": "no_change"}
+        if (new_full_path.startswith(old_full_path + os.sep) or old_full_path.startswith(new_full_path + os.sep)):
+            raise BatchError("Cannot move a folder into itself or onto a parent folder", 400)
+        new_full_path, overwrite = plan_destination(planned, new_full_path, op.action)
+        planned.move(old_full_path, new_full_path)
+        return ("move", old_full_path, new_full_path, overwrite), \
+            {"op": op.op, "oldPath": rel(old_full_path), "newPath": rel(new_full_path)}
+
+    raise BatchError("Invalid operation", 400)
+
+
+def apply_batch_step(journal: Journal, step: tuple):
+    if step[0] == "delete":
+        journal.park(step[1])
+    elif step[0] == "create":
+        _, full_path, kind, overwrite = step
+        if overwrite:
+            journal.park(full_path)
+        journal.create(full_path, kind)
+    else:
+        _, old_full_path, new_full_path, overwrite = step
+        if overwrite:
+            journal.park(new_full_path)
+        journal.move(old_full_path, new_full_path)
+
+
+def tree_delta(before: dict, replaced: set) -> dict:
+    """Entries added and removed at the given paths; what is below an added or removed folder is implied."""
+    added, removed = [], []
+    for path in sorted(before):
+        kind_before, kind_after = before[path], disk_kind(path)
+        if kind_before == kind_after and path not in replaced:
+            continue
+        rel = os.path.relpath(path, BASE_DIR).replace("\\", "/")
+        if kind_before:
+            removed.append({"path": rel, "type": kind_before})
+        if kind_after:
+            added.append({"path": rel, "type": kind_after})
+
+    def outermost(entries):
+        paths = {entry["path"] for entry in entries}
+        return [entry for entry in entries
+                if not any(entry["path"].startswith(other + "/") for other in paths)]
+    return {"etag": tree_index.etag, "added": outermost(added), "removed": outermost(removed)}
+
+
+@app.post("/api/batch")
+@disk_pool.offload
+def batch_operations(req: BatchRequest):
+    """
+    Apply an ordered list of create, rename/move and delete operations as one unit.
+    The whole plan is checked first (409 with ``collision`` like /api/rename, 400, 404,
+    each with the ``index`` of the failing operation). If applying it fails part way,
+    everything done so far is rolled back. Returns the result of every operation and
+    one tree delta: the entries added and removed, and the new tree etag. Links to
+    moved paths are then rewritten; the documents changed are listed in ``updatedLinks``.
+    """
+    requested = []
+    for op in req.operations:
+        for path in (op.path, op.oldPath, op.newPath):
+            try:
+                requested.append(safe_join(BASE_DIR, path) if path else None)
+            except ValueError:
+                pass  # Reported by the plan
+
+    with path_locks.hold(*requested):
+        planned = PlannedTree()
+        steps, results = [], []
+        for index, op in enumerate(req.operations):
+            try:
+                step, result = plan_batch(planned, op)
+            except ValueError:
+                return JSONResponse({"error": "Invalid path", "index": index}, status_code=400)
+            except BatchError as e:
+                return JSONResponse({"error": e.error, "index": index, **e.extra}, status_code=e.status)
+            if step is not None:
+                steps.append(step)
+            results.append(result)
+
+        touched = {step[1] for step in steps} | {step[2] for step in steps if step[0] == "move"}
+        # Entries that are there before and after but are not the same: overwritten, or deleted and made again
+        replaced, deleted = set(), set()
+        for step in steps:
+            if step[0] == "delete":
+                deleted.add(step[1])
+                continue
+            target = step[2] if step[0] == "move" else step[1]
+            if step[-1] or target in deleted:
+                replaced.add(target)
+        before = {path: disk_kind(path) for path in touched}
+        rel = lambda full_path: os.path.relpath(full_path, BASE_DIR).replace("\\", "/")
+        moves = [(rel(step[1]), rel(step[2])) for step in steps if step[0] == "move"]
+        affected = link_graph.affected(old for old, _ in moves) if req.updateLinks else []
+        journal = Journal(BATCH_TRASH_DIR)
+        try:
+            for index, step in enumerate(steps):
+                try:
+                    apply_batch_step(journal, step)
+                except OSError as e:
+                    journal.rollback()
+                    return JSONResponse({"error": f"Operation failed, nothing was changed: {e}", "index": index},
+                                        status_code=500)
+            for folder in journal.created:
+                before.setdefault(folder, None)
+            journal.commit()
+        finally:
+            for path in touched | set(journal.created):
+                path_changed(path)
+    return {"status": "done", "results": results, "tree": tree_delta(before, replaced),
+            "updatedLinks": update_references(affected, moves)}
+
+
+def stage_upload(file: UploadFile):
+    """Stream an upload into the staging folder, hashing it on the way; returns the staged path and the reader."""
+    reader = HashingReader(file.file)
+    staged_path = os.path.join(UPLOAD_STAGING_DIR, uuid.uuid4().hex + ".part")
+    save_stream(reader, staged_path, UPLOAD_MAX_BYTES)
+    return staged_path, reader
+
+
 @app.post("/api/upload_image")
-async def upload_image(
+@disk_pool.offload
+def upload_image(
     file: UploadFile = File(...),
     path: str = Form(...),
-    action: str = Form("check")
+    action: str = Form("check"),
+    dedupe: bool = Form(True)
 ):
+    """
+    Store an uploaded image below ``_static``. Unless ``dedupe`` is false, an image whose
+    content is already in the docs is not stored again: the response has
+    ``"status": "duplicate"`` and the existing image's path as ``newPath``.
+    """
     filename = sanitize_filename(file.filename)
     try:
         # Ensure path always starts inside _static
@@ -295,21 +1140,85 @@ async def upload_image(
     except ValueError:
         return JSONResponse({"error": "Invalid path"}, status_code=400)
 
-    return handle_collision(
-        base_dir=BASE_DIR,
-        file=file,
-        new_path=rel_path,
-        action=action,
-        move_file=False
-    )
+    try:
+        staged_path, reader = stage_upload(file)
+    except UploadTooLarge as e:
+        return JSONResponse({"error": e.detail}, status_code=413)
+    try:
+        size = os.path.getsize(staged_path)
+        metrics.file_bytes("written", "/api/upload_image", size)
+        # Empty uploads are placeholders (a new Excalidraw drawing), each filled in on its own later
+        if dedupe and size:
+            existing = image_index.find(reader.hexdigest(), size, posixpath.dirname(rel_path))
+            if existing:
+                return {"status": "duplicate", "newPath": existing}
+        image_index.remember(staged_path, reader.hexdigest(), reader.head)
+        return handle_collision(
+            base_dir=BASE_DIR,
+            new_path=rel_path,
+            action=action,
+            move_file=False,
+            staged_path=staged_path
+        )
+    finally:
+        if os.path.exists(staged_path):
+            os.remove(staged_path)
 
 
 @app.get("/api/image_tree")
-async def get_image_tree():
+@disk_pool.offload
+def get_image_tree():
     static_root = os.path.join(BASE_DIR, "_static")
     return scan_dir(static_root, static_root)
 
 
+def image_digest(full_path: str) -> Optional[str]:
+    """Content hash of an image from the image index, indexing it first if it is new or changed."""
+    digest = image_index.hash_of(full_path)
+    if digest is None and os.path.isfile(full_path):
+        image_index.update(full_path)
+        digest = image_index.hash_of(full_path)
+    return digest
+
+
+@app.get("/api/thumbnail")
+async def get_thumbnail(request: Request, path: str, size: int = Query(256, ge=1), v: Optional[str] = None):
+    """
+    A WebP copy of an image below the docs, its longest side the first of
+    ``thumbnails.SIZES`` covering ``size``. Thumbnails are made in their own pool on first
+    use and cached by the image's content hash, so a changed image gets new ones. The
+    original is sent instead where a thumbnail would not be smaller, or while the pool is
+    busy. ``?v=<hash>`` (from /api/images_in_folder) makes the response cacheable for good.
+    """
+    try:
+        full_path = safe_join(BASE_DIR, path)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    if not image_index.accepts(full_path):
+        return JSONResponse({"error": "Not an image"}, status_code=400)
+    size = fit_size(size)
+    digest = await disk_pool.run(image_digest, full_path)
+    if digest is None:
+        return JSONResponse({"error": "File not found"}, status_code=404)
+    thumb = None
+    if not thumbnail_cache.serves_original(digest, size):
+        thumb = await disk_pool.run(thumbnail_cache.cached, digest, size)
+        if thumb is None:
+            try:
+                thumb = await thumbnail_pool.run(thumbnail_cache.make, full_path, digest, size)
+            except PoolSaturated:
+                # Better the full image now than none; the thumbnail is tried again on the next request
+                return await disk_pool.run(serve_file, request, full_path)
+    if thumb is None:
+        return await disk_pool.run(serve_file, request, full_path, IMMUTABLE if v == digest else REVALIDATE)
+
+    etag = f'"{digest[:24]}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE if v == digest else REVALIDATE}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(thumb, media_type="image/webp", headers=headers)
+
+
 @app.post("/save")
 async def save_uploaded_file(file: UploadFile = File(...), filename: str = ""):
     if not filename:
@@ -319,38 +1228,177 @@ async def save_uploaded_file(file: UploadFile = File(...), filename: str = ""):
         save_path = safe_join(BASE_DIR, safe_relative_path)
     except ValueError:
         return JSONResponse({"error": "Invalid save path"}, status_code=400)
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    with open(save_path, "wb") as f:
-        f.write(await file.read())
+
+    def write():
+        staged_path, reader = stage_upload(file)
+        try:
+            with path_locks.hold(save_path):
+                # A re-export identical to the saved file leaves it (and its modification time) alone
+                if image_index.hash_of(save_path) == reader.hexdigest():
+                    return
+                image_index.remember(staged_path, reader.hexdigest(), reader.head)
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                os.replace(staged_path, save_path)
+        finally:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+        metrics.file_bytes("written", "/save", os.path.getsize(save_path))
+        path_changed(save_path)
+
+    await disk_pool.run(write)
     return {"success": True, "path": save_path}
 
 
+# ---------------------- CHUNKED UPLOADS ----------------------
+class UploadStartModel(BaseModel):
+    path: str  # destination relative to the docs folder
+    size: int
+    action: str = "check"  # "check" | "overwrite" | "increment", applied on completion
+
+
+@app.post("/api/upload/start")
+@disk_pool.offload
+def start_upload(data: UploadStartModel):
+    try:
+        path = normalize_relative_path(data.path)
+    except ValueError:
+        return JSONResponse({"error": "Invalid path"}, status_code=400)
+    return resumable_uploads.start(path, data.size, data.action)
+
+
+@app.get("/api/upload/{upload_id}")
+@disk_pool.offload
+def upload_status(upload_id: str):
+    try:
+        return resumable_uploads.status(upload_id)
+    except KeyError:
+        return JSONResponse({"error": "Unknown upload"}, status_code=404)
+
+
+@app.put("/api/upload/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: int = 0):
+    """
+    Append the raw request body at ``offset``. The offset must equal the bytes received so far;
+    on mismatch the current offset is returned with a 409 so the client can resume from there.
+    """
+    try:
+        lock = resumable_uploads.lock(upload_id)
+        if not await disk_pool.run(lock.acquire, False):
+            status = await disk_pool.run(resumable_uploads.status, upload_id)
+            return JSONResponse({"error": "Another chunk is being written", "offset": status["offset"]},
+                                status_code=409)
+    except KeyError:
+        return JSONResponse({"error": "Unknown upload"}, status_code=404)
+    try:
+        size = (await disk_pool.run(resumable_uploads.status, upload_id))["size"]
+        f = await disk_pool.run(resumable_uploads.open_at, upload_id, offset)
+    except KeyError:
+        await disk_pool.run(lock.release)
+        return JSONResponse({"error": "Unknown upload"}, status_code=404)
+    except ValueError as e:
+        await disk_pool.run(lock.release)
+        return JSONResponse({"error": "Offset mismatch", "offset": e.args[0]}, status_code=409)
+
+    # Nothing past the declared size is written: the chunk is turned down as soon as it goes beyond it
+    remaining = size - offset
+    declared = request.headers.get("content-length", "")
+    too_large = declared.isdigit() and int(declared) > remaining
+    try:
+        buffer = bytearray()
+        if not too_large:
+            async for chunk in request.stream():
+                remaining -= len(chunk)
+                if remaining < 0:
+                    too_large = True
+                    break
+                metrics.file_bytes("written", "/api/upload", len(chunk))
+                buffer += chunk
+                if len(buffer) >= COPY_CHUNK:
+                    await disk_pool.run(f.write, bytes(buffer))
+                    buffer.clear()
+        if buffer and not too_large:
+            await disk_pool.run(f.write, bytes(buffer))
+    finally:
+        await disk_pool.run(f.close)
+        await disk_pool.run(lock.release)
+
+    if too_large:
+        await disk_pool.run(resumable_uploads.discard, upload_id)
+        return JSONResponse({"error": "Upload exceeds its declared size"}, status_code=413)
+    status = await disk_pool.run(resumable_uploads.status, upload_id)
+    return {"upload_id": upload_id, "offset": status["offset"], "size": status["size"]}
+
+
+@app.post("/api/upload/{upload_id}/complete")
+@disk_pool.offload
+def complete_upload(upload_id: str, action: Optional[str] = None):
+    try:
+        part_path, meta = resumable_uploads.finish(upload_id)
+    except KeyError:
+        return JSONResponse({"error": "Unknown upload"}, status_code=404)
+    except ValueError as e:
+        return JSONResponse({"error": "Upload incomplete", "offset": e.args[0]}, status_code=409)
+
+    result = handle_collision(
+        base_dir=BASE_DIR,
+        new_path=meta["path"],
+        action=action or meta["action"],
+        staged_path=part_path
+    )
+    # A collision keeps the staged file so the client can complete again with another action
+    if isinstance(result, dict):
+        resumable_uploads.discard(upload_id)
+    return result
+
+
 # ---------------------- STATIC FILE ROUTES ----------------------
 @app.get("/_static/{subpath:path}")
-async def serve_static_files(subpath: str):
+@disk_pool.offload
+def serve_static_files(subpath: str, request: Request, v: Optional[str] = None):
+    """
+    Serve docs images revalidated by content-hash ETag; ``?v=<content hash>`` URLs are
+    content-addressed and cached for good.
+    """
     try:
         full_path = safe_join(os.path.join(BASE_DIR, "_static"), subpath)
     except ValueError:
         return JSONResponse({"error": "Forbidden"}, status_code=403)
     if os.path.isfile(full_path):
-        headers = {"Cache-Control": "no-cache, no-store, must-revalidate"}
-        return FileResponse(full_path, headers=headers)
+        cache_control = REVALIDATE
+        if v:
+            # Images are versioned with the image index's hash, as /api/images_in_folder and /api/thumbnail hand it out
+            version = image_digest(full_path) if image_index.accepts(full_path) else content_hash(full_path)
+            cache_control = IMMUTABLE if v == version else REVALIDATE
+        return serve_file(request, full_path, cache_control)
     return JSONResponse({"error": "File not found"}, status_code=404)
 
 
+def serve_dist_file(request: Request, *parts):
+    try:
+        full_path = safe_join(os.path.abspath(STATIC_FOLDER), *parts)
+    except ValueError:
+        return JSONResponse({"error": "Forbidden"}, status_code=403)
+    if not os.path.isfile(full_path):
+        return JSONResponse({"error": "File not found"}, status_code=404)
+    return serve_file(request, full_path)
+
+
 @app.get("/dictionaries/{path:path}")
-async def send_dictionaries(path: str):
-    return FileResponse(os.path.join(STATIC_FOLDER, "dictionaries", path))
+@disk_pool.offload
+def send_dictionaries(path: str, request: Request):
+    return serve_dist_file(request, "dictionaries", path)
 
 
 @app.get("/templates/{path:path}")
-async def get_templates(path: str):
-    return FileResponse(os.path.join(STATIC_FOLDER, "templates", path))
+@disk_pool.offload
+def get_templates(path: str, request: Request):
+    return serve_dist_file(request, "templates", path)
 
 
 @app.get("/linkedtemplatelist.json")
-async def serve_linked_template_list():
-    return FileResponse(os.path.join(STATIC_FOLDER, "linkedtemplatelist.json"))
+@disk_pool.offload
+def serve_linked_template_list(request: Request):
+    return serve_dist_file(request, "linkedtemplatelist.json")
 
 # ----------------------- Git integration ------------------------- #
 
@@ -360,11 +1408,102 @@ repo_dir = "../../"
 if not os.path.exists(os.path.join(repo_dir, ".git")):
     raise FileNotFoundError(f"Git repo not found in {repo_dir}. Clone it manually first.")
 
-repo = Repo(repo_dir)
+
+class InstrumentedGit(Git):
+    """GitPython's command runner, timing every git subprocess it starts."""
+
+    def execute(self, command, *args, **kwargs):
+        subcommand = command[1] if isinstance(command, (list, tuple)) and len(command) > 1 else "git"
+        with metrics.git_command(str(subcommand)):
+            return super().execute(command, *args, **kwargs)
+
+
+class InstrumentedRepo(Repo):
+    GitCommandWrapperType = InstrumentedGit
+
+
+repo = InstrumentedRepo(repo_dir)
+_thread_repos = threading.local()
+
+
+def get_repo() -> Repo:
+    """Repo for the calling thread: GitPython's persistent git processes must not be shared across threads."""
+    thread_repo = getattr(_thread_repos, "repo", None)
+    if thread_repo is None:
+        thread_repo = _thread_repos.repo = InstrumentedRepo(repo_dir)
+    return thread_repo
+
+
+# Persistent cat-file readers shared by every route that reads git objects
+git_reader = GitReaderPool(repo.working_dir, GIT_POOL_LIMITS[0])
+
+# HEAD and branch tips as last announced on /api/events
+ref_state = RefState(repo.working_dir, repo.git_dir)
+
+# Working tree changes against base commits, re-checked per changed path
+working_status = WorkingTreeStatus(repo.working_dir, repo.git_dir, DOCS_DIR)
+
+# Commit graph and per-path presence, persisted next to the repository data
+commit_index = CommitIndex(repo, git_reader, os.path.join(repo.git_dir, "myst-editor", "commits.sqlite"), DOCS_DIR)
+
+
+def content_cache(name: str, max_bytes: int):
+    """In-process cache, backed by one shared between the workers when there are several."""
+    if WORKERS > 1:
+        return SharedCache(os.path.join(repo.git_dir, "myst-editor", "cache.sqlite"), name, max_bytes)
+    return LRUCache(max_bytes)
+
+
+# Decoded blob text keyed by (tree sha, path): immutable, so never invalidated
+blob_cache = content_cache("blob", BLOB_CACHE_MAX_BYTES)
+# Line hunks keyed by (left blob sha, right blob sha)
+diff_cache = content_cache("diff", DIFF_CACHE_MAX_BYTES)
+# Markdown paths below each docs tree sha
+markdown_trees = MarkdownTrees(git_reader, content_cache("tree", TREE_CACHE_MAX_BYTES))
+# Document text keyed by its version (git blob sha): immutable, and shared so any worker finds a merge base
+version_cache = content_cache("version", VERSION_CACHE_MAX_BYTES)
+# Rendered HTML keyed by the hash of the Sphinx configuration, the document's path and its text
+render_cache = content_cache("render", RENDER_CACHE_MAX_BYTES)
+
+
+def invalid_git_names(*names: Optional[str]) -> bool:
+    """Whether a file name or ref from a request holds a line break or NUL, which git can't be asked about."""
+    return any(name is not None and UNSAFE_SPEC_CHARS.search(name) for name in names)
+
+
+def resolve_commit(ref: str) -> Optional[str]:
+    """Commit sha for a hash, HEAD or branch name, or None if it does not name a commit."""
+    return git_reader.resolve(f"{ref}^{{commit}}")
+
+
+def read_git_blob(commit: str, target_file: str):
+    """Return ``(blob sha, text)`` of ``target_file`` in ``commit``. Raises KeyError if it does not exist."""
+    tree = git_reader.resolve(f"{commit}^{{tree}}")
+    if tree is None:
+        raise ValueError(f"Unknown commit {commit}")
+    key = (tree, target_file)
+    item = blob_cache.get(key)
+    if item is None:
+        # Never invalidated, so only content checked to be the blob at this path may go in
+        blob = git_reader.blob_at(tree, target_file)
+        if blob is None:
+            raise KeyError(target_file)
+        blob_sha, data = blob
+        item = (blob_sha, data.decode("utf-8", errors="replace").replace("\r", ""))
+        blob_cache.put(key, item, len(data))
+    return item
+
+
+def read_git_text(commit: str, target_file: str) -> str:
+    """Return the text of ``target_file`` in ``commit``. Raises KeyError if it does not exist."""
+    return read_git_blob(commit, target_file)[1]
 
 
 class FileRequest(BaseModel):
     filename: str
+    branch: Optional[str] = None  # only return commits of this branch
+    offset: int = 0
+    limit: Optional[int] = None  # newest-N commits per branch
 
 
 class CompareRequest(BaseModel):
@@ -375,42 +1514,43 @@ class CompareRequest(BaseModel):
 
 
 @app.post("/search-file")
-async def search_file(req: FileRequest):
-    branches = []
+@git_pool.offload
+def search_file(req: FileRequest):
+    if invalid_git_names(req.filename, req.branch):
+        return JSONResponse({"error": "Invalid file name or branch"}, status_code=400)
+    repo = get_repo()
+    commit_index.refresh()
+    heads = commit_index.branches
+    target_file = req.filename.replace("\\", "/") if req.filename else None
     commits = {}
-    target_file = f"{DOCS_DIR}/{req.filename.replace('\\', '/')}" if req.filename else None
-
-    for branch in repo.branches:
-        branch_name = branch.name
-        branches.append(branch_name)
-        commits[branch_name] = []
-
-        for idx, c in enumerate(repo.iter_commits(branch_name)):
-            file_exists = True
-            if target_file:
-                try:
-                    _ = c.tree / target_file
-                except KeyError:
-                    file_exists = False
-
-            commits[branch_name].append({
-                "hash": c.hexsha,
-                "summary": c.summary,
-                "message": c.message,
-                "index": idx + 1,  # chronological index (newest = 1)
-                "file_exists": file_exists
-            })
+    total_commits = {}
+
+    for branch_name, (head, total) in heads.items():
+        if req.branch and branch_name != req.branch:
+            continue
+        shas = commit_index.walk(head, req.offset, req.limit)
+        presence = commit_index.presence(shas, target_file) if target_file else {}
+        total_commits[branch_name] = total
+        commits[branch_name] = [
+            {
+                **commit_index.commit_info(sha),
+                "index": req.offset + idx + 1,  # chronological index (newest = 1)
+                "file_exists": presence.get(sha) is not None if target_file else True,
+            }
+            for idx, sha in enumerate(shas)
+        ]
 
     active_branch = repo.active_branch.name if not repo.head.is_detached else None
     head_commit = repo.head.commit.hexsha
 
     return {
-        "branches": sorted(set(branches)),
+        "branches": sorted(heads),
         "commits": commits,
+        "total_commits": total_commits,
         "active_branch": active_branch,
         "head_commit": head_commit,
     }
-    
+
 
 class DiffRequest(BaseModel):
     filename: str
@@ -421,20 +1561,23 @@ class DiffRequest(BaseModel):
 
     
 @app.post("/get-file-from-git")
-async def get_file_from_git(req: DiffRequest):
-    target_file = f"{DOCS_DIR}/{req.filename.replace('\\', '/')}"
-    
+@git_pool.offload
+def get_file_from_git(req: DiffRequest):
+    if invalid_git_names(req.filename, req.commit_left, req.commit_right):
+        return JSONResponse({"error": "Invalid file name or commit"}, status_code=400)
+    target_file = DOCS_DIR + "/" + req.filename.replace("\\", "/")
+
     def read_file_from_commit(commit_hash: str) -> str:
         try:
-            blob = repo.commit(commit_hash).tree / target_file
-            return blob.data_stream.read().decode("utf-8").replace("\r", "")
+            return read_git_text(commit_hash, target_file)
         except KeyError:
             return f"// File not found in commit {commit_hash}"
         except Exception as e:
             return f"// Error reading file: {e}"
 
     left_content = read_file_from_commit(req.commit_left)
-    right_content = read_file_from_commit(req.commit_right)
+    right_content = (left_content if req.commit_right == req.commit_left
+                     else read_file_from_commit(req.commit_right))
 
     return {
         "left_content": left_content,
@@ -442,35 +1585,115 @@ async def get_file_from_git(req: DiffRequest):
     }
 
 
+@app.get("/api/git-file")
+@git_pool.offload
+def get_git_file(filename: str, ref: str = "HEAD"):
+    """
+    Return a file's content at a commit hash or symbolic ref (HEAD, branch name),
+    resolved on the server so clients need no /api/git-head round trip first.
+    """
+    if invalid_git_names(filename, ref):
+        return JSONResponse({"error": "Invalid file name or ref"}, status_code=400)
+    target_file = DOCS_DIR + "/" + filename.replace("\\", "/")
+    commit = resolve_commit(ref)
+    if commit is None:
+        return JSONResponse({"error": f"Unknown ref {ref}"}, status_code=404)
+    try:
+        content = read_git_text(commit, target_file)
+    except KeyError:
+        return JSONResponse({"error": f"File not found in commit {commit}", "commit": commit}, status_code=404)
+    return {"commit": commit, "content": content}
+
+
+class LineDiffRequest(BaseModel):
+    filename: str
+    ref: str = "HEAD"  # left side: commit hash or symbolic ref
+    right_ref: Optional[str] = None  # right side: another commit...
+    text: Optional[str] = None  # ...or the editor's working text
+    version: Optional[str] = None  # ...or a saved version of it ("version" of /api/file), sparing the upload
+
+
+@app.post("/api/git-line-diff")
+@git_pool.offload
+def git_line_diff(req: LineDiffRequest):
+    """
+    Return line hunks between a file in a commit and either another commit, the posted text
+    or a saved version of it, so clients receive changed ranges instead of both full documents.
+    A version this server no longer knows is answered with a 409; the client sends the text then.
+    """
+    if invalid_git_names(req.filename, req.ref, req.right_ref):
+        return JSONResponse({"error": "Invalid file name or ref"}, status_code=400)
+    target_file = DOCS_DIR + "/" + req.filename.replace("\\", "/")
+    if [req.right_ref, req.text, req.version].count(None) != 2:
+        return JSONResponse({"error": "Provide exactly one of right_ref, text or version"}, status_code=400)
+    left_commit = resolve_commit(req.ref)
+    right_commit = resolve_commit(req.right_ref) if req.right_ref is not None else None
+    if left_commit is None or (req.right_ref is not None and right_commit is None):
+        return JSONResponse({"error": "Unknown ref"}, status_code=404)
+
+    try:
+        left_sha, left_text = read_git_blob(left_commit, target_file)
+    except KeyError:
+        return JSONResponse({"error": f"File not found in commit {left_commit}", "commit": left_commit},
+                            status_code=404)
+    right_text = None
+    if right_commit is not None:
+        try:
+            right_sha, right_text = read_git_blob(right_commit, target_file)
+        except KeyError:
+            right_sha, right_text = text_blob_sha(""), ""
+    elif req.version is not None:
+        right_sha = req.version
+    else:
+        right_text = req.text.replace("\r", "")
+        right_sha = text_blob_sha(right_text)
+
+    key = (left_sha, right_sha)
+    hunks = diff_cache.get(key)
+    if hunks is None:
+        if right_text is None:
+            right_text = version_text(req.version)
+            if right_text is None:
+                return JSONResponse({"error": "Unknown version"}, status_code=409)
+            right_text = right_text.replace("\r", "")
+        hunks = compute_hunks(left_text, right_text)
+        diff_cache.put(key, hunks, 64 + 32 * len(hunks))
+
+    return {
+        "commit": left_commit,
+        "right_commit": right_commit,
+        "left_blob": left_sha,
+        "right_blob": right_sha,
+        "hunks": hunks,
+    }
+
+
 @app.get("/api/git-diff-tree")
-async def git_diff_tree_get(commit_left: str = Query(...), commit_right: str = Query(...)):
-    commit_left_obj = repo.commit(commit_left)
-    commit_right_obj = repo.commit(commit_right)
-
-    diffs = commit_left_obj.diff(commit_right_obj, paths=DOCS_DIR)
-
-    result = []
-    for d in diffs:
-        status = "M"
-        if d.new_file:
-            status = "A"
-        elif d.deleted_file:
-            status = "D"
-        elif d.renamed:
-            status = "R"
-        result.append({
-            "old_path": d.rename_from if d.renamed else d.a_path,
-            "new_path": d.rename_to if d.renamed else d.b_path,
-            "status": status,
-        })
-    return result
+@git_pool.offload
+def git_diff_tree_get(commit_left: str = Query(...), commit_right: str = Query(...)):
+    """
+    Files of the docs folder changed between two commits, with renames, as ``git diff-tree -M``
+    lists them. Read through the shared cat-file readers; subtrees both commits share are skipped.
+    """
+    if invalid_git_names(commit_left, commit_right):
+        return JSONResponse({"error": "Invalid commit"}, status_code=400)
+    docs_trees = []
+    for commit in (commit_left, commit_right):
+        sha = resolve_commit(commit)
+        if sha is None:
+            return JSONResponse({"error": f"Unknown commit {commit}"}, status_code=404)
+        # None when the commit has no docs folder
+        docs_trees.append(git_reader.resolve(f"{sha}:{DOCS_DIR}"))
+    return diff_trees(git_reader, *docs_trees, prefix=DOCS_DIR + "/")
 
 
 @app.get("/api/git-head")
-async def git_head():
+@git_pool.offload
+def git_head():
     """
     Return the HEAD commit hash and active branch of the current repo.
     """
+    repo = get_repo()
     try:
         return {
             "head": repo.head.commit.hexsha,
@@ -480,56 +1703,89 @@ async def git_head():
         return {"error": str(e)}
 
 
+@app.get("/api/git-stats")
+async def git_stats():
+    """
+    Return statistics of the git reader pool, the worker pools and the content caches.
+    """
+    return {
+        "git_reader": git_reader.stats(),
+        "pools": {"git": git_pool.stats(), "disk": disk_pool.stats(), "thumbnail": thumbnail_pool.stats(),
+                  "render": render_pool.stats()},
+        "blob_cache": blob_cache.stats(),
+        "diff_cache": diff_cache.stats(),
+        "tree_cache": markdown_trees.stats(),
+        "listing_cache": dir_listing.stats(),
+        "document_cache": document_cache.stats(),
+        "version_cache": version_cache.stats(),
+        "events": change_hub.stats(),
+        "working_status": working_status.stats(),
+        "worker": {**leader.stats(), "workers": WORKERS},
+        "collab": collab_relay.stats(),
+        "search": search_index.stats(),
+        "links": link_graph.stats(),
+        "images": image_index.stats(),
+        "thumbnails": thumbnail_cache.stats(),
+        "sphinx_builds": sphinx_builder.stats(),
+        "sphinx_render": sphinx_renderer.stats(),
+        "render_cache": render_cache.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    Prometheus text exposition of request latencies, git reads and subprocesses, pool waits,
+    content bytes, and the component statistics also shown by /api/git-stats.
+    """
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+metrics.register_stats("git_reader", git_reader.stats)
+metrics.register_stats("pool", git_pool.stats, pool="git")
+metrics.register_stats("pool", disk_pool.stats, pool="disk")
+metrics.register_stats("pool", thumbnail_pool.stats, pool="thumbnail")
+metrics.register_stats("pool", render_pool.stats, pool="render")
+metrics.register_stats("cache", blob_cache.stats, cache="blob")
+metrics.register_stats("cache", diff_cache.stats, cache="diff")
+metrics.register_stats("cache", markdown_trees.stats, cache="tree")
+metrics.register_stats("cache", dir_listing.stats, cache="listing")
+metrics.register_stats("cache", document_cache.stats, cache="document")
+metrics.register_stats("cache", version_cache.stats, cache="version")
+metrics.register_stats("cache", render_cache.stats, cache="render")
+metrics.register_stats("events", change_hub.stats)
+metrics.register_stats("working_status", working_status.stats)
+metrics.register_stats("worker", leader.stats)
+metrics.register_stats("collab", collab_relay.stats)
+metrics.register_stats("search", search_index.stats)
+metrics.register_stats("links", link_graph.stats)
+metrics.register_stats("images", image_index.stats)
+metrics.register_stats("thumbnails", thumbnail_cache.stats)
+metrics.register_stats("sphinx_builds", sphinx_builder.stats)
+metrics.register_stats("sphinx_render", sphinx_renderer.stats)
+
+
 class CompareWorkingRequest(BaseModel):
     commit: str
     filename: str
 
 
 @app.get("/api/git-diff-working-tree")
-async def git_diff_working_tree(commit: str = Query(...)):
+@git_pool.offload
+def git_diff_working_tree(commit: str = Query(...)):
     """
     Compare the working tree against a given commit.
     Returns a list of changed files with statuses (M/A/D/R).
     Includes both tracked changes and untracked files.
+    Kept per base commit and only re-checked for paths changed since the last call.
     """
+    if invalid_git_names(commit):
+        return JSONResponse({"error": "Invalid commit"}, status_code=400)
     try:
-        result = []
-        
-        # Get tracked file changes: git diff --name-status <commit>
-        diff_output = repo.git.diff("--name-status", commit, DOCS_DIR)
-        for line in diff_output.splitlines():
-            parts = line.split("\t")
-            if not parts:
-                continue
-            status = parts[0]
-            if status.startswith("R"):
-                # Renamed: "R100 old new"
-                _, old, new = parts
-                result.append({
-                    "old_path": old,
-                    "new_path": new,
-                    "status": "R"
-                })
-            else:
-                path = parts[1]
-                result.append({
-                    "old_path": path if status != "A" else None,
-                    "new_path": path if status != "D" else None,
-                    "status": status
-                })
-        
-        # Get untracked files (new files not in git)
-        untracked_files = repo.git.ls_files("--others", "--exclude-standard", DOCS_DIR).splitlines()
-        for file_path in untracked_files:
-            # Only include .md files
-            if file_path.endswith('.md'):
-                result.append({
-                    "old_path": None,
-                    "new_path": file_path,
-                    "status": "A"  # Mark untracked files as "Added"
-                })
-        
-        return result
+        sha = resolve_commit(commit)
+        if sha is None:
+            return {"error": f"Unknown commit {commit}"}
+        return working_status.status(sha)
     except Exception as e:
         return {"error": str(e)}
 
@@ -537,46 +1793,27 @@ async def git_diff_working_tree(commit: str = Query(...)):
 # Return intersection file tree for two selected commits
 # Add this new endpoint to your FastAPI backend
 @app.get("/api/tree-union")
-async def get_tree_union(commit_left: str = Query(...), commit_right: str = Query(...)):
+@git_pool.offload
+def get_tree_union(commit_left: str = Query(...), commit_right: str = Query(...)):
+    """
+    Local tree restricted to the Markdown files present in either commit.
+    File lists come from the per-tree cache and the tree from the live index, so
+    nothing is traversed or scanned again for trees already seen.
+    """
+    if invalid_git_names(commit_left, commit_right):
+        return JSONResponse({"error": "Invalid commit"}, status_code=400)
     try:
-        # --- Get all .md files from both commits ---
-        def get_md_files(commit_obj):
-            files = set()
-            try:
-                docs_tree = commit_obj.tree / DOCS_DIR
-                for item in docs_tree.traverse():
-                    if item.type == 'blob' and item.path.endswith('.md'):
-                        rel_path = os.path.relpath(item.path, DOCS_DIR).replace("\\", "/")
-                        files.add(rel_path)
-            except KeyError:
-                pass
-            return files
-
-        left_files = get_md_files(repo.commit(commit_left))
-        right_files = get_md_files(repo.commit(commit_right))
-        
+        docs_trees = []
+        for commit in (commit_left, commit_right):
+            sha = resolve_commit(commit)
+            if sha is None:
+                return JSONResponse({"error": f"Unknown commit {commit}"}, status_code=404)
+            # None when the commit has no docs folder
+            docs_trees.append(git_reader.resolve(f"{sha}:{DOCS_DIR}"))
+
         # Union of files from both commits only (no untracked files for commit vs commit comparison)
-        md_union = left_files | right_files
-
-        # --- Get local tree ---
-        local_tree = scan_dir(BASE_DIR, BASE_DIR, [".md"])
-
-        # --- Filter local tree recursively ---
-        def filter_tree(nodes):
-            result = []
-            for node in nodes:
-                if node['type'] == 'file':
-                    if node['path'] in md_union:
-                        result.append(node)
-                elif node['type'] == 'folder':
-                    filtered_children = filter_tree(node.get('children', []))
-                    if filtered_children:
-                        node['children'] = filtered_children
-                        result.append(node)
-            return result
-
-        filtered_local_tree = filter_tree(local_tree)
-        return filtered_local_tree
+        md_union = markdown_trees.union(*docs_trees)
+        return tree_index.to_list(only=md_union)
 
     except Exception as e:
         import traceback
@@ -585,8 +1822,22 @@ async def get_tree_union(commit_left: str = Query(...), commit_right: str = Quer
 
 
 # Mount frontend
-app.mount("/", StaticFiles(directory=STATIC_FOLDER, html=True), name="frontend")
+app.mount("/", CachedStaticFiles(directory=STATIC_FOLDER, html=True), name="frontend")
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("app:app", host="0.0.0.0", port=5000, reload=True)
+
+    parser = argparse.ArgumentParser(description="MyST editor server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help="worker processes; more than one turns off auto-reload (default: MYST_WORKERS or 1)")
+    args = parser.parse_args()
+    # Open /api/events streams never finish on their own; cut them off instead of blocking restarts
+    if args.workers > 1:
+        # Each worker imports this module afresh and reads the worker count back from here
+        os.environ["MYST_WORKERS"] = str(args.workers)
+        uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers, timeout_graceful_shutdown=3)
+    else:
+        uvicorn.run("app:app", host=args.host, port=args.port, reload=True, timeout_graceful_shutdown=3)
@@ -0,0 +1,58 @@
+"""
+Compare two benchmark reports (from micro.py or load.py) and flag regressions.
+
+    python bench/compare.py baseline.json current.json --metric p95_ms --threshold 0.2
+
+Exits with status 1 if any benchmark's metric grew by more than the threshold (a fraction),
+so it can gate CI; benchmarks present in only one report are listed but never fail the run.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, metric: str, threshold: float):
+    rows, regressions = [], []
+    for name in sorted(set(baseline["results"]) | set(current["results"])):
+        old = baseline["results"].get(name, {}).get(metric)
+        new = current["results"].get(name, {}).get(metric)
+        if old is None or new is None:
+            rows.append((name, old, new, None))
+            continue
+        change = (new - old) / old if old else 0.0
+        rows.append((name, old, new, change))
+        # Throughput regresses when it drops, latencies when they grow
+        worse = -change if metric.startswith("throughput") else change
+        if worse > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--metric", default="p95_ms", help="p50_ms, p95_ms, p99_ms, mean_ms or throughput_per_s")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative change, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    if baseline.get("kind") != current.get("kind"):
+        sys.exit(f"Cannot compare a {baseline.get('kind')} report with a {current.get('kind')} report")
+
+    rows, regressions = compare(baseline, current, args.metric, args.threshold)
+    print(f"{'benchmark':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, old, new, change in rows:
+        shown = "n/a" if change is None else f"{change:+.1%}"
+        flag = "  REGRESSION" if name in regressions else ""
+        print(f"{name:<36}{old if old is not None else '-':>12}{new if new is not None else '-':>12}{shown:>10}{flag}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) in {args.metric} above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
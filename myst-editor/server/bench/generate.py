@@ -0,0 +1,201 @@
+"""
+Generate a synthetic docs repository to benchmark the editor server against.
+
+    python bench/generate.py /tmp/bench-repo --files 2000 --depth 3 --branches 4 --commits 500 --images 5000
+
+The repository gets the layout the server expects (``docs/`` next to ``myst-editor/server``,
+which is the directory to run the server from), a history written in one ``git fast-import``
+pass, some uncommitted edits, and a ``bench-repo.json`` manifest describing what was made.
+The same arguments and seed always produce the same content.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import struct
+import subprocess
+import zlib
+
+MANIFEST = "bench-repo.json"
+WORDS = ("editor", "branch", "commit", "diff", "review", "section", "figure", "table", "note",
+         "config", "server", "render", "preview", "image", "index", "link", "module", "change")
+IDENTITY = "Bench <bench@example.com>"
+# Oldest commit time; one commit per hour after it
+EPOCH = 1_600_000_000
+
+
+def markdown(rng: random.Random, title: str, images: list, lines: int = 40) -> str:
+    out = [f"# {title}", ""]
+    for i in range(lines):
+        if i % 12 == 0:
+            out += [f"## {rng.choice(WORDS).title()} {i // 12 + 1}", ""]
+        elif images and i % 17 == 0:
+            out += [f"![{rng.choice(WORDS)}](/{rng.choice(images)})", ""]
+        else:
+            out.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14))) + ".")
+    return "\n".join(out) + "\n"
+
+
+def png(rng: random.Random) -> bytes:
+    """A valid 1x1 PNG of a random colour."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    pixel = bytes([0, rng.randrange(256), rng.randrange(256), rng.randrange(256)])
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(pixel)) + chunk(b"IEND", b""))
+
+
+def folders(depth: int, fanout: int) -> list:
+    result = [""]
+    level = [""]
+    for d in range(depth):
+        level = [f"{parent}/{'abcdefghijklmnopqrstuvwxyz'[i]}{d}".lstrip("/") for parent in level for i in range(fanout)]
+        result += level
+    return result
+
+
+class FastImport:
+    """Writes a ``git fast-import`` stream; marks are handed out in order."""
+
+    def __init__(self, repo: str):
+        self.proc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=repo, stdin=subprocess.PIPE)
+        self.mark = 0
+        self.time = EPOCH
+
+    def _data(self, data: bytes):
+        self.proc.stdin.write(b"data %d\n" % len(data) + data + b"\n")
+
+    def blob(self, data: bytes) -> int:
+        self.mark += 1
+        self.proc.stdin.write(b"blob\nmark :%d\n" % self.mark)
+        self._data(data)
+        return self.mark
+
+    def commit(self, branch: str, message: str, changes: dict, parent: int = None) -> int:
+        """``changes`` maps repo paths to a blob mark, or to None to delete them."""
+        self.mark += 1
+        self.time += 3600
+        self.proc.stdin.write(f"commit refs/heads/{branch}\nmark :{self.mark}\n"
+                              f"committer {IDENTITY} {self.time} +0000\n".encode())
+        self._data(message.encode())
+        if parent:
+            self.proc.stdin.write(b"from :%d\n" % parent)
+        for path, blob in changes.items():
+            if blob is None:
+                self.proc.stdin.write(f"D {path}\n".encode())
+            else:
+                self.proc.stdin.write(f"M 100644 :{blob} {path}\n".encode())
+        return self.mark
+
+    def close(self):
+        self.proc.stdin.close()
+        if self.proc.wait():
+            raise RuntimeError("git fast-import failed")
+
+
+def generate(dest: str, files: int = 500, depth: int = 3, fanout: int = 4, branches: int = 3,
+             commits: int = 100, images: int = 1000, dirty: int = 10, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+    subprocess.run(["git", "init", "-q", "-b", "main", dest], check=True)
+
+    dirs = folders(depth, fanout)
+    image_paths = [f"_static/img/batch{i // 1000:03d}/shot-{i:06d}.png" for i in range(images)]
+    md_paths = [f"{rng.choice(dirs)}/page-{i:05d}.md".lstrip("/") for i in range(files)]
+    content = {path: markdown(rng, f"Page {i}", image_paths) for i, path in enumerate(md_paths)}
+
+    git = FastImport(dest)
+    initial = {f"docs/{path}": git.blob(text.encode()) for path, text in content.items()}
+    initial.update({f"docs/{path}": git.blob(png(rng)) for path in image_paths})
+    head = git.commit("main", "Initial docs", initial)
+    history = [head]
+
+    def edit(path: str) -> int:
+        lines = content[path].split("\n")
+        for _ in range(rng.randint(1, 4)):
+            lines[rng.randrange(2, len(lines) - 1)] = " ".join(rng.choice(WORDS) for _ in range(8)) + "."
+        content[path] = "\n".join(lines)
+        return git.blob(content[path].encode())
+
+    for n in range(1, commits):
+        changes = {f"docs/{path}": edit(path) for path in rng.sample(md_paths, min(len(md_paths), rng.randint(1, 5)))}
+        if n % 10 == 0:
+            path = f"{rng.choice(dirs)}/added-{n:05d}.md".lstrip("/")
+            content[path] = markdown(rng, f"Added {n}", image_paths)
+            md_paths.append(path)
+            changes[f"docs/{path}"] = git.blob(content[path].encode())
+        head = git.commit("main", f"Update docs ({n})", changes, head)
+        history.append(head)
+
+    branch_names = []
+    for b in range(1, branches):
+        name = f"feature-{b}"
+        branch_names.append(name)
+        tip = rng.choice(history)
+        for n in range(max(1, commits // 20)):
+            # Branches only touch files from the initial commit, which exist at any fork point
+            path = rng.choice(md_paths[:files])
+            blob = git.blob(markdown(rng, f"{name} {n}", image_paths).encode())
+            tip = git.commit(name, f"{name}: work ({n})", {f"docs/{path}": blob}, tip)
+    git.close()
+    subprocess.run(["git", "reset", "-q", "--hard", "main"], cwd=dest, check=True)
+
+    # Uncommitted work, as a running editor would see it
+    for path in rng.sample(md_paths, min(dirty, len(md_paths))):
+        with open(os.path.join(dest, "docs", path), "a", encoding="utf-8") as f:
+            f.write("\nUnsaved local edit.\n")
+    for i in range(dirty):
+        path = f"{rng.choice(dirs)}/draft-{i:03d}.md".lstrip("/")
+        os.makedirs(os.path.dirname(os.path.join(dest, "docs", path)), exist_ok=True)
+        with open(os.path.join(dest, "docs", path), "w", encoding="utf-8") as f:
+            f.write(markdown(rng, f"Draft {i}", image_paths, 10))
+
+    # The server runs from myst-editor/server and serves ../dist
+    os.makedirs(os.path.join(dest, "myst-editor", "server"))
+    os.makedirs(os.path.join(dest, "myst-editor", "dist"))
+    with open(os.path.join(dest, "myst-editor", "dist", "index.html"), "w", encoding="utf-8") as f:
+        f.write("<!doctype html><title>bench</title>\n")
+    with open(os.path.join(dest, ".git", "info", "exclude"), "a", encoding="utf-8") as f:
+        f.write(f"/myst-editor/\n/{MANIFEST}\n")
+
+    manifest = {
+        "params": {"files": files, "depth": depth, "fanout": fanout, "branches": branches,
+                   "commits": commits, "images": images, "dirty": dirty, "seed": seed},
+        "branches": ["main", *branch_names],
+        "md_files": md_paths,
+        "folders": [d for d in dirs if d],
+        "image_folders": sorted({os.path.dirname(path) for path in image_paths}),
+    }
+    with open(os.path.join(dest, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_manifest(repo: str) -> dict:
+    with open(os.path.join(repo, MANIFEST), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dest", help="directory to create (replaced if it exists)")
+    parser.add_argument("--files", type=int, default=500, help="Markdown files in the first commit")
+    parser.add_argument("--depth", type=int, default=3, help="folder nesting depth below docs/")
+    parser.add_argument("--fanout", type=int, default=4, help="sub-folders per folder")
+    parser.add_argument("--branches", type=int, default=3, help="branches including main")
+    parser.add_argument("--commits", type=int, default=100, help="commits on main")
+    parser.add_argument("--images", type=int, default=1000, help="PNG files under docs/_static/img")
+    parser.add_argument("--dirty", type=int, default=10, help="uncommitted edits and untracked drafts")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    manifest = generate(args.dest, args.files, args.depth, args.fanout, args.branches,
+                        args.commits, args.images, args.dirty, args.seed)
+    print(f"Generated {len(manifest['md_files'])} Markdown files, {args.images} images and "
+          f"{len(manifest['branches'])} branches in {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
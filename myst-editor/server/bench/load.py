@@ -0,0 +1,187 @@
+"""
+Concurrent HTTP load driver replaying editor sessions against the server.
+
+    python bench/load.py --repo /tmp/bench-repo --sessions 16 --duration 30 --out load.json
+    python bench/load.py --url http://127.0.0.1:5000 --sessions 4 --duration 10
+
+With ``--repo`` (made by generate.py) a server is started on that repository for the run;
+with ``--url`` an already running one is used. Every session loops over what an open
+editor does: load the tree, open a file, run the changed-lines gutter a few times while
+"typing", autosave, refresh the working-tree diff, browse folders and images, and now and
+then open the commit list. Autosave writes back the content it read, so a real docs
+folder is left as it was. Latencies are reported per request type and overall.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlencode, urlsplit
+
+from report import summarize, write_report
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Gutter refreshes per opened file, like a few bursts of typing
+GUTTER_ROUNDS = 3
+
+
+class Session:
+    """One editor: a keep-alive connection and the latencies it saw, per request type."""
+
+    def __init__(self, url: str, rng: random.Random, samples, errors):
+        self.base = urlsplit(url)
+        self.rng = rng
+        self.samples = samples
+        self.errors = errors
+        self.conn = None
+        self.tree_etag = None
+        self.files = []
+        self.folders = []
+
+    def request(self, name: str, method: str, path: str, body=None, headers=None):
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.base.hostname, self.base.port or 80, timeout=60)
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            self.errors[name] += 1
+            return None, None
+        self.samples[name].append(time.perf_counter() - start)
+        if response.status >= 400:
+            self.errors[name] += 1
+            return response, None
+        return response, data
+
+    def load_tree(self):
+        response, data = self.request("tree", "GET", "/api/tree",
+                                      headers={"If-None-Match": self.tree_etag} if self.tree_etag else None)
+        if data:
+            self.tree_etag = response.getheader("ETag")
+            self.files, self.folders = [], []
+            self._walk(json.loads(data))
+
+    def _walk(self, nodes):
+        for node in nodes:
+            if node["type"] == "file":
+                self.files.append(node["path"])
+            else:
+                self.folders.append(node["path"])
+                self._walk(node["children"])
+
+    def iteration(self, n: int):
+        self.load_tree()
+        if not self.files:
+            return
+        path = self.rng.choice(self.files)
+        _, data = self.request("open_file", "GET", f"/api/file?path={quote(path)}")
+        if data is None:
+            return
+        content = json.loads(data)["content"]
+
+        lines = content.split("\n")
+        for _ in range(GUTTER_ROUNDS):
+            lines.insert(self.rng.randrange(len(lines) + 1), "typed " + str(self.rng.random()))
+            self.request("gutter_diff", "POST", "/api/git-line-diff",
+                         {"filename": path, "ref": "HEAD", "text": "\n".join(lines)})
+
+        self.request("autosave", "POST", f"/api/file?path={quote(path)}", {"content": content})
+        self.request("working_tree_diff", "GET", "/api/git-diff-working-tree?commit=HEAD")
+
+        folder = self.rng.choice(self.folders) if self.folders else ""
+        self.request("list_folder", "GET", "/api/list?" + urlencode({"path": folder}))
+        self.request("list_images", "GET", "/api/list?" + urlencode(
+            {"path": "_static", "kind": "folder"}))
+        if n % 5 == 0:
+            self.request("commit_list", "POST", "/search-file", {"filename": path, "limit": 500})
+
+
+def drive(url: str, sessions: int, duration: float, seed: int):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index: int):
+        local_samples, local_errors = defaultdict(list), defaultdict(int)
+        session = Session(url, random.Random(seed * 1000 + index), local_samples, local_errors)
+        n = 0
+        while time.perf_counter() < deadline:
+            session.iteration(n)
+            n += 1
+        with lock:
+            for name, values in local_samples.items():
+                samples[name].extend(values)
+            for name, count in local_errors.items():
+                errors[name] += count
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {name: summarize(values, elapsed, errors[name]) for name, values in sorted(samples.items())}
+    results["all"] = summarize([v for values in samples.values() for v in values], elapsed, sum(errors.values()))
+    return results
+
+
+def start_server(repo: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=SERVER_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port),
+                             "--log-level", "warning", "--timeout-graceful-shutdown", "1"],
+                            cwd=os.path.join(repo, "myst-editor", "server"), env=env)
+    for _ in range(100):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/git-head")
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="running server, e.g. http://127.0.0.1:5000")
+    target.add_argument("--repo", help="repository made by generate.py; a server is started on it")
+    parser.add_argument("--port", type=int, default=5055, help="port for the server started with --repo")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent editor sessions")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    server = start_server(os.path.abspath(args.repo), args.port) if args.repo else None
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        results = drive(url, args.sessions, args.duration, args.seed)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    write_report(args.out, "load", {"sessions": args.sessions, "duration": args.duration, "seed": args.seed,
+                                    "target": "generated" if args.repo else url}, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Micro-benchmarks of the server's hot paths, called directly (no HTTP) on a generated repository.
+
+    python bench/generate.py /tmp/bench-repo
+    python bench/micro.py /tmp/bench-repo --repeat 50 --out micro.json
+
+Arguments (files, commit pairs) are drawn from a seeded generator, so two runs on the same
+repository do the same work. The first call of each benchmark is reported separately as
+``first_ms``, since it includes filling the caches.
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import time
+
+from generate import load_manifest
+from report import summarize, write_report
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app(repo: str):
+    """Import app.py the way the server runs it: from myst-editor/server inside ``repo``."""
+    os.chdir(os.path.join(repo, "myst-editor", "server"))
+    sys.path.insert(0, SERVER_DIR)
+    import app
+    app.tree_index.rebuild()
+    return app
+
+
+def unwrap(route):
+    # Pool-offloaded routes keep the blocking function as __wrapped__
+    return getattr(route, "__wrapped__", route)
+
+
+def benchmarks(app, manifest: dict, rng: random.Random):
+    commits = subprocess.run(["git", "rev-list", "--all"], cwd=app.repo.working_dir,
+                             capture_output=True, text=True, check=True).stdout.split()
+    files = manifest["md_files"]
+
+    def pair():
+        return rng.choice(commits), rng.choice(commits)
+
+    def scan_dir():
+        app.scan_dir(app.BASE_DIR, app.BASE_DIR, [".md"])
+
+    def search_file():
+        unwrap(app.search_file)(app.FileRequest(filename=rng.choice(files), limit=500))
+
+    def get_file_from_git():
+        left, right = pair()
+        unwrap(app.get_file_from_git)(app.DiffRequest(filename=rng.choice(files), branch_left="main",
+                                                      commit_left=left, branch_right="main", commit_right=right))
+
+    def git_diff_tree_get():
+        unwrap(app.git_diff_tree_get)(*pair())
+
+    def git_diff_working_tree():
+        unwrap(app.git_diff_working_tree)("HEAD")
+
+    def git_diff_working_tree_after_save():
+        # An autosave touched one file since the last refresh
+        path = os.path.join(app.BASE_DIR, rng.choice(files))
+        if os.path.exists(path):
+            os.utime(path)
+            app.path_changed(path)
+        unwrap(app.git_diff_working_tree)("HEAD")
+
+    def get_tree_union():
+        unwrap(app.get_tree_union)(*pair())
+
+    return {fn.__name__: fn for fn in (scan_dir, search_file, get_file_from_git, git_diff_tree_get,
+                                        git_diff_working_tree, git_diff_working_tree_after_save, get_tree_union)}
+
+
+def run(repo: str, repeat: int, seed: int, only=None) -> dict:
+    manifest = load_manifest(repo)
+    app = load_app(repo)
+    results = {}
+    for name, fn in benchmarks(app, manifest, random.Random(seed)).items():
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        fn()
+        first = time.perf_counter() - start
+        samples = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+        results[name] = {**summarize(samples, time.perf_counter() - started), "first_ms": round(first * 1000, 3)}
+    app.git_reader.close()
+    return {"manifest": manifest["params"], "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("repo", help="repository made by generate.py")
+    parser.add_argument("--repeat", type=int, default=30, help="timed calls per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="benchmark names to run")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+    out = os.path.abspath(args.out) if args.out else None
+    outcome = run(os.path.abspath(args.repo), args.repeat, args.seed, args.only)
+    write_report(out, "micro", {"repeat": args.repeat, "seed": args.seed, "repo": outcome["manifest"]},
+                 outcome["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (0-100) of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    pos = (len(sorted_values) - 1) * q / 100
+    low, high = math.floor(pos), math.ceil(pos)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def summarize(seconds: List[float], elapsed: Optional[float] = None, errors: int = 0) -> dict:
+    """Latency summary in milliseconds; throughput is per second of ``elapsed`` (wall time) if given."""
+    values = sorted(seconds)
+    summary = {
+        "n": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else float("nan"),
+        "max_ms": round(values[-1] * 1000, 3) if values else float("nan"),
+    }
+    if elapsed:
+        summary["throughput_per_s"] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def environment() -> dict:
+    git = subprocess.run(["git", "--version"], capture_output=True, text=True).stdout.strip()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git": git,
+    }
+
+
+def write_report(path: Optional[str], kind: str, params: dict, results: Dict[str, dict]) -> dict:
+    """Print the results as a table and, with ``path``, save them as JSON for compare.py."""
+    report = {"kind": kind, "environment": environment(), "params": params, "results": results}
+    print(f"{'benchmark':<36}{'n':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>10}")
+    for name, summary in results.items():
+        print(f"{name:<36}{summary['n']:>7}{summary['p50_ms']:>11}{summary['p95_ms']:>11}"
+              f"{summary['p99_ms']:>11}{summary.get('throughput_per_s', ''):>10}")
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved to {path}")
+    return report
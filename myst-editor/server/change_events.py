@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import subprocess
+import threading
+from typing import Callable, Dict, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+
+import metrics
+from tree_index import TreeIndex
+
+# Notifications are collected this long before going out, so a burst (checkout, save + rename, ...) is sent once
+COALESCE_SECONDS = 0.25
+# Events a slow client may fall behind by before it is told to resync instead
+SUBSCRIBER_QUEUE = 256
+# A comment line is sent this often on an idle stream, so proxies keep it open
+HEARTBEAT_SECONDS = 20
+
+# Produces the events of one pending notification; run in a worker thread at flush time
+Producer = Callable[[], List[dict]]
+
+
+# ---------------------- CHANGE HUB ----------------------
+class ChangeHub:
+    """Fan-out of change events to every connected client.
+
+    Watcher threads call ``notify``; notifications with the same key replace each other
+    until the window closes, then their events are produced once and broadcast to all
+    subscribers. One set of watchers therefore serves any number of open editors.
+    """
+
+    def __init__(self, coalesce_seconds: float = COALESCE_SECONDS):
+        self.coalesce_seconds = coalesce_seconds
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[object, Producer] = {}
+        self._flush_scheduled = False
+        self._subscribers = set()
+        self._hello: Callable[[], dict] = dict
+        self._stats = {"notifications": 0, "flushes": 0, "events": 0, "resyncs": 0}
+
+    def bind(self, loop: asyncio.AbstractEventLoop, hello: Callable[[], dict]):
+        """Attach to the server's event loop; ``hello`` builds the first event of every stream."""
+        self._loop = loop
+        self._hello = hello
+
+    def notify(self, key, producer: Producer):
+        """Thread-safe; the latest producer per key wins within one window."""
+        with self._lock:
+            self._stats["notifications"] += 1
+            self._pending[key] = producer
+            if self._flush_scheduled or self._loop is None:
+                return
+            self._flush_scheduled = True
+        self._loop.call_soon_threadsafe(self._loop.call_later, self.coalesce_seconds, self._start_flush)
+
+    def _start_flush(self):
+        asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        with self._lock:
+            pending, self._pending = list(self._pending.values()), {}
+            self._flush_scheduled = False
+        events = await asyncio.get_running_loop().run_in_executor(None, _produce, pending)
+        with self._lock:
+            self._stats["flushes"] += 1
+            self._stats["events"] += len(events)
+        for event in events:
+            self.publish(event)
+
+    def publish(self, event: dict):
+        """Send ``event`` to every subscriber (event loop only)."""
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind to catch up event by event: drop its backlog, have it reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                self._stats["resyncs"] += 1
+
+    async def stream(self, request):
+        """Server-sent events for one client, starting with the current state."""
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE)
+        self._subscribers.add(queue)
+        try:
+            yield _format(self._hello())
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield _format(event)
+        finally:
+            self._subscribers.discard(queue)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["subscribers"] = len(self._subscribers)
+        return stats
+
+
+def _produce(producers: List[Producer]) -> List[dict]:
+    events = []
+    for producer in producers:
+        try:
+            events.extend(producer())
+        except (OSError, subprocess.SubprocessError):
+            # The state moved on under us; the notification for that move follows
+            pass
+    return events
+
+
+def _format(event: dict) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+
+# ---------------------- GIT REFS ----------------------
+class RefState:
+    """Last seen HEAD and branch tips; ``update`` reports what moved since the previous call."""
+
+    def __init__(self, repo_dir: str, git_dir: str):
+        self.repo_dir = repo_dir
+        self.git_dir = git_dir
+        self.head = None
+        self.active_branch = None
+        self.branches: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _git(self, *args) -> subprocess.CompletedProcess:
+        with metrics.git_command(args[0]):
+            return subprocess.run(["git", *args], cwd=self.repo_dir, capture_output=True, text=True,
+                                  encoding="utf-8", errors="replace")
+
+    def read(self):
+        branches = {}
+        for line in self._git("for-each-ref", "--format=%(objectname) %(refname:short)", "refs/heads").stdout.splitlines():
+            sha, _, name = line.partition(" ")
+            branches[name] = sha
+        active_branch = self._git("symbolic-ref", "-q", "--short", "HEAD").stdout.strip() or None
+        head = branches.get(active_branch) if active_branch else None
+        if head is None:
+            # Detached, or an unborn branch
+            head = self._git("rev-parse", "-q", "--verify", "HEAD").stdout.strip() or None
+        return head, active_branch, branches
+
+    def update(self) -> List[dict]:
+        with self._lock:
+            head, active_branch, branches = self.read()
+            events = []
+            for name in sorted(set(branches) | set(self.branches)):
+                if branches.get(name) != self.branches.get(name):
+                    events.append({"type": "branch-updated", "branch": name, "commit": branches.get(name)})
+            if (head, active_branch) != (self.head, self.active_branch):
+                events.append({"type": "head-moved", "head": head, "active_branch": active_branch})
+            self.head, self.active_branch, self.branches = head, active_branch, branches
+            return events
+
+    def snapshot(self) -> dict:
+        return {"head": self.head, "active_branch": self.active_branch}
+
+
+# ---------------------- WATCHERS ----------------------
+class _DocsEventHandler(FileSystemEventHandler):
+    def __init__(self, hub: ChangeHub, index: TreeIndex):
+        self.hub = hub
+        self.index = index
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        if event.event_type in ("created", "deleted", "moved"):
+            # The tree index applies the same event itself; its etag is read once the window closes
+            self.hub.notify("tree", lambda: [{"type": "tree-changed", "etag": self.index.etag}])
+        if event.is_directory:
+            return
+        paths = [event.src_path] + ([event.dest_path] if event.event_type == "moved" else [])
+        for path in map(os.fsdecode, paths):
+            rel = self.index._rel(path)
+            # Dotfiles are editor/upload temporaries, never documents
+            if rel and not os.path.basename(rel).startswith("."):
+                self.hub.notify(("file", rel), lambda rel=rel, path=path: [file_event(rel, path)])
+
+
+def file_event(rel: str, full_path: str) -> dict:
+    """``file-modified`` with the same ``last_modified`` as /api/file/meta (None once deleted)."""
+    try:
+        last_modified = int(os.path.getmtime(full_path) * 1000)
+    except FileNotFoundError:
+        last_modified = None
+    return {"type": "file-modified", "path": rel, "last_modified": last_modified}
+
+
+class _RefsEventHandler(FileSystemEventHandler):
+    # Files directly in .git that can move HEAD or a branch
+    REF_FILES = {"HEAD", "packed-refs"}
+
+    def __init__(self, hub: ChangeHub, refs: RefState):
+        self.hub = hub
+        self.refs = refs
+        self.refs_dir = os.path.join(refs.git_dir, "refs") + os.sep
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write") or event.is_directory:
+            return
+        paths = [event.src_path] + ([event.dest_path] if event.event_type == "moved" else [])
+        for path in map(os.fsdecode, paths):
+            # Lock files are renamed onto the real ref, which reports the change itself
+            if path.endswith(".lock"):
+                continue
+            if path.startswith(self.refs_dir) or os.path.basename(path) in self.REF_FILES:
+                self.hub.notify("refs", self.refs.update)
+                return
+
+
+def watch_changes(observer, hub: ChangeHub, index: TreeIndex, refs: RefState):
+    """Feed ``hub`` from the docs folder and the repository's refs, on an existing observer."""
+    observer.schedule(_DocsEventHandler(hub, index), index.base, recursive=True)
+    observer.schedule(_RefsEventHandler(hub, refs), refs.git_dir, recursive=False)
+    refs_dir = os.path.join(refs.git_dir, "refs")
+    if os.path.isdir(refs_dir):
+        observer.schedule(_RefsEventHandler(hub, refs), refs_dir, recursive=True)
@@ -0,0 +1,604 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from watchdog.events import FileSystemEventHandler
+
+try:
+    import pycrdt
+except ImportError:
+    pycrdt = None
+
+# Shared type holding the Markdown, as named by the editor (collaboration.js)
+TEXT_NAME = "codemirror"
+# Quiet time after the last edit before the Markdown file is written
+WRITE_DELAY_SECONDS = 2.0
+# Longest a document being edited without pause goes unwritten
+WRITE_MAX_DELAY_SECONDS = 10.0
+# Rooms nobody has been connected to for this long are dropped from memory
+ROOM_IDLE_SECONDS = 60.0
+# Logged updates per room that trigger folding them into the snapshot
+COMPACT_UPDATES = 200
+# Updates younger than this are left in the log, so other workers can still read them from there
+COMPACT_MIN_AGE_SECONDS = 10.0
+# The editor reconnects when it has heard nothing for 5 s
+HEARTBEAT_SECONDS = 2.0
+# Messages a slow client may fall behind by before it is disconnected (it resyncs on reconnect)
+SEND_QUEUE = 512
+
+# y-protocols message types
+MESSAGE_SYNC = 0
+MESSAGE_AWARENESS = 1
+MESSAGE_AUTH = 2
+MESSAGE_QUERY_AWARENESS = 3
+SYNC_STEP1 = 0
+SYNC_STEP2 = 1
+SYNC_UPDATE = 2
+# An update with no structs and no deletions (what a client in sync answers with)
+EMPTY_UPDATE = b"\x00\x00"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    room TEXT PRIMARY KEY,
+    snapshot BLOB NOT NULL,
+    snapshot_seq INTEGER NOT NULL,
+    written TEXT
+);
+CREATE TABLE IF NOT EXISTS updates (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    room TEXT NOT NULL,
+    origin TEXT NOT NULL,
+    created REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS updates_room ON updates (room, seq);
+"""
+
+
+# ---------------------- LIB0 ENCODING ----------------------
+def write_var_uint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    out.append(value)
+
+
+def write_var_bytes(out: bytearray, data: bytes):
+    write_var_uint(out, len(data))
+    out += data
+
+
+class Reader:
+    """Reads lib0-encoded values from a message."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def var_uint(self) -> int:
+        value, shift = 0, 0
+        while True:
+            byte = self.data[self.pos]
+            self.pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def var_bytes(self) -> bytes:
+        length = self.var_uint()
+        if self.pos + length > len(self.data):
+            raise IndexError("truncated message")
+        value = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return value
+
+
+def sync_message(sync_type: int, payload: bytes) -> bytes:
+    out = bytearray()
+    write_var_uint(out, MESSAGE_SYNC)
+    write_var_uint(out, sync_type)
+    write_var_bytes(out, payload)
+    return bytes(out)
+
+
+def awareness_message(states: Dict[int, Tuple[int, str]]) -> bytes:
+    """Awareness update carrying ``client id -> (clock, JSON state)``; "null" removes a client."""
+    update = bytearray()
+    write_var_uint(update, len(states))
+    for client, (clock, state) in states.items():
+        write_var_uint(update, client)
+        write_var_uint(update, clock)
+        write_var_bytes(update, state.encode("utf-8"))
+    out = bytearray()
+    write_var_uint(out, MESSAGE_AWARENESS)
+    write_var_bytes(out, update)
+    return bytes(out)
+
+
+def parse_awareness(update: bytes) -> Dict[int, Tuple[int, str]]:
+    reader = Reader(update)
+    states = {}
+    for _ in range(reader.var_uint()):
+        client = reader.var_uint()
+        clock = reader.var_uint()
+        states[client] = (clock, reader.var_bytes().decode("utf-8"))
+    return states
+
+
+def _text_sha(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _replace_text(text, old: str, new: str):
+    """Turn ``text`` (holding ``old``) into ``new`` with one delete and one insert around the common ends."""
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end_old, end_new = len(old), len(new)
+    while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+        end_old -= 1
+        end_new -= 1
+    # Y.Text offsets in pycrdt are UTF-8 byte offsets
+    offset = len(old[:start].encode("utf-8"))
+    if end_old > start:
+        del text[offset:offset + len(old[start:end_old].encode("utf-8"))]
+    if end_new > start:
+        text.insert(offset, new[start:end_new])
+
+
+# ---------------------- PERSISTENCE ----------------------
+class CollabStore:
+    """Per-document update logs and snapshots in SQLite, shared by every worker process.
+
+    Each room has a snapshot (all updates up to ``snapshot_seq`` merged) followed by the
+    updates logged since. ``written`` is the hash of the Markdown last written to (or read
+    from) disk for the room, so a file changed by anything else is noticed on load.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.origin = uuid.uuid4().hex  # this process, to skip its own rows when polling
+        self._connections = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db = self._db()
+        with db:
+            db.executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._connections, "db", None)
+        if db is None:
+            db = self._connections.db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def open_room(self, room: str, file_text: Optional[str]) -> Tuple[bytes, int]:
+        """
+        The room's state as one update and the last logged seq. A new room is seeded from
+        ``file_text``; if the file changed since the room last wrote it, the change is
+        applied as a new update first. Both happen in one transaction, so two workers
+        opening the same room never seed or patch it twice.
+        """
+        file_text = file_text or ""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT snapshot, snapshot_seq, written FROM rooms WHERE room = ?", (room,)).fetchone()
+            doc = pycrdt.Doc()
+            text = doc.get(TEXT_NAME, type=pycrdt.Text)
+            if row is None:
+                text += file_text
+                snapshot, last_seq = doc.get_update(), 0
+                db.execute("INSERT INTO rooms VALUES (?, ?, 0, ?)", (room, snapshot, _text_sha(file_text)))
+                db.execute("COMMIT")
+                return snapshot, last_seq
+
+            snapshot, last_seq, written = row
+            updates = [data for _, data in self._updates(db, room, last_seq)]
+            last_seq = db.execute("SELECT MAX(seq) FROM updates WHERE room = ?", (room,)).fetchone()[0] or last_seq
+            merged = pycrdt.merge_updates(snapshot, *updates) if updates else snapshot
+            doc.apply_update(merged)
+            fix = self._patch(db, room, doc, written, file_text)
+            if fix is not None:
+                last_seq = fix[1]
+                merged = pycrdt.merge_updates(merged, fix[0])
+            db.execute("COMMIT")
+            return merged, last_seq
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _patch(self, db, room: str, doc, written: Optional[str], file_text: str):
+        """Log an update bringing ``doc`` to ``file_text`` if the file changed since the room wrote it."""
+        sha = _text_sha(file_text)
+        if written == sha:
+            return None
+        db.execute("UPDATE rooms SET written = ? WHERE room = ?", (sha, room))
+        text = doc.get(TEXT_NAME, type=pycrdt.Text)
+        current = str(text)
+        if current == file_text:
+            return None
+        before = doc.get_state()
+        _replace_text(text, current, file_text)
+        fix = doc.get_update(before)
+        return fix, self._append(db, room, fix)
+
+    def sync_file(self, room: str, file_text: str) -> Optional[bytes]:
+        """
+        For a room being edited whose file was changed on disk by something else: the
+        update that applies the change, or None if there is nothing to apply (already
+        applied by another worker, or the file holds what the room last wrote).
+        """
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT snapshot, snapshot_seq, written FROM rooms WHERE room = ?", (room,)).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            snapshot, snapshot_seq, written = row
+            doc = pycrdt.Doc()
+            doc.apply_update(pycrdt.merge_updates(snapshot, *[data for _, data in
+                                                             self._updates(db, room, snapshot_seq)]))
+            fix = self._patch(db, room, doc, written, file_text)
+            db.execute("COMMIT")
+            return fix[0] if fix else None
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _updates(self, db, room: str, after_seq: int):
+        return db.execute("SELECT seq, data FROM updates WHERE room = ? AND seq > ? ORDER BY seq", (room, after_seq))
+
+    def _append(self, db, room: str, update: bytes) -> int:
+        return db.execute("INSERT INTO updates (room, origin, created, data) VALUES (?, ?, ?, ?)",
+                          (room, self.origin, time.time(), update)).lastrowid
+
+    def append(self, room: str, update: bytes) -> int:
+        return self._append(self._db(), room, update)
+
+    def since(self, positions: Dict[str, int]) -> Dict[str, List[Tuple[int, bytes]]]:
+        """Updates logged by other processes after the given seq, per room."""
+        db = self._db()
+        result = {}
+        for room, after_seq in positions.items():
+            rows = db.execute("SELECT seq, origin, data FROM updates WHERE room = ? AND seq > ? ORDER BY seq",
+                              (room, after_seq)).fetchall()
+            if rows:
+                result[room] = [(seq, None if origin == self.origin else data) for seq, origin, data in rows]
+        return result
+
+    def mark_written(self, room: str, text: str):
+        self._db().execute("UPDATE rooms SET written = ? WHERE room = ?", (_text_sha(text), room))
+
+    def compact(self, room: str) -> int:
+        """Merge the room's older logged updates into its snapshot; returns how many were folded in."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            cutoff = db.execute("SELECT MAX(seq) FROM updates WHERE room = ? AND created < ?",
+                                (room, time.time() - COMPACT_MIN_AGE_SECONDS)).fetchone()[0]
+            row = db.execute("SELECT snapshot, snapshot_seq FROM rooms WHERE room = ?", (room,)).fetchone()
+            if cutoff is None or row is None:
+                db.execute("COMMIT")
+                return 0
+            updates = [data for seq, data in self._updates(db, room, row[1]) if seq <= cutoff]
+            snapshot = pycrdt.merge_updates(row[0], *updates)
+            db.execute("UPDATE rooms SET snapshot = ?, snapshot_seq = ? WHERE room = ?", (snapshot, cutoff, room))
+            db.execute("DELETE FROM updates WHERE room = ? AND seq <= ?", (room, cutoff))
+            db.execute("COMMIT")
+            return len(updates)
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def prune(self, exists: Callable[[str], bool]) -> int:
+        """Drop the state of rooms whose document no longer exists."""
+        db = self._db()
+        gone = [room for (room,) in db.execute("SELECT room FROM rooms").fetchall() if not exists(room)]
+        for room in gone:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM updates WHERE room = ?", (room,))
+            db.execute("DELETE FROM rooms WHERE room = ?", (room,))
+            db.execute("COMMIT")
+        return len(gone)
+
+
+# ---------------------- ROOMS ----------------------
+class Connection:
+    """One client socket; messages go out through a queue so a slow client never holds up the room."""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(SEND_QUEUE)
+        self.clients = set()  # awareness client ids this socket has announced
+        self.last_sent = time.monotonic()
+
+    def send(self, message: bytes):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Dropping updates would desync it; it gets the full state again on reconnect
+            self.queue = None
+
+    async def sender(self):
+        try:
+            while self.queue is not None:
+                try:
+                    message = await asyncio.wait_for(self.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # An empty awareness update: keeps the editor's heartbeat check satisfied
+                    message = awareness_message({})
+                await self.websocket.send_bytes(message)
+            await self.websocket.close(code=1013)
+        except Exception:
+            # The socket closed under us; the receiving side ends the connection
+            pass
+
+
+class Room:
+    """A document being edited: its Y.Doc (event loop thread only), connections and awareness."""
+
+    def __init__(self, name: str, update: bytes, last_seq: int):
+        self.name = name
+        self.doc = pycrdt.Doc()
+        self.text = self.doc.get(TEXT_NAME, type=pycrdt.Text)
+        self.doc.apply_update(update)
+        self.last_seq = last_seq
+        self.connections = set()
+        self.awareness: Dict[int, Tuple[int, str]] = {}
+        self.logged = 0  # updates appended since the last compaction
+        self.compacting = False
+        self.dirty_since = None  # first unwritten edit
+        self.written_text = None  # the file's content as last read or written by the relay
+        self.write_handle = None
+        self.evict_handle = None
+
+    def broadcast(self, message: bytes, exclude=None):
+        for connection in self.connections:
+            if connection is not exclude:
+                connection.send(message)
+
+
+class CollabRelay:
+    """y-websocket compatible relay for the editor's collaborative mode.
+
+    Every document is a room named by its path below the docs folder. Updates are
+    relayed to the room's other clients, appended to the room's log in ``store`` and,
+    after a quiet period, the Markdown is written back through ``write_document``.
+    With ``poll_seconds`` set (several workers), rooms also pick up the updates other
+    processes logged, so clients connected to different workers edit together.
+
+    When something else changes the file of a room being edited (a git checkout, a save
+    from a non-collaborative editor), the file wins: the room's text is replaced by it,
+    including edits from the last few seconds that were not written yet.
+    """
+
+    def __init__(self, store: CollabStore, read_document: Callable[[str], Optional[str]],
+                 write_document: Callable[[str, str], object], poll_seconds: Optional[float] = None):
+        self.store = store
+        self.read_document = read_document
+        self.write_document = write_document
+        self.poll_seconds = poll_seconds
+        self.rooms: Dict[str, Room] = {}
+        self._opening: Dict[str, asyncio.Lock] = {}
+        self._poller = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stats = {"connections": 0, "updates": 0, "writes": 0, "compactions": 0, "evictions": 0,
+                       "reloads": 0}
+
+    @staticmethod
+    def available() -> bool:
+        return pycrdt is not None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach to the server's event loop, so file watcher threads can reach the rooms."""
+        self._loop = loop
+
+    def file_changed(self, name: str):
+        """Thread-safe; a document changed on disk, maybe by something other than this relay."""
+        if self._loop is not None and name in self.rooms:
+            self._loop.call_soon_threadsafe(lambda: asyncio.ensure_future(self._file_changed(name)))
+
+    async def flush(self, name: str) -> bool:
+        """Write the room's unwritten edits to its file now; False if this process has no such room."""
+        room = self.rooms.get(name)
+        if room is None:
+            return False
+        await self._write(room)
+        return True
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _room(self, name: str) -> Room:
+        lock = self._opening.setdefault(name, asyncio.Lock())
+        async with lock:
+            room = self.rooms.get(name)
+            if room is None:
+                file_text = await self._run(self.read_document, name)
+                update, last_seq = await self._run(self.store.open_room, name, file_text)
+                room = self.rooms[name] = Room(name, update, last_seq)
+                room.written_text = file_text
+                if self.poll_seconds and self._poller is None:
+                    self._poller = asyncio.ensure_future(self._poll())
+            if room.evict_handle is not None:
+                room.evict_handle.cancel()
+                room.evict_handle = None
+            return room
+
+    async def serve(self, websocket, name: str):
+        """Run one client connection to room ``name`` until it closes."""
+        room = await self._room(name)
+        connection = Connection(websocket)
+        room.connections.add(connection)
+        self._stats["connections"] += 1
+        sender = asyncio.ensure_future(connection.sender())
+        try:
+            connection.send(sync_message(SYNC_STEP1, room.doc.get_state()))
+            if room.awareness:
+                connection.send(awareness_message(room.awareness))
+            while True:
+                message = await websocket.receive_bytes()
+                await self._handle(room, connection, message)
+        finally:
+            sender.cancel()
+            room.connections.discard(connection)
+            self._stats["connections"] -= 1
+            gone = {client: (room.awareness[client][0] + 1, "null")
+                    for client in connection.clients if client in room.awareness}
+            for client in gone:
+                del room.awareness[client]
+            if gone:
+                room.broadcast(awareness_message(gone))
+            if not room.connections:
+                room.evict_handle = asyncio.get_running_loop().call_later(
+                    ROOM_IDLE_SECONDS, lambda: asyncio.ensure_future(self._evict(room)))
+
+    async def _handle(self, room: Room, connection: Connection, message: bytes):
+        reader = Reader(message)
+        kind = reader.var_uint()
+        if kind == MESSAGE_SYNC:
+            sync_type = reader.var_uint()
+            payload = reader.var_bytes()
+            if sync_type == SYNC_STEP1:
+                connection.send(sync_message(SYNC_STEP2, room.doc.get_update(payload)))
+            elif sync_type in (SYNC_STEP2, SYNC_UPDATE) and payload != EMPTY_UPDATE:
+                room.doc.apply_update(payload)
+                await self._changed(room, payload, exclude=connection)
+        elif kind == MESSAGE_AWARENESS:
+            update = reader.var_bytes()
+            for client, (clock, state) in parse_awareness(update).items():
+                connection.clients.add(client)
+                if state == "null":
+                    room.awareness.pop(client, None)
+                else:
+                    room.awareness[client] = (clock, state)
+            room.broadcast(message, exclude=connection)
+        elif kind == MESSAGE_QUERY_AWARENESS:
+            connection.send(awareness_message(room.awareness))
+
+    async def _changed(self, room: Room, update: bytes, exclude=None, logged=False):
+        self._stats["updates"] += 1
+        room.broadcast(sync_message(SYNC_UPDATE, update), exclude=exclude)
+        self._schedule_write(room)
+        if logged:
+            return
+        await self._run(self.store.append, room.name, update)
+        room.logged += 1
+        if room.logged >= COMPACT_UPDATES and not room.compacting:
+            asyncio.ensure_future(self._compact(room))
+
+    # ---------------------- BACKGROUND WORK ----------------------
+    def _schedule_write(self, room: Room):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        if room.dirty_since is None:
+            room.dirty_since = now
+        if room.write_handle is not None:
+            room.write_handle.cancel()
+        delay = min(WRITE_DELAY_SECONDS, max(0.0, room.dirty_since + WRITE_MAX_DELAY_SECONDS - now))
+        room.write_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self._write(room)))
+
+    async def _write(self, room: Room):
+        if room.write_handle is not None:
+            room.write_handle.cancel()
+            room.write_handle = None
+        if room.dirty_since is None:
+            return
+        room.dirty_since = None
+        text = str(room.text)
+        room.written_text = text
+        # Recorded first, so other workers seeing the file change know it came from a room
+        await self._run(self.store.mark_written, room.name, text)
+        await self._run(self.write_document, room.name, text)
+        self._stats["writes"] += 1
+
+    async def _file_changed(self, name: str):
+        room = self.rooms.get(name)
+        if room is None:
+            return
+        file_text = await self._run(self.read_document, name)
+        # Our own write coming back from the watcher, or nothing new
+        if file_text is None or file_text == room.written_text or file_text == str(room.text):
+            return
+        room.written_text = file_text
+        fix = await self._run(self.store.sync_file, name, file_text)
+        if fix is not None:
+            room.doc.apply_update(fix)
+            await self._changed(room, fix, logged=True)
+            self._stats["reloads"] += 1
+
+    async def _compact(self, room: Room):
+        room.compacting = True
+        try:
+            folded = await self._run(self.store.compact, room.name)
+            room.logged = max(0, room.logged - folded)
+            self._stats["compactions"] += 1
+        finally:
+            room.compacting = False
+
+    async def _evict(self, room: Room):
+        if room.connections or self.rooms.get(room.name) is not room:
+            return
+        await self._write(room)
+        await self._compact(room)
+        if not room.connections:
+            del self.rooms[room.name]
+            self._stats["evictions"] += 1
+
+    async def _poll(self):
+        while self.rooms:
+            await asyncio.sleep(self.poll_seconds)
+            positions = {name: room.last_seq for name, room in self.rooms.items()}
+            try:
+                found = await self._run(self.store.since, positions)
+            except sqlite3.OperationalError:
+                continue
+            for name, rows in found.items():
+                room = self.rooms.get(name)
+                if room is None:
+                    continue
+                for seq, update in rows:
+                    room.last_seq = max(room.last_seq, seq)
+                    if update is None:
+                        continue
+                    try:
+                        room.doc.apply_update(update)
+                    except Exception:
+                        continue
+                    await self._changed(room, update, logged=True)
+        self._poller = None
+
+    async def close(self):
+        """Write every document with unsaved edits (server shutdown)."""
+        for room in list(self.rooms.values()):
+            await self._write(room)
+
+    def stats(self) -> dict:
+        return {**self._stats, "rooms": len(self.rooms)}
+
+
+# ---------------------- WATCHER ----------------------
+class _DocumentEventHandler(FileSystemEventHandler):
+    def __init__(self, relay: CollabRelay, base: str):
+        self.relay = relay
+        self.base = base
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = os.fsdecode(event.dest_path if event.event_type == "moved" else event.src_path)
+        if path.endswith(".md"):
+            self.relay.file_changed(os.path.relpath(path, self.base).replace("\\", "/"))
+
+
+def watch_documents(observer, relay: CollabRelay, base: str):
+    """Bring rooms being edited up to date with their files when those change on disk, on an existing observer."""
+    observer.schedule(_DocumentEventHandler(relay, base), base, recursive=True)
@@ -0,0 +1,195 @@
+import heapq
+import os
+import sqlite3
+import subprocess
+import threading
+from typing import Dict, List, Optional
+
+from git import Repo
+
+import metrics
+from coordination import FileLock
+from git_reader import GitReaderPool
+
+RECORD_SEP = "\x1e"
+FIELD_SEP = "\x1f"
+LOG_FORMAT = "%H%x1f%P%x1f%ct%x1f%T%x1f%B%x1e"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    sha TEXT PRIMARY KEY,
+    parents TEXT NOT NULL,
+    committed INTEGER NOT NULL,
+    tree TEXT NOT NULL,
+    docs_tree TEXT,
+    message TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS branch_heads (
+    branch TEXT PRIMARY KEY,
+    sha TEXT NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS presence (
+    docs_tree TEXT NOT NULL,
+    path TEXT NOT NULL,
+    object TEXT,
+    PRIMARY KEY (docs_tree, path)
+);
+"""
+
+
+# ---------------------- COMMIT INDEX ----------------------
+class CommitIndex:
+    """On-disk index of the commit graph and of per-path presence in each docs tree.
+
+    Commits are ingested once, no matter how many branches reach them. When a branch
+    head moves only the commits not reachable from already indexed heads are read.
+    Presence of a path is keyed by the sha of the commit's docs tree, so all commits
+    that did not touch the docs share a single entry.
+
+    Several worker processes may share the database: updates are made under a lock
+    file, and each process first picks up the rows the others have added.
+    """
+
+    def __init__(self, repo: Repo, reader: GitReaderPool, db_path: str, docs_dir: str):
+        self.repo = repo
+        self.reader = reader
+        self.docs_dir = docs_dir
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        # sha -> [parents, committed, docs_tree, summary, message]
+        self._commits = {}
+        self._heads = {}  # branch -> (sha, total)
+        self._last_rowid = 0  # commits rows up to here are loaded
+        self._load()
+
+    def _load(self):
+        """Read the commits added since the last call (by any process) and the current branch heads."""
+        for rowid, sha, parents, committed, docs_tree, message in self._db.execute(
+                "SELECT rowid, sha, parents, committed, docs_tree, message FROM commits WHERE rowid > ?",
+                (self._last_rowid,)):
+            self._commits[sha] = [parents.split(), committed, docs_tree, message.split("\n", 1)[0], message]
+            self._last_rowid = max(self._last_rowid, rowid)
+        self._heads = {branch: (sha, total) for branch, sha, total in
+                       self._db.execute("SELECT branch, sha, total FROM branch_heads")}
+
+    def _git(self, *args) -> str:
+        with metrics.git_command(args[0]):
+            result = subprocess.run(
+                ["git", "-C", self.repo.working_dir, *args],
+                capture_output=True, text=True, encoding="utf-8", errors="replace", check=True,
+            )
+        return result.stdout
+
+    # ---------------------- INCREMENTAL UPDATES ----------------------
+    def refresh(self):
+        """Sync the index with the current branch heads, reading only new commits."""
+        with self._lock:
+            heads = {b.name: b.commit.hexsha for b in self.repo.branches}
+            if not any(self._changes(heads)):
+                return
+            with FileLock(self.db_path + ".lock"):
+                # Another worker may have indexed these heads already
+                self._load()
+                moved, removed = self._changes(heads)
+                if moved or removed:
+                    self._update(moved, removed)
+
+    def _changes(self, heads: Dict[str, str]):
+        moved = {name: sha for name, sha in heads.items() if self._heads.get(name, (None,))[0] != sha}
+        removed = [name for name in self._heads if name not in heads]
+        return moved, removed
+
+    def _update(self, moved: Dict[str, str], removed: List[str]):
+        new_tips = {sha for sha in moved.values() if sha not in self._commits}
+        if new_tips:
+            known = {sha for sha, _ in self._heads.values() if sha in self._commits}
+            self._ingest(new_tips, known)
+
+        for name in removed:
+            del self._heads[name]
+            self._db.execute("DELETE FROM branch_heads WHERE branch = ?", (name,))
+        for name, sha in moved.items():
+            total = int(self._git("rev-list", "--count", sha).strip())
+            self._heads[name] = (sha, total)
+            self._db.execute("INSERT OR REPLACE INTO branch_heads VALUES (?, ?, ?)", (name, sha, total))
+        self._db.commit()
+        # Nobody else writes while the lock is held, so this process's own rows need no reload
+        self._last_rowid = self._db.execute("SELECT MAX(rowid) FROM commits").fetchone()[0] or 0
+
+    def _ingest(self, tips, known):
+        out = self._git("log", f"--format={LOG_FORMAT}", *tips, *[f"^{sha}" for sha in known], "--")
+        rows = []
+        for record in out.split(RECORD_SEP):
+            record = record.lstrip("\n")
+            if not record:
+                continue
+            sha, parents, committed, tree, message = record.split(FIELD_SEP, 4)
+            rows.append([sha, parents, int(committed), tree, message])
+
+        # Resolve every docs subtree in one batch instead of one tree read per commit
+        docs_trees = self._batch_check([f"{row[3]}:{self.docs_dir}" for row in rows])
+        for row, docs_tree in zip(rows, docs_trees):
+            sha, parents, committed, _, message = row
+            self._commits[sha] = [parents.split(), committed, docs_tree, message.split("\n", 1)[0], message]
+            row.insert(4, docs_tree)
+        self._db.executemany("INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _batch_check(self, specs: List[str]) -> List[Optional[str]]:
+        """Return the object sha for each ``<tree-ish>:<path>`` spec, or None if missing."""
+        return [info[0] if info else None for info in self.reader.info(specs)]
+
+    # ---------------------- QUERIES ----------------------
+    @property
+    def branches(self) -> Dict[str, tuple]:
+        with self._lock:
+            return dict(self._heads)
+
+    def walk(self, head: str, offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        """Commits reachable from ``head``, newest first (same order as ``git rev-list``)."""
+        result = []
+        seen = {head}
+        queue = [(-self._commits[head][1], 0, head)] if head in self._commits else []
+        counter = 1
+        index = 0
+        while queue and (limit is None or len(result) < limit):
+            _, _, sha = heapq.heappop(queue)
+            if index >= offset:
+                result.append(sha)
+            index += 1
+            for parent in self._commits[sha][0]:
+                if parent not in seen and parent in self._commits:
+                    seen.add(parent)
+                    heapq.heappush(queue, (-self._commits[parent][1], counter, parent))
+                    counter += 1
+        return result
+
+    def commit_info(self, sha: str) -> dict:
+        _, _, _, summary, message = self._commits[sha]
+        return {"hash": sha, "summary": summary, "message": message}
+
+    def presence(self, shas: List[str], path: str) -> Dict[str, Optional[str]]:
+        """Map each commit sha to the object stored at ``path`` in its docs tree (None if absent)."""
+        trees = {self._commits[sha][2] for sha in shas} - {None}
+        with self._lock:
+            known = {}
+            tree_list = list(trees)
+            for i in range(0, len(tree_list), 500):
+                chunk = tree_list[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for docs_tree, obj in self._db.execute(
+                        f"SELECT docs_tree, object FROM presence WHERE path = ? AND docs_tree IN ({marks})",
+                        (path, *chunk)):
+                    known[docs_tree] = obj
+            missing = [tree for tree in tree_list if tree not in known]
+            if missing:
+                objects = self._batch_check([f"{tree}:{path}" for tree in missing])
+                known.update(zip(missing, objects))
+                self._db.executemany("INSERT OR REPLACE INTO presence VALUES (?, ?, ?)",
+                                     [(tree, path, known[tree]) for tree in missing])
+                self._db.commit()
+        return {sha: known.get(self._commits[sha][2]) for sha in shas}
@@ -0,0 +1,166 @@
+import os
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+# ---------------------- LRU CACHE ----------------------
+class LRUCache:
+    """Thread-safe LRU cache bounded by the total size (in bytes) of its values.
+
+    Only meant for immutable content (git blobs, diffs between two blobs, ...),
+    so entries are never invalidated, only evicted.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "bytes": self.size, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+# ---------------------- SHARED CACHE ----------------------
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key BLOB NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE TABLE IF NOT EXISTS totals (
+    namespace TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+"""
+
+
+class SharedCache:
+    """LRUCache in front of an SQLite table that every worker process reads and fills.
+
+    Used when the server runs several workers: content one worker has read or
+    computed is found by the others instead of being read from git again. The
+    shared tier evicts oldest-first within ``max_bytes`` per namespace. Like the
+    in-process cache it only holds immutable content, and a failed write (the file
+    busy for longer than the timeout) only costs a future miss.
+    """
+
+    def __init__(self, db_path: str, namespace: str, max_bytes: int):
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.shared_hits = 0
+        self._local = LRUCache(max_bytes)
+        self._connections = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        db = self._db()
+        with db:
+            db.executescript(SHARED_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._connections, "db", None)
+        if db is None:
+            db = self._connections.db = sqlite3.connect(self.db_path, timeout=1.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+        return db
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        try:
+            row = self._db().execute("SELECT value, size FROM entries WHERE namespace = ? AND key = ?",
+                                     (self.namespace, _dump(key))).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        if row is None:
+            return default
+        value = pickle.loads(row[0])
+        self.shared_hits += 1
+        self._local.put(key, value, row[1])
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int):
+        self._local.put(key, value, size)
+        data = _dump(value)
+        if len(data) > self.max_bytes:
+            return
+        db = self._db()
+        try:
+            with db:
+                if db.execute("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, ?)",
+                              (self.namespace, _dump(key), data, len(data))).rowcount:
+                    db.execute("INSERT INTO totals VALUES (?, ?) ON CONFLICT(namespace) DO UPDATE SET size = size + ?",
+                               (self.namespace, len(data), len(data)))
+                    self._evict(db)
+        except sqlite3.OperationalError:
+            pass
+
+    def _evict(self, db: sqlite3.Connection):
+        total = db.execute("SELECT size FROM totals WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Free a tenth more than needed, so the next inserts do not each evict again
+        excess = total - self.max_bytes + self.max_bytes // 10
+        freed, victims = 0, []
+        for rowid, size in db.execute("SELECT rowid, size FROM entries WHERE namespace = ? ORDER BY rowid",
+                                      (self.namespace,)):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        db.executemany("DELETE FROM entries WHERE rowid = ?", victims)
+        db.execute("UPDATE totals SET size = size - ? WHERE namespace = ?", (freed, self.namespace))
+
+    def __len__(self):
+        return len(self._local)
+
+    def stats(self) -> dict:
+        stats = self._local.stats()
+        stats["shared_hits"] = self.shared_hits
+        try:
+            row = self._db().execute("SELECT size FROM totals WHERE namespace = ?", (self.namespace,)).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        stats["shared_bytes"] = row[0] if row else 0
+        return stats
+
+
+def _dump(value) -> bytes:
+    # Fixed protocol: every worker runs the same interpreter, but keys must pickle identically
+    return pickle.dumps(value, protocol=4)
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from typing import Callable, List
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Write locks are spread over this many lock files, so the lock folder stays a fixed size
+PATH_LOCK_STRIPES = 256
+# How often a follower tries to take over leadership, and the leader runs its due tasks
+LEADER_POLL_SECONDS = 1.0
+
+
+# ---------------------- FILE LOCKS ----------------------
+def _try_lock(f, blocking: bool) -> bool:
+    if fcntl is not None:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            return True
+        except BlockingIOError:
+            return False
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.01)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """Exclusive lock on a lock file, honoured by every process and thread that uses the same file.
+
+    The operating system drops the lock when the holder exits, so a crashed worker never
+    leaves it taken. One instance is one acquisition; create a new one per use.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+b")
+        if not _try_lock(f, blocking):
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            _unlock(self._file)
+            self._file.close()
+            self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class PathLocks:
+    """Write locks by file path, shared by all worker processes through lock files in ``lock_dir``."""
+
+    def __init__(self, lock_dir: str, stripes: int = PATH_LOCK_STRIPES):
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+
+    def _stripe(self, path: str) -> int:
+        key = os.path.normcase(os.path.abspath(path)).encode("utf-8", "surrogateescape")
+        return int.from_bytes(hashlib.blake2b(key, digest_size=4).digest(), "big") % self.stripes
+
+    @contextmanager
+    def hold(self, *paths: str):
+        """Lock every path given (None entries are skipped), always in the same order so two holders cannot deadlock."""
+        locks = [FileLock(os.path.join(self.lock_dir, f"path-{stripe:03d}.lock"))
+                 for stripe in sorted({self._stripe(path) for path in paths if path})]
+        try:
+            for lock in locks:
+                lock.acquire()
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+
+# ---------------------- LEADER ----------------------
+class Leader:
+    """Elects one worker process to run the background work that must not run N times.
+
+    Whoever holds ``lock_path`` is the leader. Followers keep trying, so when the leader
+    exits the next one takes over within ``poll_seconds``. Tasks registered with ``every``
+    only run in the leader, on a background thread.
+    """
+
+    def __init__(self, lock_path: str, poll_seconds: float = LEADER_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._lock = FileLock(lock_path)
+        self._tasks: List[list] = []  # [interval, fn, next due]
+        self._stop = threading.Event()
+        self._thread = None
+        self.elected_at = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock.held
+
+    def every(self, seconds: float, fn: Callable[[], object]):
+        """Run ``fn`` in the leader right after election, then every ``seconds``."""
+        self._tasks.append([seconds, fn, 0.0])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="myst-leader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.is_leader and self._lock.acquire(blocking=False):
+                self.elected_at = time.time()
+            if self.is_leader:
+                self._run_due()
+            self._stop.wait(self.poll_seconds)
+
+    def _run_due(self):
+        now = time.monotonic()
+        for task in self._tasks:
+            interval, fn, due = task
+            if now < due:
+                continue
+            try:
+                fn()
+            except Exception:
+                traceback.print_exc()
+            task[2] = time.monotonic() + interval
+
+    def stats(self) -> dict:
+        return {"pid": os.getpid(), "leader": int(self.is_leader), "tasks": len(self._tasks)}
@@ -0,0 +1,102 @@
+import bisect
+import os
+from typing import AbstractSet, List, Optional, Tuple
+
+from content_cache import LRUCache
+
+# Entries returned per page when the client does not ask for a size, and the most it may ask for
+DEFAULT_PAGE = 200
+MAX_PAGE = 1000
+
+# Sort key of one entry: folders first, then case-insensitive name (the name breaks ties)
+EntryKey = Tuple[int, str, str]
+
+
+class DirListing:
+    """One folder level at a time, paginated, straight from ``os.scandir``.
+
+    The file type comes from the directory entry itself, so listing costs no stat per
+    entry. Sorted listings are cached by (folder, mtime): adding, removing or renaming an
+    entry changes the folder's mtime, so later pages of an unchanged folder are cheap.
+    """
+
+    def __init__(self, max_bytes: int):
+        self._cache = LRUCache(max_bytes)
+
+    def _entries(self, full_path: str) -> List[EntryKey]:
+        mtime = os.stat(full_path).st_mtime_ns
+        key = (full_path, mtime)
+        entries = self._cache.get(key)
+        if entries is None:
+            entries = []
+            with os.scandir(full_path) as it:
+                for entry in it:
+                    # Dotfiles are editor/upload temporaries
+                    if not entry.name.startswith("."):
+                        entries.append((0 if entry.is_dir() else 1, entry.name.lower(), entry.name))
+            entries.sort()
+            self._cache.put(key, entries, sum(len(name) * 2 + 80 for _, _, name in entries) + 64)
+        return entries
+
+    def counts(self, full_path: str, ext_filter: Optional[AbstractSet[str]] = None) -> dict:
+        """Number of sub-folders and (matching) files directly in ``full_path``."""
+        folders = files = 0
+        for is_file, _, name in self._entries(full_path):
+            if not is_file:
+                folders += 1
+            elif _accepts(name, ext_filter):
+                files += 1
+        return {"folders": folders, "files": files}
+
+    def page(self, base: str, rel: str, cursor: Optional[str] = None, limit: int = DEFAULT_PAGE,
+             kind: Optional[str] = None, ext_filter: Optional[AbstractSet[str]] = None) -> dict:
+        """
+        Entries of the folder ``rel`` (relative to ``base``) after ``cursor``; ``kind`` keeps only
+        "folder" or "file" entries and ``ext_filter`` narrows the files. Raises FileNotFoundError
+        or NotADirectoryError for a missing folder, ValueError for a malformed cursor.
+        """
+        full_path = os.path.join(base, rel) if rel else base
+        entries = self._entries(full_path)
+        start = bisect.bisect_right(entries, decode_cursor(cursor)) if cursor else 0
+        limit = max(1, min(limit, MAX_PAGE))
+
+        result = []
+        next_cursor = None
+        for entry in entries[start:]:
+            is_file, _, name = entry
+            if (kind == "folder" and is_file) or (kind == "file" and not is_file):
+                continue
+            if is_file and not _accepts(name, ext_filter):
+                continue
+            if len(result) == limit:
+                next_cursor = encode_cursor(last)
+                break
+            path = f"{rel}/{name}" if rel else name
+            item = {"type": "file" if is_file else "folder", "name": name, "path": path}
+            if not is_file:
+                try:
+                    item.update(self.counts(os.path.join(full_path, name), ext_filter))
+                except OSError:
+                    # Removed or unreadable since the listing was taken
+                    item.update(folders=0, files=0)
+            result.append(item)
+            last = entry
+        return {"path": rel, "entries": result, "next_cursor": next_cursor}
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+def _accepts(name: str, ext_filter: Optional[AbstractSet[str]]) -> bool:
+    return not ext_filter or os.path.splitext(name)[1].lower() in ext_filter
+
+
+def encode_cursor(entry: EntryKey) -> str:
+    return f"{entry[0]}/{entry[2]}"
+
+
+def decode_cursor(cursor: str) -> EntryKey:
+    is_file, sep, name = cursor.partition("/")
+    if not sep or is_file not in ("0", "1"):
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return int(is_file), name.lower(), name
@@ -0,0 +1,137 @@
+import os
+import shutil
+import traceback
+import uuid
+from typing import Callable, List, Optional
+
+
+class BatchError(Exception):
+    """An operation of a batch cannot be applied; nothing of the batch is."""
+
+    def __init__(self, error: str, status: int, **extra):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+        self.extra = extra
+
+
+def disk_kind(path: str) -> Optional[str]:
+    if os.path.isdir(path):
+        return "folder"
+    if os.path.exists(path):
+        return "file"
+    return None
+
+
+# ---------------------- PLANNING ----------------------
+class PlannedTree:
+    """The folder as it will be after the operations planned so far, computed without touching the disk.
+
+    Each planned operation is an override on top of the disk: a path set to a kind (None
+    for deleted, which hides everything below it too), or a path that now holds what
+    another one held. Lookups walk the overrides from the newest back to the disk.
+    """
+
+    def __init__(self):
+        self._overrides = []  # ("set", path, kind) | ("moved", new, old)
+
+    def kind(self, path: str) -> Optional[str]:
+        for op, a, b in reversed(self._overrides):
+            if op == "set":
+                if path == a:
+                    return b
+                if b is None and path.startswith(a + os.sep):
+                    return None
+            else:
+                if path == a or path.startswith(a + os.sep):
+                    path = b + path[len(a):]
+                elif path == b or path.startswith(b + os.sep):
+                    return None
+        return disk_kind(path)
+
+    def exists(self, path: str) -> bool:
+        return self.kind(path) is not None
+
+    def _parents(self, path: str):
+        """Check that ``path`` can be placed, and plan the folders leading to it."""
+        missing = []
+        parent = os.path.dirname(path)
+        while True:
+            kind = self.kind(parent)
+            if kind == "folder":
+                break
+            if kind == "file":
+                raise BatchError("A file is in the way: the path needs it to be a folder", 400)
+            missing.append(parent)
+            parent = os.path.dirname(parent)
+        for folder in reversed(missing):
+            self._overrides.append(("set", folder, "folder"))
+
+    def create(self, path: str, kind: str):
+        self._parents(path)
+        self._overrides.append(("set", path, kind))
+
+    def delete(self, path: str):
+        self._overrides.append(("set", path, None))
+
+    def move(self, old: str, new: str):
+        self._parents(new)
+        self._overrides.append(("moved", new, old))
+
+
+# ---------------------- APPLYING ----------------------
+class Journal:
+    """Undo log of a batch being applied.
+
+    Every change is recorded with the step that reverts it. Deleted and overwritten
+    entries are parked in a trash folder instead of removed, so a rollback can bring
+    them back; ``commit`` empties the trash once the whole batch went through.
+    """
+
+    def __init__(self, trash_dir: str):
+        self.trash = os.path.join(trash_dir, uuid.uuid4().hex)
+        self.created: List[str] = []  # folders made on the way, which the caller may want to report
+        self._undo: List[Callable[[], object]] = []
+
+    def makedirs(self, folder: str):
+        missing = []
+        while not os.path.isdir(folder):
+            missing.append(folder)
+            folder = os.path.dirname(folder)
+        for folder in reversed(missing):
+            os.mkdir(folder)
+            self.created.append(folder)
+            self._undo.append(lambda folder=folder: os.rmdir(folder))
+
+    def create(self, path: str, kind: str):
+        self.makedirs(os.path.dirname(path))
+        if kind == "folder":
+            self.makedirs(path)
+        else:
+            open(path, "x", encoding="utf-8").close()
+            self._undo.append(lambda: os.remove(path))
+
+    def move(self, old: str, new: str):
+        self.makedirs(os.path.dirname(new))
+        os.rename(old, new)
+        self._undo.append(lambda: os.rename(new, old))
+
+    def park(self, path: str):
+        """Move ``path`` out of the way; it is removed for good on commit."""
+        os.makedirs(self.trash, exist_ok=True)
+        parked = os.path.join(self.trash, str(len(self._undo)))
+        shutil.move(path, parked)
+        self._undo.append(lambda: shutil.move(parked, path))
+
+    def rollback(self):
+        for undo in reversed(self._undo):
+            try:
+                undo()
+            except OSError:
+                traceback.print_exc()
+        self._undo = []
+        shutil.rmtree(self.trash, ignore_errors=True)
+
+    def commit(self):
+        self._undo = []
+        shutil.rmtree(self.trash, ignore_errors=True)
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+
+import metrics
+
+FILES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+"""
+
+
+# ---------------------- FILE INDEX ----------------------
+class FileIndex:
+    """Base of the indexes kept in SQLite about the files below ``base``, one file at a time.
+
+    A file is re-read only when its size or mtime differ from what was indexed, so
+    ``sync`` after a restart only stats the tree, and ``update`` after a save re-indexes
+    just that file (or the files below a moved folder). Subclasses say which files they
+    take, derive their rows in ``_store`` and drop them in ``_forget``.
+    """
+
+    # Bumped by a subclass whenever what it derives changes; an index of another version is rebuilt
+    VERSION = 1
+    SCHEMA = ""
+    TABLES: List[str] = []
+    # Route name the bytes read are counted under in the metrics
+    NAME = "index"
+
+    def __init__(self, db_path: str, base: str):
+        self.base = base
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            self._db.executescript("".join(f"DROP TABLE IF EXISTS {table};" for table in ["documents", *self.TABLES]))
+            self._db.execute(f"PRAGMA user_version = {self.VERSION}")
+        self._db.executescript(FILES_SCHEMA + self.SCHEMA)
+        self._lock = threading.Lock()
+        self._stats = {"indexed": 0, "removed": 0}
+
+    def accepts(self, rel: str) -> bool:
+        return rel.lower().endswith(".md")
+
+    def reads(self, rel: str) -> bool:
+        """Whether ``_store`` needs the file's text; otherwise only its presence is recorded."""
+        return True
+
+    def _read(self, full_path: str, rel: str, st: os.stat_result):
+        """What ``_store`` derives the rows from: the file's text, or None when ``reads`` says it is not needed."""
+        if not self.reads(rel):
+            return None
+        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        metrics.file_bytes("read", self.NAME, st.st_size)
+        return text
+
+    def _store(self, doc_id: int, rel: str, data):
+        """Replace what is derived from the file (lock held, inside the write transaction)."""
+
+    def _forget(self, ids: List[int]):
+        """Drop what is derived from these files (lock held, inside the write transaction)."""
+
+    def _rel(self, full_path: str) -> Optional[str]:
+        full_path = os.path.abspath(full_path)
+        if not full_path.startswith(self.base + os.sep):
+            return None
+        return os.path.relpath(full_path, self.base).replace("\\", "/")
+
+    def _wanted(self, rel: str) -> bool:
+        return not any(part.startswith(".") for part in rel.split("/")) and self.accepts(rel)
+
+    # ---------------------- UPDATES ----------------------
+    def sync(self):
+        """Index new and changed files and drop the ones that are gone."""
+        seen = set()
+        for folder, dirs, files in os.walk(self.base):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for name in files:
+                full_path = os.path.join(folder, name)
+                rel = self._rel(full_path)
+                if rel and self._wanted(rel):
+                    seen.add(rel)
+                    self._index(full_path)
+        with self._lock:
+            self._delete([doc_id for doc_id, path in self._db.execute("SELECT id, path FROM documents")
+                          if path not in seen])
+
+    def update(self, full_path: str):
+        """Bring the index in line with ``full_path`` on disk: a file, a folder, or a path that is gone."""
+        rel = self._rel(full_path)
+        if not rel:
+            return
+        if os.path.isdir(full_path):
+            for folder, _, files in os.walk(full_path):
+                for name in files:
+                    child = os.path.join(folder, name)
+                    if self._wanted(self._rel(child)):
+                        self._index(child)
+        elif os.path.isfile(full_path):
+            if self._wanted(rel):
+                self._index(full_path)
+        else:
+            # A deleted or moved away folder takes its files along
+            prefix = rel + "/"
+            with self._lock:
+                self._delete([doc_id for doc_id, in self._db.execute(
+                    "SELECT id FROM documents WHERE path = ? OR substr(path, 1, ?) = ?", (rel, len(prefix), prefix))])
+
+    def _index(self, full_path: str):
+        rel = self._rel(full_path)
+        try:
+            st = os.stat(full_path)
+            with self._lock:
+                row = self._db.execute("SELECT mtime_ns, size FROM documents WHERE path = ?", (rel,)).fetchone()
+            if row == (st.st_mtime_ns, st.st_size):
+                return
+            data = self._read(full_path, rel, st)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            # The first write starts the transaction, so another worker indexing the same path waits here
+            self._db.execute("INSERT OR IGNORE INTO documents (path, mtime_ns, size) VALUES (?, ?, ?)",
+                             (rel, st.st_mtime_ns, st.st_size))
+            self._db.execute("UPDATE documents SET mtime_ns = ?, size = ? WHERE path = ?",
+                             (st.st_mtime_ns, st.st_size, rel))
+            doc_id = self._db.execute("SELECT id FROM documents WHERE path = ?", (rel,)).fetchone()[0]
+            self._store(doc_id, rel, data)
+            self._db.commit()
+            self._stats["indexed"] += 1
+
+    def _delete(self, ids: List[int]):
+        """Remove files by id (lock held)."""
+        if not ids:
+            return
+        self._forget(ids)
+        self._db.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in ids])
+        self._db.commit()
+        self._stats["removed"] += len(ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents = self._db.execute("SELECT count(*) FROM documents").fetchone()[0]
+            return {"documents": documents, **self._stats}
+
+
+# ---------------------- FILESYSTEM WATCHER ----------------------
+class _IndexEventHandler(FileSystemEventHandler):
+    def __init__(self, index: FileIndex, is_leader: Callable[[], bool]):
+        self.index = index
+        self.is_leader = is_leader
+
+    def on_any_event(self, event):
+        # Every worker sees the event; one re-indexing it is enough, and the others' own writes are indexed by them
+        if not self.is_leader():
+            return
+        if event.event_type in ("opened", "closed_no_write") or event.is_directory and event.event_type == "modified":
+            return
+        paths = [event.src_path] + ([event.dest_path] if event.event_type == "moved" else [])
+        for path in map(os.fsdecode, paths):
+            try:
+                self.index.update(path)
+            except (OSError, sqlite3.Error):
+                # The path moved on while being read; its own event follows
+                pass
+
+
+def watch_index(observer, index: FileIndex, is_leader: Callable[[], bool]):
+    """
+    Re-index files changed on disk outside the editor (checkouts, other tools), on an existing
+    observer. Only the leader does; what happens while leadership moves is caught by ``sync``.
+    """
+    observer.schedule(_IndexEventHandler(index, is_leader), index.base, recursive=True)
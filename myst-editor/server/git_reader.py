@@ -0,0 +1,208 @@
+import queue
+import re
+import subprocess
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import metrics
+
+# Specs sent to --batch-check before reading answers back, small enough that neither pipe fills up
+CHECK_CHUNK = 256
+# A spec containing one of these would be read by cat-file as several requests, leaving extra answers queued
+UNSAFE_SPEC_CHARS = re.compile(r"[\n\r\0]")
+OBJECT_NAME = re.compile(r"[0-9a-f]{40}|[0-9a-f]{64}")
+OBJECT_TYPES = {"blob", "tree", "commit", "tag"}
+# Sent after every request: its "missing" answer must come right after the requested ones,
+# which shows that they answered this request and not an earlier one
+SYNC_SPEC = "0" * 40
+SYNC_ANSWER = f"{SYNC_SPEC} missing\n".encode()
+
+
+def check_spec(spec: str):
+    """Raise ValueError for an object name cat-file can't take as one request line."""
+    if UNSAFE_SPEC_CHARS.search(spec):
+        raise ValueError(f"Invalid object name {spec!r}")
+
+
+class _CatFile:
+    """One persistent ``git cat-file`` process, (re)started on demand."""
+
+    def __init__(self, repo_dir: str, mode: str, pool: "GitReaderPool"):
+        self.repo_dir = repo_dir
+        self.mode = mode
+        self.pool = pool
+        self.proc = None
+
+    def ensure(self) -> subprocess.Popen:
+        if self.proc is None or self.proc.poll() is not None:
+            if self.proc is not None:
+                self.pool._count("restarts")
+            self.proc = subprocess.Popen(
+                ["git", "cat-file", self.mode], cwd=self.repo_dir,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+            self.pool._count("spawned")
+        return self.proc
+
+    def close(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+
+def _parse_header(header: bytes, spec: str) -> Optional[Tuple[str, str, int]]:
+    """
+    The answer to ``spec``. An answer that can't be to it (another spec reported missing,
+    another sha, a malformed line) means the stream is out of sync: ValueError, and the
+    pool restarts the process rather than hand out another object's content.
+    """
+    if not header:
+        raise BrokenPipeError("git cat-file exited")
+    header = header.rstrip(b"\n")
+    # "<spec> missing" / "<spec> ambiguous"; the spec itself may contain spaces
+    for status in (b" missing", b" ambiguous"):
+        if header.endswith(status):
+            if header[:-len(status)] != spec.encode("utf-8"):
+                raise ValueError(f"git cat-file answered {header!r} to {spec!r}")
+            return None
+    parts = header.decode("utf-8", errors="replace").split()
+    if len(parts) != 3 or not OBJECT_NAME.fullmatch(parts[0]) or parts[1] not in OBJECT_TYPES or not parts[2].isdigit():
+        raise ValueError(f"git cat-file answered {header!r} to {spec!r}")
+    sha, obj_type, size = parts
+    if OBJECT_NAME.fullmatch(spec) and sha != spec:
+        raise ValueError(f"git cat-file answered {sha} to {spec}")
+    return sha, obj_type, int(size)
+
+
+def _expect_sync(proc: subprocess.Popen):
+    line = proc.stdout.readline()
+    if not line:
+        raise BrokenPipeError("git cat-file exited")
+    if line != SYNC_ANSWER:
+        raise ValueError("git cat-file answers are out of sync with the requests")
+
+
+class _Reader:
+    def __init__(self, repo_dir: str, pool: "GitReaderPool"):
+        self.batch = _CatFile(repo_dir, "--batch", pool)
+        self.check = _CatFile(repo_dir, "--batch-check", pool)
+
+    def read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        proc = self.batch.ensure()
+        proc.stdin.write(f"{spec}\n{SYNC_SPEC}\n".encode("utf-8"))
+        proc.stdin.flush()
+        header = _parse_header(proc.stdout.readline(), spec)
+        if header is None:
+            _expect_sync(proc)
+            return None
+        sha, obj_type, size = header
+        data = proc.stdout.read(size)
+        if len(data) != size:
+            raise BrokenPipeError("git cat-file exited mid-object")
+        if proc.stdout.read(1) != b"\n":
+            raise ValueError(f"git cat-file sent more than {size} bytes for {sha}")
+        _expect_sync(proc)
+        return sha, obj_type, data
+
+    def info(self, specs: List[str]) -> List[Optional[Tuple[str, str, int]]]:
+        proc = self.check.ensure()
+        result = []
+        for i in range(0, len(specs), CHECK_CHUNK):
+            chunk = specs[i:i + CHECK_CHUNK]
+            proc.stdin.write("".join(spec + "\n" for spec in chunk + [SYNC_SPEC]).encode("utf-8"))
+            proc.stdin.flush()
+            result.extend(_parse_header(proc.stdout.readline(), spec) for spec in chunk)
+            _expect_sync(proc)
+        return result
+
+    def close(self):
+        self.batch.close()
+        self.check.close()
+
+
+# ---------------------- READER POOL ----------------------
+class GitReaderPool:
+    """Pool of long-lived ``git cat-file --batch`` / ``--batch-check`` readers.
+
+    Replaces one git process per call with a handful of persistent ones shared by all
+    git-reading routes. A reader whose process died is restarted and the call retried once.
+    """
+
+    def __init__(self, repo_dir: str, size: int):
+        self.repo_dir = repo_dir
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "objects": 0, "spawned": 0, "restarts": 0,
+                       "wait_seconds": 0.0, "busy_seconds": 0.0}
+        for _ in range(size):
+            self._idle.put(_Reader(repo_dir, self))
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _call(self, method: str, arg, objects: int):
+        start = time.perf_counter()
+        reader = self._idle.get()
+        acquired = time.perf_counter()
+        try:
+            try:
+                return getattr(reader, method)(arg)
+            except (BrokenPipeError, ValueError, OSError):
+                # The process crashed or the stream is out of sync: start fresh and retry once
+                self._count("restarts")
+                reader.close()
+                return getattr(reader, method)(arg)
+        finally:
+            self._idle.put(reader)
+            busy = time.perf_counter() - acquired
+            metrics.git_read(method, objects, busy)
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["objects"] += objects
+                self._stats["wait_seconds"] += acquired - start
+                self._stats["busy_seconds"] += busy
+
+    def read(self, spec: str) -> Optional[Tuple[str, str, bytes]]:
+        """``(sha, type, data)`` of the object named by ``spec`` (sha, ref, ``<tree-ish>:<path>``), or None."""
+        check_spec(spec)
+        return self._call("read", spec, 1)
+
+    def info(self, specs: List[str]) -> List[Optional[Tuple[str, str, int]]]:
+        """``(sha, type, size)`` for each spec (None if missing), resolved in one pipelined batch."""
+        if not specs:
+            return []
+        for spec in specs:
+            check_spec(spec)
+        return self._call("info", specs, len(specs))
+
+    def resolve(self, spec: str) -> Optional[str]:
+        info = self.info([spec])[0]
+        return info[0] if info else None
+
+    def blob_at(self, tree: str, path: str) -> Optional[Tuple[str, bytes]]:
+        """
+        ``(sha, data)`` of the blob at ``path`` in ``tree``, or None if there is none. The
+        path is resolved to a sha first and the blob read by that sha, so what is returned
+        is known to be the object at the path, fit to be cached under it.
+        """
+        info = self.info([f"{tree}:{path}"])[0]
+        if info is None or info[1] != "blob":
+            return None
+        obj = self.read(info[0])
+        if obj is None or obj[0] != info[0]:
+            raise ValueError(f"git returned another object for {tree}:{path}")
+        return obj[0], obj[2]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update(size=self.size, idle=self._idle.qsize())
+        return stats
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
@@ -0,0 +1,152 @@
+import difflib
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from content_cache import LRUCache
+from git_reader import GitReaderPool
+
+TREE_MODE = b"40000"
+# Added and deleted files compared by content for renames, at most, as git's diff.renameLimit
+RENAME_LIMIT = 1000
+# Share of lines a deleted and an added file must have in common to count as a rename (git's -M default)
+RENAME_SIMILARITY = 0.5
+
+
+def parse_tree(data: bytes) -> Iterator[Tuple[bytes, str, str]]:
+    """``(mode, name, sha)`` of each entry of a raw git tree object."""
+    i = 0
+    while i < len(data):
+        space = data.index(b" ", i)
+        nul = data.index(b"\0", space)
+        yield data[i:space], data[space + 1:nul].decode("utf-8", errors="replace"), data[nul + 1:nul + 21].hex()
+        i = nul + 21
+
+
+# ---------------------- MARKDOWN FILES PER TREE ----------------------
+class MarkdownTrees:
+    """Markdown file paths below a git tree, cached by tree sha.
+
+    A tree sha always names the same content, so entries never go stale. Each subtree
+    is cached on its own: listing a new commit only reads the subtrees that changed
+    since a commit already seen, everything else is a cache hit.
+    """
+
+    def __init__(self, reader: GitReaderPool, cache: LRUCache, ext: str = ".md"):
+        self.reader = reader
+        self.ext = ext
+        self._cache = cache
+
+    def files(self, tree: str) -> FrozenSet[str]:
+        """Paths relative to ``tree`` of every file with the configured extension."""
+        cached = self._cache.get(tree)
+        if cached is not None:
+            return cached
+        obj = self.reader.read(tree)
+        if obj is None or obj[1] != "tree":
+            raise KeyError(tree)
+        paths = set()
+        for mode, name, sha in parse_tree(obj[2]):
+            if mode == TREE_MODE:
+                paths.update(f"{name}/{path}" for path in self.files(sha))
+            elif name.endswith(self.ext) and not mode.startswith(b"16"):
+                # 160000 entries are submodule commits, not files
+                paths.add(name)
+        paths = frozenset(paths)
+        self._cache.put(tree, paths, sum(len(path) + 64 for path in paths) + 64)
+        return paths
+
+    def union(self, left: Optional[str], right: Optional[str]) -> FrozenSet[str]:
+        """Files in either tree; None stands for a commit without the folder."""
+        if left == right:
+            return self.files(left) if left else frozenset()
+        return frozenset().union(*(self.files(tree) for tree in (left, right) if tree))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+# ---------------------- TREE DIFF ----------------------
+def _entries(reader: GitReaderPool, tree: Optional[str]) -> Dict[str, Tuple[bytes, str]]:
+    if tree is None:
+        return {}
+    obj = reader.read(tree)
+    if obj is None or obj[1] != "tree":
+        raise KeyError(tree)
+    return {name: (mode, sha) for mode, name, sha in parse_tree(obj[2])}
+
+
+def _changed(reader: GitReaderPool, left: Optional[str], right: Optional[str], prefix: str,
+             deleted: Dict[str, str], added: Dict[str, str], modified: List[str]):
+    """Files that differ below two trees; subtrees with the same sha are not read at all."""
+    if left == right:
+        return
+    old_entries, new_entries = _entries(reader, left), _entries(reader, right)
+    for name in old_entries.keys() | new_entries.keys():
+        old, new = old_entries.get(name), new_entries.get(name)
+        if old == new:
+            continue
+        path = prefix + name
+        old_tree = old is not None and old[0] == TREE_MODE
+        new_tree = new is not None and new[0] == TREE_MODE
+        if old_tree or new_tree:
+            _changed(reader, old[1] if old_tree else None, new[1] if new_tree else None, path + "/",
+                     deleted, added, modified)
+        if old is not None and new is not None and not old_tree and not new_tree:
+            modified.append(path)
+            continue
+        if old is not None and not old_tree:
+            deleted[path] = old[1]
+        if new is not None and not new_tree:
+            added[path] = new[1]
+
+
+def _lines(reader: GitReaderPool, sha: str) -> List[bytes]:
+    obj = reader.read(sha)
+    return obj[2].splitlines() if obj is not None else []
+
+
+def _renames(reader: GitReaderPool, deleted: Dict[str, str], added: Dict[str, str]) -> List[Tuple[str, str]]:
+    """Pairs ``(old, new)`` of a deleted and an added file holding the same or similar content."""
+    pairs = []
+    by_sha: Dict[str, List[str]] = {}
+    for path in sorted(added):
+        by_sha.setdefault(added[path], []).append(path)
+    for old in sorted(deleted):
+        if by_sha.get(deleted[old]):
+            pairs.append((old, by_sha[deleted[old]].pop(0)))
+    paired = {path for pair in pairs for path in pair}
+    olds = sorted(path for path in deleted if path not in paired)
+    news = sorted(path for path in added if path not in paired)
+    if not olds or not news or len(olds) * len(news) > RENAME_LIMIT:
+        return pairs
+    new_lines = {new: _lines(reader, added[new]) for new in news}
+    scored = []
+    for old in olds:
+        old_lines = _lines(reader, deleted[old])
+        for new in news:
+            score = difflib.SequenceMatcher(None, old_lines, new_lines[new], autojunk=False).ratio()
+            if score >= RENAME_SIMILARITY:
+                scored.append((-score, old, new))
+    for _, old, new in sorted(scored):
+        if old not in paired and new not in paired:
+            pairs.append((old, new))
+            paired.update((old, new))
+    return pairs
+
+
+def diff_trees(reader: GitReaderPool, left: Optional[str], right: Optional[str], prefix: str = "") -> List[dict]:
+    """
+    Files changed between two trees (None for a missing one) as ``git diff-tree -r -M``
+    reports them: ``old_path``, ``new_path`` and a status of A, D, M or R, by path.
+    Paths are relative to the trees, below ``prefix``.
+    """
+    deleted: Dict[str, str] = {}
+    added: Dict[str, str] = {}
+    modified: List[str] = []
+    _changed(reader, left, right, prefix, deleted, added, modified)
+    result = [{"old_path": path, "new_path": path, "status": "M"} for path in modified]
+    for old, new in _renames(reader, deleted, added):
+        del deleted[old], added[new]
+        result.append({"old_path": old, "new_path": new, "status": "R"})
+    result += [{"old_path": path, "new_path": path, "status": "D"} for path in deleted]
+    result += [{"old_path": path, "new_path": path, "status": "A"} for path in added]
+    return sorted(result, key=lambda change: (change["new_path"], change["old_path"]))
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import posixpath
+import re
+import struct
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import metrics
+from file_index import FileIndex
+
+# Bumped whenever what is recorded changes; an index of another version is rebuilt
+IMAGE_INDEX_VERSION = 1
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg", ".webp", ".avif", ".ico", ".tif", ".tiff"}
+# Enough of a file for the dimensions of every format read below (JPEG may put its frame header after the EXIF data)
+HEAD_BYTES = 64 * 1024
+HASH_CHUNK = 1024 * 1024
+# Hashes of files written here that the index has not picked up yet; beyond this they are simply read again
+KNOWN_MAX = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    mime TEXT
+);
+CREATE INDEX IF NOT EXISTS images_hash ON images (hash);
+CREATE INDEX IF NOT EXISTS images_folder ON images (folder, name);
+"""
+
+SVG_LENGTH = re.compile(r"""\b(width|height)\s*=\s*["']\s*([\d.]+)(?:px)?\s*["']""")
+SVG_VIEWBOX = re.compile(r"""\bviewBox\s*=\s*["']\s*[-\d.]+[\s,]+[-\d.]+[\s,]+([\d.]+)[\s,]+([\d.]+)\s*["']""")
+
+
+class ImageInfo(NamedTuple):
+    mime: Optional[str]
+    width: Optional[int]
+    height: Optional[int]
+
+
+def image_info(head: bytes) -> ImageInfo:
+    """Type and pixel size of an image from its first bytes; None where the format is not recognised."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and len(head) >= 24:
+        return ImageInfo("image/png", *struct.unpack(">II", head[16:24]))
+    if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+        return ImageInfo("image/gif", *struct.unpack("<HH", head[6:10]))
+    if head.startswith(b"BM") and len(head) >= 26:
+        width, height = struct.unpack("<ii", head[18:26])
+        return ImageInfo("image/bmp", width, abs(height))
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return ImageInfo("image/webp", width & 0x3FFF, height & 0x3FFF)
+        if chunk == b"VP8L":
+            bits = int.from_bytes(head[21:25], "little")
+            return ImageInfo("image/webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+        if chunk == b"VP8X":
+            return ImageInfo("image/webp", int.from_bytes(head[24:27], "little") + 1,
+                             int.from_bytes(head[27:30], "little") + 1)
+        return ImageInfo("image/webp", None, None)
+    if head.startswith(b"\xff\xd8"):
+        i = 2
+        while i + 9 <= len(head):
+            if head[i] != 0xFF:
+                i += 1
+                continue
+            marker = head[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                i += 1 if marker == 0xFF else 2
+                continue
+            length = struct.unpack(">H", head[i + 2:i + 4])[0]
+            # Start-of-frame markers, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", head[i + 5:i + 9])
+                return ImageInfo("image/jpeg", width, height)
+            i += 2 + length
+        return ImageInfo("image/jpeg", None, None)
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return ImageInfo("image/avif", None, None)
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return ImageInfo("image/tiff", None, None)
+    if head.startswith(b"\x00\x00\x01\x00") and len(head) >= 8:
+        # Size of the first icon of the set; 0 stands for 256
+        return ImageInfo("image/x-icon", head[6] or 256, head[7] or 256)
+    text = head.decode("utf-8", errors="ignore")
+    if "<svg" in text:
+        tag = text[text.index("<svg"):].split(">", 1)[0]
+        lengths = dict(SVG_LENGTH.findall(tag))
+        if "width" in lengths and "height" in lengths:
+            return ImageInfo("image/svg+xml", round(float(lengths["width"])), round(float(lengths["height"])))
+        box = SVG_VIEWBOX.search(tag)
+        if box:
+            return ImageInfo("image/svg+xml", round(float(box.group(1))), round(float(box.group(2))))
+        return ImageInfo("image/svg+xml", None, None)
+    return ImageInfo(None, None, None)
+
+
+class HashingReader:
+    """Wraps an upload stream: hashes what is read through it and keeps its first bytes for ``image_info``."""
+
+    def __init__(self, src):
+        self.src = src
+        self.sha = hashlib.sha256()
+        self.head = b""
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.src.read(size)
+        self.sha.update(chunk)
+        if len(self.head) < HEAD_BYTES:
+            self.head += chunk[:HEAD_BYTES - len(self.head)]
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self.sha.hexdigest()
+
+
+# ---------------------- IMAGE INDEX ----------------------
+class ImageIndex(FileIndex):
+    """
+    Content hash, size, dimensions and type of every image below ``base``, so that
+    duplicate uploads, free names and folder listings are answered by one query instead
+    of reading and probing the folders. Images written by the server are recorded with
+    the hash computed while they streamed; only images changed elsewhere are read.
+    """
+
+    VERSION = IMAGE_INDEX_VERSION
+    SCHEMA = SCHEMA
+    TABLES = ["images"]
+    NAME = "image-index"
+
+    def __init__(self, db_path: str, base: str):
+        super().__init__(db_path, base)
+        # (device, inode, mtime_ns, size) -> (hash, head) of files just written here, saving a read back.
+        # A rename keeps all four, so an upload can be remembered while staged and found where it lands.
+        self._known: Dict[Tuple[int, int, int, int], Tuple[str, bytes]] = {}
+        self._known_lock = threading.Lock()
+        self._stats["duplicates"] = 0
+
+    def accepts(self, rel: str) -> bool:
+        return posixpath.splitext(rel)[1].lower() in IMAGE_EXTS
+
+    @staticmethod
+    def _identity(st: os.stat_result) -> Tuple[int, int, int, int]:
+        return st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size
+
+    def remember(self, full_path: str, digest: str, head: bytes):
+        """Hash and first bytes of a file just written (or staged to be renamed into place), for the index update that follows."""
+        st = os.stat(full_path)
+        with self._known_lock:
+            if len(self._known) >= KNOWN_MAX:
+                self._known.clear()
+            self._known[self._identity(st)] = (digest, head)
+
+    def _read(self, full_path: str, rel: str, st: os.stat_result):
+        with self._known_lock:
+            known = self._known.pop(self._identity(st), None)
+        if known is not None:
+            return known
+        sha = hashlib.sha256()
+        with open(full_path, "rb") as f:
+            head = f.read(HEAD_BYTES)
+            sha.update(head)
+            while chunk := f.read(HASH_CHUNK):
+                sha.update(chunk)
+        metrics.file_bytes("read", self.NAME, st.st_size)
+        return sha.hexdigest(), head
+
+    def _store(self, doc_id: int, rel: str, data):
+        digest, head = data
+        folder, name = posixpath.split(rel)
+        info = image_info(head)
+        size = self._db.execute("SELECT size FROM documents WHERE id = ?", (doc_id,)).fetchone()[0]
+        self._db.execute("INSERT OR REPLACE INTO images (id, folder, name, hash, size, width, height, mime) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (doc_id, folder, name, digest, size, info.width, info.height, info.mime))
+
+    def _forget(self, ids: List[int]):
+        self._db.executemany("DELETE FROM images WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    # ---------------------- QUERIES ----------------------
+    def find(self, digest: str, size: int, prefer_folder: str = "") -> Optional[str]:
+        """An image on disk with this content, from ``prefer_folder`` if it has one."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.path, d.mtime_ns, i.folder FROM images i JOIN documents d ON d.id = i.id "
+                "WHERE i.hash = ? AND i.size = ? ORDER BY i.folder != ?, d.path", (digest, size, prefer_folder)).fetchall()
+        for path, mtime_ns, _ in rows:
+            try:
+                st = os.stat(os.path.join(self.base, path))
+            except FileNotFoundError:
+                continue
+            # Only trust the recorded hash while the file is the one that was hashed
+            if (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+                with self._lock:
+                    self._stats["duplicates"] += 1
+                return path
+        return None
+
+    def hash_of(self, full_path: str) -> Optional[str]:
+        """Recorded hash of an image, if the file is still the one that was hashed."""
+        rel = self._rel(full_path)
+        try:
+            st = os.stat(full_path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT i.hash FROM images i JOIN documents d ON d.id = i.id "
+                "WHERE d.path = ? AND d.mtime_ns = ? AND d.size = ?", (rel, st.st_mtime_ns, st.st_size)).fetchone()
+        return row[0] if row else None
+
+    def names(self, folder: str) -> set:
+        """Names of the images in a docs-relative folder."""
+        with self._lock:
+            return {name for name, in self._db.execute("SELECT name FROM images WHERE folder = ?", (folder,))}
+
+    def listing(self, folder: str) -> List[dict]:
+        """Every image below a docs-relative folder with its metadata, sorted by path."""
+        prefix = folder + "/" if folder else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.path, i.hash, i.size, i.width, i.height, i.mime FROM images i JOIN documents d ON d.id = i.id "
+                "WHERE substr(d.path, 1, ?) = ? ORDER BY d.path", (len(prefix), prefix)).fetchall()
+        return [{"path": path, "hash": digest, "size": size, "width": width, "height": height, "mime": mime}
+                for path, digest, size, width, height, mime in rows]
@@ -0,0 +1,87 @@
+import difflib
+import hashlib
+from typing import List, Tuple
+
+
+def text_blob_sha(text: str) -> str:
+    """Sha git would give ``text`` as a blob, so working text and committed blobs share one key space."""
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def compute_hunks(left: str, right: str) -> List[List[int]]:
+    """
+    Line-level hunks between two texts as ``[left_start, left_count, right_start, right_count]``.
+    Starts are 1-based; for a pure insertion or deletion the empty side's start is the
+    line the change sits before.
+    """
+    matcher = difflib.SequenceMatcher(None, left.split("\n"), right.split("\n"), autojunk=False)
+    hunks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if hunks and hunks[-1][0] + hunks[-1][1] == i1 + 1 and hunks[-1][2] + hunks[-1][3] == j1 + 1:
+            hunks[-1][1] += i2 - i1
+            hunks[-1][3] += j2 - j1
+        else:
+            hunks.append([i1 + 1, i2 - i1, j1 + 1, j2 - j1])
+    return hunks
+
+
+def _sync_regions(base: List[str], ours: List[str], theirs: List[str]) -> List[tuple]:
+    """Base ranges unchanged on both sides, as ``(base_start, base_end, ours_start, ours_end, theirs_start, theirs_end)``."""
+    ours_blocks = difflib.SequenceMatcher(None, base, ours, autojunk=False).get_matching_blocks()
+    theirs_blocks = difflib.SequenceMatcher(None, base, theirs, autojunk=False).get_matching_blocks()
+    regions = []
+    i = j = 0
+    while i < len(ours_blocks) and j < len(theirs_blocks):
+        o_base, o_start, o_len = ours_blocks[i]
+        t_base, t_start, t_len = theirs_blocks[j]
+        start, end = max(o_base, t_base), min(o_base + o_len, t_base + t_len)
+        if start < end:
+            o = o_start + start - o_base
+            t = t_start + start - t_base
+            regions.append((start, end, o, o + end - start, t, t + end - start))
+        if o_base + o_len < t_base + t_len:
+            i += 1
+        else:
+            j += 1
+    regions.append((len(base), len(base), len(ours), len(ours), len(theirs), len(theirs)))
+    return regions
+
+
+def merge3(base: str, ours: str, theirs: str) -> Tuple[str, int]:
+    """
+    Line-based three-way merge of two edits of ``base``. Returns the merged text and the
+    number of conflicts; each conflict is left in the text between git-style markers.
+    """
+    base_lines = base.splitlines(keepends=True)
+    ours_lines = ours.splitlines(keepends=True)
+    theirs_lines = theirs.splitlines(keepends=True)
+    merged = []
+    conflicts = 0
+    b = o = t = 0
+    for b_start, b_end, o_start, o_end, t_start, t_end in _sync_regions(base_lines, ours_lines, theirs_lines):
+        base_chunk = base_lines[b:b_start]
+        ours_chunk = ours_lines[o:o_start]
+        theirs_chunk = theirs_lines[t:t_start]
+        if ours_chunk == theirs_chunk or theirs_chunk == base_chunk:
+            merged += ours_chunk
+        elif ours_chunk == base_chunk:
+            merged += theirs_chunk
+        else:
+            conflicts += 1
+            merged.append("<<<<<<< yours\n")
+            merged += _terminated(ours_chunk)
+            merged.append("=======\n")
+            merged += _terminated(theirs_chunk)
+            merged.append(">>>>>>> saved\n")
+        merged += base_lines[b_start:b_end]
+        b, o, t = b_end, o_end, t_end
+    return "".join(merged), conflicts
+
+
+def _terminated(lines: List[str]) -> List[str]:
+    if lines and not lines[-1].endswith(("\n", "\r")):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
@@ -0,0 +1,294 @@
+import posixpath
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote, unquote
+
+from file_index import FileIndex
+
+# Bumped whenever extraction or the schema changes; a graph of another version is rebuilt
+GRAPH_VERSION = 2
+# What /api/unused-assets reports by default: media the docs embed, not the theme's css and js
+MEDIA_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg", ".webp", ".avif", ".ico", ".tif", ".tiff",
+              ".pdf", ".mp4", ".webm", ".excalidraw"}
+# Directives whose argument is a path
+PATH_DIRECTIVES = {"image", "figure", "include", "literalinclude"}
+# Kinds that name a document and may leave out its extension
+DOC_KINDS = {"toctree", "doc"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    source INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS refs_target ON refs (target);
+CREATE INDEX IF NOT EXISTS refs_source ON refs (source);
+"""
+
+FRONT_MATTER = re.compile(r"\A---[ \t]*\r?\n.*?^---[ \t]*$", re.S | re.M)
+FENCE = re.compile(r"^[ \t]*(`{3,}|~{3,}|:{3,})[ \t]*(?:\{([^}\s]+)\})?(.*)$")
+# ](target) of a Markdown link or image; the label is found by walking back over the brackets
+INLINE_TARGET = re.compile(r"\]\([ \t]*(?:<([^<>\n]*)>|((?:[^\s()<>]|\([^\s()]*\))+))")
+REFERENCE_DEFINITION = re.compile(r"^[ \t]{0,3}\[[^\]]+\]:[ \t]*(?:<([^<>\n]*)>|(\S+))")
+ROLE = re.compile(r"\{(doc|download)\}`([^`]+)`")
+CODE_SPAN = re.compile(r"(?<!\})(`+)(.+?)\1")
+HTML_ATTRIBUTE = re.compile(r"<(?:img|a|source|video|audio|embed|iframe)\b[^>]*?\b(?:src|href)[ \t]*=[ \t]*"
+                            r"(?:\"([^\"]*)\"|'([^']*)')", re.I)
+# Explicit title of a toctree entry or role: Title <path>
+TITLED = re.compile(r"^(.*?)<([^<>]+)>\s*$")
+SCHEME = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.\-]*:")
+
+
+class Reference(NamedTuple):
+    kind: str  # "link" | "image" | "figure" | "include" | ... | "toctree" | "doc" | "download" | "html"
+    start: int  # span of the path in the text
+    end: int
+    raw: str
+    line: int
+    spaces: bool  # whether the path may hold a space as it is, or must quote it
+
+
+# ---------------------- EXTRACTION ----------------------
+def _label_is_image(line: str, close: int) -> bool:
+    """Whether the ``]`` at ``close`` ends the label of an image, ``![...]``."""
+    depth = 0
+    for i in range(close, -1, -1):
+        if line[i] == "]":
+            depth += 1
+        elif line[i] == "[":
+            depth -= 1
+            if depth == 0:
+                return i > 0 and line[i - 1] == "!"
+    return False
+
+
+def _titled(value: str, start: int) -> Tuple[str, int]:
+    """The path of ``Title <path>`` or of a bare ``path``, and where it starts."""
+    titled = TITLED.match(value)
+    if titled:
+        return titled.group(2), start + titled.start(2)
+    stripped = value.strip()
+    return stripped, (start + value.index(stripped) if stripped else start)
+
+
+def scan(text: str) -> Iterator[Reference]:
+    """Every path a MyST document refers to, with its span. Contents of code blocks are skipped."""
+    offset = 0
+    front_matter = FRONT_MATTER.match(text)
+    if front_matter:
+        offset = front_matter.end()
+    number = text.count("\n", 0, offset)
+    fences = []  # (marker, directive name) of the open fences
+    for line in text[offset:].splitlines(keepends=True):
+        start, number = offset, number + 1
+        offset += len(line)
+        line = line.rstrip("\r\n")
+        fence = FENCE.match(line)
+        if fence:
+            marker, name, rest = fence.groups()
+            if name:
+                fences.append((marker, name))
+                path = rest.strip()
+                if name in PATH_DIRECTIVES and path:
+                    at = start + fence.start(3) + rest.index(path)
+                    yield Reference(name, at, at + len(path), path, number, True)
+            elif fences and not rest.strip() and marker[0] == fences[-1][0][0] and len(marker) >= len(fences[-1][0]):
+                fences.pop()
+            else:
+                fences.append((marker, None))
+            continue
+
+        directive = fences[-1][1] if fences else "document"
+        if directive is None or directive in ("include", "literalinclude", "code-block", "code", "mermaid", "math"):
+            continue  # code or options, not Markdown
+        if directive == "toctree":
+            entry = line.strip()
+            if entry and not entry.startswith(":") and entry != "self" and not re.search(r"[*?\[]", entry):
+                path, at = _titled(line, start)
+                yield Reference("toctree", at, at + len(path), path, number, True)
+            continue
+
+        for role in ROLE.finditer(line):
+            path, at = _titled(role.group(2), start + role.start(2))
+            yield Reference(role.group(1), at, at + len(path), path, number, True)
+        # Roles first: the closing backtick of one would otherwise open a code span
+        blank = lambda m: " " * len(m.group(0))
+        masked = CODE_SPAN.sub(blank, ROLE.sub(blank, line))
+        for match in INLINE_TARGET.finditer(masked):
+            group = 1 if match.group(1) is not None else 2
+            kind = "image" if _label_is_image(masked, match.start()) else "link"
+            yield Reference(kind, start + match.start(group), start + match.end(group), match.group(group), number,
+                            group == 1)
+        definition = REFERENCE_DEFINITION.match(masked)
+        if definition:
+            group = 1 if definition.group(1) is not None else 2
+            yield Reference("link", start + definition.start(group), start + definition.end(group),
+                            definition.group(group), number, group == 1)
+        for match in HTML_ATTRIBUTE.finditer(masked):
+            group = 1 if match.group(1) is not None else 2
+            yield Reference("html", start + match.start(group), start + match.end(group), match.group(group), number,
+                            True)
+
+
+def _split(raw: str) -> Tuple[str, str]:
+    """Path and ``?query#fragment`` of a reference."""
+    cut = min((i for i in (raw.find("?"), raw.find("#")) if i >= 0), default=len(raw))
+    return raw[:cut], raw[cut:]
+
+
+def resolve(doc: str, raw: str, kind: str) -> Optional[str]:
+    """Docs-relative path ``raw`` refers to from ``doc``, None for URLs, anchors and paths outside the docs."""
+    path, _ = _split(raw.strip())
+    if not path or SCHEME.match(path) or path.startswith("//"):
+        return None
+    path = unquote(path)
+    joined = path.lstrip("/") if path.startswith("/") else posixpath.join(posixpath.dirname(doc), path)
+    joined = posixpath.normpath(joined) if joined else "."
+    if joined in (".", "..") or joined.startswith("../"):
+        return None
+    if kind in DOC_KINDS and not posixpath.splitext(joined)[1]:
+        joined += ".md"
+    return joined
+
+
+def retarget(ref: Reference, doc: str, target: str) -> str:
+    """``ref`` rewritten to point at ``target`` from ``doc``, in the style it was written in."""
+    path, suffix = _split(ref.raw.strip())
+    if ref.kind in DOC_KINDS and not posixpath.splitext(unquote(path))[1] and target.endswith(".md"):
+        target = target[:-3]
+    if path.startswith("/"):
+        new = "/" + target
+    else:
+        new = posixpath.relpath(target, posixpath.dirname(doc) or ".")
+        if path.startswith("./") and not new.startswith("../"):
+            new = "./" + new
+    if "%" in path or " " in new and not ref.spaces:
+        new = quote(new, safe="/")
+    return new + suffix
+
+
+def path_mapping(moves: Sequence[Tuple[str, str]]) -> Callable[[str], str]:
+    """Where a docs-relative path ends up after ``moves`` (old, new), applied in order; folders take their contents."""
+    def mapped(path: str) -> str:
+        for old, new in moves:
+            if path == old or path.startswith(old + "/"):
+                path = new + path[len(old):]
+        return path
+    return mapped
+
+
+def rewrite_links(text: str, doc_old: str, doc_new: str, mapping: Callable[[str], str]) -> str:
+    """
+    Point the references of a document at where their targets moved to. ``doc_old`` is
+    where the document was, relative links of which are resolved; ``doc_new`` is where it
+    is now, which they are written relative to.
+    """
+    parts, end = [], 0
+    same_folder = posixpath.dirname(doc_old) == posixpath.dirname(doc_new)
+    for ref in scan(text):
+        target = resolve(doc_old, ref.raw, ref.kind)
+        if target is None:
+            continue
+        new_target = mapping(target)
+        if new_target == target and (same_folder or ref.raw.startswith("/")):
+            continue
+        new = retarget(ref, doc_new, new_target)
+        if new != ref.raw.strip() and ref.start >= end:
+            parts += [text[end:ref.start], new]
+            end = ref.end
+    return "".join(parts) + text[end:] if parts else text
+
+
+# ---------------------- GRAPH ----------------------
+class LinkGraph(FileIndex):
+    """
+    Which document refers to which file: Markdown links and images, path directives
+    (image, figure, include, literalinclude), toctree entries, {doc}/{download} roles
+    and HTML src/href, resolved to paths below ``base``. Every file is tracked so that
+    targets nothing refers to can be listed; only documents are read.
+    """
+
+    VERSION = GRAPH_VERSION
+    SCHEMA = SCHEMA
+    TABLES = ["refs"]
+    NAME = "link-graph"
+
+    def accepts(self, rel: str) -> bool:
+        return True
+
+    def reads(self, rel: str) -> bool:
+        return rel.lower().endswith(".md")
+
+    def _store(self, doc_id: int, rel: str, text: Optional[str]):
+        self._db.execute("DELETE FROM refs WHERE source = ?", (doc_id,))
+        if text is None:
+            return
+        rows = {}
+        for ref in scan(text):
+            target = resolve(rel, ref.raw, ref.kind)
+            if target is not None:
+                rows.setdefault((target, ref.kind), ref.line)
+        self._db.executemany("INSERT INTO refs (source, target, kind, line) VALUES (?, ?, ?, ?)",
+                             [(doc_id, target, kind, line) for (target, kind), line in rows.items()])
+
+    def _forget(self, ids: List[int]):
+        self._db.executemany("DELETE FROM refs WHERE source = ?", [(doc_id,) for doc_id in ids])
+
+    # ---------------------- QUERIES ----------------------
+    def targets(self, rel: str) -> List[dict]:
+        """What the document refers to, with whether each target exists."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT r.target, r.kind, r.line, t.id IS NOT NULL FROM refs r JOIN documents d ON d.id = r.source "
+                "LEFT JOIN documents t ON t.path = r.target WHERE d.path = ? ORDER BY r.line", (rel,)).fetchall()
+        return [{"path": target, "kind": kind, "line": line, "exists": bool(exists)}
+                for target, kind, line, exists in rows]
+
+    def referrers(self, rel: str) -> List[dict]:
+        """Documents referring to ``rel`` or, for a folder, to anything below it."""
+        prefix = rel + "/"
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT d.path, r.target, r.kind, r.line FROM refs r JOIN documents d ON d.id = r.source "
+                "WHERE r.target = ? OR substr(r.target, 1, ?) = ? ORDER BY d.path, r.line",
+                (rel, len(prefix), prefix)).fetchall()
+        return [{"path": path, "target": target, "kind": kind, "line": line} for path, target, kind, line in rows]
+
+    def affected(self, paths: Iterable[str]) -> List[str]:
+        """Documents whose links a move of ``paths`` breaks: their referrers, and the documents moved along."""
+        found = set()
+        with self._lock:
+            for rel in paths:
+                prefix = rel + "/"
+                found.update(path for path, in self._db.execute(
+                    "SELECT d.path FROM refs r JOIN documents d ON d.id = r.source "
+                    "WHERE r.target = ? OR substr(r.target, 1, ?) = ?", (rel, len(prefix), prefix)))
+                found.update(path for path, in self._db.execute(
+                    "SELECT path FROM documents WHERE (path = ? OR substr(path, 1, ?) = ?) AND lower(path) LIKE '%.md'",
+                    (rel, len(prefix), prefix)))
+        return sorted(found)
+
+    def unused(self, folder: str = "", exts: Optional[set] = None) -> List[str]:
+        """Files below ``folder`` that no document refers to, documents excepted."""
+        prefix = folder + "/" if folder else ""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM documents WHERE substr(path, 1, ?) = ? AND lower(path) NOT LIKE '%.md' "
+                "AND NOT EXISTS (SELECT 1 FROM refs WHERE refs.target = documents.path) ORDER BY path",
+                (len(prefix), prefix)).fetchall()
+        return [path for path, in rows if exts is None or posixpath.splitext(path)[1].lower() in exts]
+
+    def referrer_counts(self, folder: str) -> Dict[str, int]:
+        """Number of documents referring to each file below ``folder`` that has any."""
+        prefix = folder + "/" if folder else ""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT target, count(DISTINCT source) FROM refs WHERE substr(target, 1, ?) = ? GROUP BY target",
+                (len(prefix), prefix)))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats["references"] = self._db.execute("SELECT count(*) FROM refs").fetchone()[0]
+        return stats
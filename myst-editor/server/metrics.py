@@ -0,0 +1,246 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Latency buckets in seconds, from cached reads to full-repository git commands
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Request header asking for a Server-Timing breakdown of that one request
+PROFILE_HEADER = "x-myst-profile"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# ---------------------- METRIC TYPES ----------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[_labels(labels)] += amount
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(labels)} {value:g}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count], sum
+        self._values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}"
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {total:g}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+REGISTRY = []
+# prefix -> list of (labels, stats function); see register_stats
+_STATS = defaultdict(list)
+
+
+def register_stats(prefix: str, stats: Callable[[], dict], **labels):
+    """Export the numeric values of a component's ``stats()`` dict as ``myst_<prefix>_<key>`` gauges."""
+    _STATS[prefix].append((_labels(labels), stats))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    for prefix, sources in _STATS.items():
+        families = defaultdict(list)
+        for labels, stats in sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    families[f"myst_{prefix}_{key}"].append((labels, value))
+        for name, samples in families.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{_format_labels(labels)} {value:g}" for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- SERVER METRICS ----------------------
+HTTP_REQUESTS = Counter("myst_http_requests_total", "HTTP requests by route and status.")
+HTTP_LATENCY = Histogram("myst_http_request_duration_seconds",
+                         "Time until the response headers were sent, by route.")
+HTTP_IN_FLIGHT = Gauge("myst_http_requests_in_flight", "Requests being handled (including open event streams).")
+GIT_READS = Counter("myst_git_object_reads_total", "Objects requested from the cat-file reader pool.")
+GIT_READ_SECONDS = Histogram("myst_git_object_read_seconds", "Time per cat-file reader call, by operation.")
+GIT_COMMANDS = Counter("myst_git_commands_total", "git subprocesses run, by subcommand.")
+GIT_COMMAND_SECONDS = Histogram("myst_git_command_seconds", "Time per git subprocess, by subcommand.")
+POOL_WAIT_SECONDS = Histogram("myst_pool_wait_seconds", "Time tasks waited for a worker thread, by pool.")
+FILE_BYTES = Counter("myst_file_bytes_total", "Bytes of document and upload content read or written, by route.")
+
+
+# ---------------------- PER-REQUEST PROFILE ----------------------
+class Profile:
+    """Time spent per category while handling one request, across the threads it used."""
+
+    def __init__(self):
+        self.spans = defaultdict(lambda: [0.0, 0])
+        self._lock = threading.Lock()
+
+    def add(self, category: str, seconds: float):
+        with self._lock:
+            span = self.spans[category]
+            span[0] += seconds
+            span[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        with self._lock:
+            spans = sorted(self.spans.items())
+        parts = [f'{name};dur={seconds * 1000:.2f};desc="{count}x"' for name, (seconds, count) in spans]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_profile: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("myst_profile", default=None)
+
+
+def profile_add(category: str, seconds: float):
+    profile = _profile.get()
+    if profile is not None:
+        profile.add(category, seconds)
+
+
+# ---------------------- HOOKS ----------------------
+def git_read(operation: str, objects: int, seconds: float):
+    GIT_READS.inc(objects, operation=operation)
+    GIT_READ_SECONDS.observe(seconds, operation=operation)
+    profile_add("git-read", seconds)
+
+
+@contextmanager
+def git_command(subcommand: str):
+    """Time one git subprocess."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        GIT_COMMANDS.inc(command=subcommand)
+        GIT_COMMAND_SECONDS.observe(elapsed, command=subcommand)
+        profile_add("git-cmd", elapsed)
+
+
+def pool_task(pool: str, waited: float, ran: float):
+    POOL_WAIT_SECONDS.observe(waited, pool=pool)
+    profile_add(f"{pool}-wait", waited)
+    profile_add(f"{pool}-run", ran)
+
+
+def file_bytes(direction: str, route: str, amount: int):
+    FILE_BYTES.inc(amount, direction=direction, route=route)
+
+
+# ---------------------- MIDDLEWARE ----------------------
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and status, and answering the profiling header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        wants_profile = any(name == PROFILE_HEADER.encode() for name, _ in scope["headers"])
+        profile = Profile() if wants_profile else None
+        token = _profile.set(profile)
+        HTTP_IN_FLIGHT.inc()
+        method = scope["method"]
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                # The matched route template, so URLs with parameters do not each get a series
+                route = scope.get("route")
+                path = getattr(route, "path", "other")
+                HTTP_LATENCY.observe(elapsed, method=method, route=path)
+                HTTP_REQUESTS.inc(method=method, route=path, status=str(message["status"]))
+                if profile is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", profile.server_timing(elapsed).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _profile.reset(token)
@@ -0,0 +1,53 @@
+"""
+Write precompressed .gz (and .br, when the brotli package is installed) variants next to
+the text assets in dist/, so the server can send them without compressing per request.
+
+Run after ``vite build`` (``npm run build`` does this); variants older than their source
+are ignored by the server, so a stale one is never sent.
+"""
+import gzip
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DIST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dist")
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".json", ".map", ".svg", ".txt", ".dic", ".aff", ".wasm"}
+# Below this the saving does not pay for the extra file
+MIN_SIZE = 1024
+
+
+def precompress(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    written = []
+    variants = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", lambda d: brotli.compress(d, quality=11)))
+    for suffix, compress in variants:
+        packed = compress(data)
+        # Skip variants that do not actually save anything
+        if len(packed) < len(data):
+            with open(path + suffix, "wb") as f:
+                f.write(packed)
+            written.append(suffix)
+    return written
+
+
+def main(dist_dir: str = DIST_DIR):
+    if brotli is None:
+        print("brotli is not installed, writing gzip variants only")
+    for root, _, files in os.walk(dist_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE or os.path.getsize(path) < MIN_SIZE:
+                continue
+            written = precompress(path)
+            print(f"{os.path.relpath(path, dist_dir)}: {' '.join(written) or 'not compressible'}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else DIST_DIR)
@@ -0,0 +1,119 @@
+import html
+import re
+from typing import Dict, List, Optional
+
+from file_index import FileIndex
+
+# Bumped whenever extraction or the schema changes; an index of another version is rebuilt
+INDEX_VERSION = 1
+# bm25 weights of the indexed columns: title, headings, directives, front_matter, body
+COLUMN_WEIGHTS = (10.0, 5.0, 2.0, 2.0, 1.0)
+# Tokens of context on either side of the matches in a snippet
+SNIPPET_TOKENS = 12
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search USING fts5(
+    title, headings, directives, front_matter, body,
+    tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+"""
+
+FRONT_MATTER = re.compile(r"\A---[ \t]*\r?\n(.*?)^---[ \t]*$", re.S | re.M)
+FRONT_MATTER_TITLE = re.compile(r"^title:[ \t]*['\"]?(.*?)['\"]?[ \t]*$", re.M)
+HEADING = re.compile(r"^[ \t]{0,3}(#{1,6})[ \t]+(.*?)[ \t#]*$")
+# ``` / ~~~ code fences and ::: colon fences, with an optional MyST directive name: ```{note}
+FENCE = re.compile(r"^[ \t]*(`{3,}|~{3,}|:{3,})[ \t]*(?:\{([^}\s]+)\})?(.*)$")
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# Marks around matches in FTS5 snippets, replaced by <mark> once the text is escaped
+MATCH_START, MATCH_END = "\x01", "\x02"
+
+
+def extract(text: str) -> Dict[str, str]:
+    """Split a MyST document into the indexed fields."""
+    front_matter = ""
+    match = FRONT_MATTER.match(text)
+    if match:
+        front_matter = match.group(1)
+        text = text[match.end():]
+    headings, directives, body = [], [], []
+    fences = []  # markers of the open fences; directives nest
+    for line in text.splitlines():
+        fence = FENCE.match(line)
+        if fence:
+            marker, name, rest = fence.groups()
+            if name:
+                directives.append(name)
+                fences.append(marker)
+            elif fences and not rest.strip() and marker[0] == fences[-1][0] and len(marker) >= len(fences[-1]):
+                fences.pop()
+            else:
+                fences.append(marker)
+            continue
+        heading = HEADING.match(line) if not fences else None
+        if heading:
+            headings.append(heading.group(2))
+        else:
+            body.append(line)
+
+    title = FRONT_MATTER_TITLE.search(front_matter)
+    title = title.group(1) if title else (headings[0] if headings else "")
+    return {"title": title, "headings": "\n".join(headings), "directives": " ".join(directives),
+            "front_matter": front_matter, "body": "\n".join(body)}
+
+
+def fts_query(query: str) -> Optional[str]:
+    """FTS5 query matching documents that contain every word of ``query``, each also as a prefix."""
+    tokens = TOKEN.findall(query)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _snippet_html(snippet: str) -> str:
+    return html.escape(snippet).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
+
+
+# ---------------------- SEARCH INDEX ----------------------
+class SearchIndex(FileIndex):
+    """Full-text index of the Markdown documents below ``base``, kept in SQLite."""
+
+    VERSION = INDEX_VERSION
+    SCHEMA = SCHEMA
+    TABLES = ["search"]
+    NAME = "search-index"
+
+    def __init__(self, db_path: str, base: str):
+        super().__init__(db_path, base)
+        self._stats["searches"] = 0
+
+    def _store(self, doc_id: int, rel: str, text: Optional[str]):
+        fields = extract(text)
+        self._db.execute("DELETE FROM search WHERE rowid = ?", (doc_id,))
+        self._db.execute(
+            "INSERT INTO search (rowid, title, headings, directives, front_matter, body) VALUES (?, ?, ?, ?, ?, ?)",
+            (doc_id, fields["title"], fields["headings"], fields["directives"], fields["front_matter"],
+             fields["body"]))
+
+    def _forget(self, ids: List[int]):
+        self._db.executemany("DELETE FROM search WHERE rowid = ?", [(doc_id,) for doc_id in ids])
+
+    # ---------------------- QUERIES ----------------------
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> dict:
+        """Documents matching every word of ``query`` (prefixes included), best first, with a snippet each."""
+        match = fts_query(query)
+        if match is None:
+            return {"query": query, "total": 0, "results": []}
+        weights = ", ".join(str(w) for w in COLUMN_WEIGHTS)
+        with self._lock:
+            self._stats["searches"] += 1
+            total = self._db.execute("SELECT count(*) FROM search WHERE search MATCH ?", (match,)).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT d.path, s.title, snippet(search, -1, ?, ?, '…', {SNIPPET_TOKENS}), bm25(search, {weights}) AS score "
+                "FROM search s JOIN documents d ON d.id = s.rowid WHERE search MATCH ? "
+                "ORDER BY score LIMIT ? OFFSET ?",
+                (MATCH_START, MATCH_END, match, limit, offset)).fetchall()
+        return {"query": query, "total": total, "results": [
+            {"path": path, "title": title, "snippet": _snippet_html(snippet), "score": round(-score, 4)}
+            for path, title, snippet, score in rows
+        ]}
@@ -0,0 +1,324 @@
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+
+# A batch is built once no change came in for this long...
+BUILD_DEBOUNCE_SECONDS = 2.0
+# ...or once its oldest change waited this long, so steady typing still gets built
+BUILD_MAX_DELAY_SECONDS = 30.0
+# A build running longer than this is killed; the next change starts a fresh one
+BUILD_TIMEOUT_SECONDS = 30 * 60
+# How often the builder checks for build requests left by other workers
+REQUEST_POLL_SECONDS = 1.0
+# Warning lines and output lines kept in the status
+STATUS_WARNINGS = 50
+STATUS_TAIL = 20
+# Changed paths listed in the status; the rest are only counted
+STATUS_PATHS = 20
+
+ENVIRONMENT_LINE = re.compile(r"(\d+) added, (\d+) changed, (\d+) removed")
+WARNING_LINE = re.compile(r"\b(WARNING|ERROR|CRITICAL|SEVERE):")
+
+
+def sphinx_python(sphinx_dir: str) -> Optional[str]:
+    """The interpreter of the Sphinx virtual environment, else this one if it has Sphinx, else None."""
+    if os.name == "nt":
+        venv_python = os.path.join(sphinx_dir, "sphinx_venv", "Scripts", "python.exe")
+    else:
+        venv_python = os.path.join(sphinx_dir, "sphinx_venv", "bin", "python")
+    if os.path.exists(venv_python):
+        return venv_python
+    return sys.executable if importlib.util.find_spec("sphinx") is not None else None
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+# ---------------------- SPHINX BUILDER ----------------------
+class SphinxBuilder:
+    """
+    Rebuilds the HTML documentation in the background as documents change.
+
+    Changes reported through ``notify`` are collected into a batch that is built once
+    they stop coming for ``BUILD_DEBOUNCE_SECONDS``. Builds run one at a time; changes
+    arriving during a build make up the next batch. Every build is incremental and
+    parallel: ``sphinx-build -j auto`` into the same output and doctree folders, without
+    ``-E``, so Sphinx reloads its pickled environment and only reads and writes the
+    documents that changed (or depend on ones that did).
+
+    Only the leader worker builds. The status is written to ``state_dir`` so any worker
+    can report it, and a build requested on a follower is handed over through a file there.
+    """
+
+    def __init__(self, python: Optional[str], sphinx_dir: str, conf_dir: str, source_dir: str, out_dir: str,
+                 state_dir: str, is_leader: Callable[[], bool], enabled: bool = True):
+        self.python = python
+        self.sphinx_dir = sphinx_dir
+        self.conf_dir = conf_dir
+        self.source_dir = source_dir
+        self.out_dir = out_dir
+        self.status_path = os.path.join(state_dir, "sphinx-build.json")
+        self.request_path = os.path.join(state_dir, "sphinx-build.request")
+        self.log_path = os.path.join(state_dir, "sphinx-build.log")
+        self.is_leader = is_leader
+        self.enabled = enabled
+        self._cond = threading.Condition()
+        self._pending: set = set()
+        self._first_change = None  # monotonic time of the oldest pending change
+        self._last_change = None
+        self._forced = False  # build now, without waiting for the batch to settle
+        self._full = False  # next build starts from a fresh environment (-E)
+        self._process: Optional[subprocess.Popen] = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._state = "idle"
+        self._last: Optional[dict] = None
+        self._last_started = None
+        self._stats = {"builds": 0, "failed": 0, "merged": 0, "seconds": 0.0}
+
+    @property
+    def available(self) -> bool:
+        """Whether Sphinx can be run: its configuration exists and so does the interpreter."""
+        return bool(self.python) and os.path.exists(os.path.join(self.conf_dir, "conf.py")) and os.path.exists(self.python)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sphinx-builder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+            process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+        if self._thread is not None:
+            self._thread.join()
+
+    # ---------------------- CHANGES ----------------------
+    def wanted(self, full_path: str) -> bool:
+        """Whether a change to the path can change the output: hidden files, editor temp files included, can't."""
+        for root in (self.source_dir, self.conf_dir):
+            rel = os.path.relpath(full_path, root)
+            if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+                return not any(part.startswith(".") for part in rel.split(os.sep))
+        return False
+
+    def notify(self, full_path: str):
+        """Record a changed, created or deleted path for the next build (only the leader builds)."""
+        if not self.enabled or not self.is_leader() or not self.wanted(full_path) or not self.available:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if self._state == "building":
+                self._stats["merged"] += 1
+            self._pending.add(full_path)
+            self._first_change = self._first_change or now
+            self._last_change = now
+            self._cond.notify_all()
+
+    def request(self, full: bool = False):
+        """Build now without waiting for the batch to settle; ``full`` drops the saved environment first."""
+        if not self.is_leader():
+            # The leader picks this up within REQUEST_POLL_SECONDS
+            os.makedirs(os.path.dirname(self.request_path), exist_ok=True)
+            previous = _read_json(self.request_path) or {}
+            _write_json(self.request_path, {"full": full or bool(previous.get("full")), "at": time.time()})
+            return
+        with self._cond:
+            self._forced = True
+            self._full = self._full or full
+            self._first_change = self._first_change or time.monotonic()
+            self._cond.notify_all()
+
+    def _take_request(self):
+        request = _read_json(self.request_path)
+        if request is None:
+            return
+        try:
+            os.remove(self.request_path)
+        except FileNotFoundError:
+            pass
+        self.request(bool(request.get("full")))
+
+    # ---------------------- BUILD LOOP ----------------------
+    def _due(self, now: float) -> Optional[float]:
+        """Seconds until the pending batch should be built: 0 when due, None when nothing waits."""
+        if self._first_change is None:
+            return None
+        if self._forced:
+            return 0
+        return max(0.0, min(self._last_change + BUILD_DEBOUNCE_SECONDS, self._first_change + BUILD_MAX_DELAY_SECONDS) - now)
+
+    def _run(self):
+        while not self._stop.is_set():
+            leading = self.is_leader()
+            if leading:
+                self._take_request()
+            with self._cond:
+                wait = self._due(time.monotonic()) if leading else None
+                if wait is None or wait > 0:
+                    self._state = "idle" if wait is None else "waiting"
+                    self._cond.wait(REQUEST_POLL_SECONDS if wait is None else min(wait, REQUEST_POLL_SECONDS))
+                    continue
+                paths, full = sorted(self._pending), self._full
+                self._pending.clear()
+                self._first_change = self._last_change = None
+                self._forced = self._full = False
+                self._state = "building"
+            try:
+                self._build(paths, full)
+            finally:
+                with self._cond:
+                    self._state = "idle"
+                self._save_status()
+
+    def command(self, full: bool = False) -> List[str]:
+        return [self.python, "-m", "sphinx", "-b", "html", "-j", "auto", "-c", self.conf_dir]\
+            + (["-E"] if full else []) + [self.source_dir, self.out_dir]
+
+    def _build(self, paths: List[str], full: bool):
+        if not self.available:
+            with self._cond:
+                self._last = {"finished": time.time(), "returncode": None, "error": "Sphinx is not installed",
+                              "paths": len(paths)}
+            return
+        started, clock = time.time(), time.monotonic()
+        with self._cond:
+            self._last_started = started
+        self._save_status(building={"started": started, "paths": len(paths), "full": full})
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        returncode, error = None, None
+        with open(self.log_path, "wb") as log:
+            try:
+                # conf.py resolves some of its paths against the working directory, as build_sphinx.bat runs it
+                process = subprocess.Popen(self.command(full), cwd=self.sphinx_dir, stdout=log,
+                                           stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+            except OSError as e:
+                process, error = None, str(e)
+            if process is not None:
+                with self._cond:
+                    self._process = process
+                try:
+                    returncode = process.wait(timeout=BUILD_TIMEOUT_SECONDS)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    returncode, error = process.wait(), "timed out"
+                finally:
+                    with self._cond:
+                        self._process = None
+        seconds = time.monotonic() - clock
+        last = {"started": started, "finished": time.time(), "seconds": round(seconds, 3), "returncode": returncode,
+                "full": full, "paths": len(paths), "changed_paths": [os.path.relpath(p, self.source_dir) for p in paths[:STATUS_PATHS]],
+                **self._parse_log(), "error": error}
+        with self._cond:
+            self._last = last
+            self._stats["builds"] += 1
+            self._stats["seconds"] += seconds
+            if returncode != 0:
+                self._stats["failed"] += 1
+
+    def _parse_log(self) -> dict:
+        counts, warnings, tail = None, [], deque(maxlen=STATUS_TAIL)
+        try:
+            with open(self.log_path, encoding="utf-8", errors="replace") as log:
+                for line in log:
+                    # Progress lines are redrawn with carriage returns; keep what was drawn last
+                    line = line.rstrip("\r\n").rsplit("\r", 1)[-1]
+                    match = ENVIRONMENT_LINE.search(line)
+                    if match:
+                        counts = dict(zip(("added", "changed", "removed"), map(int, match.groups())))
+                    if WARNING_LINE.search(line):
+                        warnings.append(line)
+                    if line.strip():
+                        tail.append(line)
+        except FileNotFoundError:
+            pass
+        return {"documents": counts, "warnings": len(warnings), "warning_lines": warnings[:STATUS_WARNINGS],
+                "tail": list(tail)}
+
+    # ---------------------- STATUS ----------------------
+    def _local_status(self) -> dict:
+        with self._cond:
+            return {
+                "available": self.available,
+                "enabled": self.enabled,
+                "state": self._state,
+                "pending": len(self._pending),
+                "pending_paths": [os.path.relpath(p, self.source_dir) for p in sorted(self._pending)[:STATUS_PATHS]],
+                "last": self._last,
+                "builds": self._stats["builds"],
+                "failed": self._stats["failed"],
+                "average_seconds": round(self._stats["seconds"] / self._stats["builds"], 3) if self._stats["builds"] else None,
+                "leader_pid": os.getpid(),
+                "output": self.out_dir,
+            }
+
+    def _save_status(self, building: Optional[dict] = None):
+        status = self._local_status()
+        status["building"] = building
+        try:
+            os.makedirs(os.path.dirname(self.status_path), exist_ok=True)
+            _write_json(self.status_path, status)
+        except OSError:
+            pass
+
+    def status(self) -> dict:
+        """State of the builder: the leader's own view, or what it last wrote for the other workers."""
+        if self.is_leader():
+            status = self._local_status()
+            status["building"] = {"started": self._last_started} if status["state"] == "building" else None
+            return status
+        saved = _read_json(self.status_path)
+        if saved is None:
+            return {"available": self.available, "enabled": self.enabled, "state": "idle", "pending": 0, "last": None}
+        return saved
+
+    def stats(self) -> dict:
+        with self._cond:
+            last = self._last or {}
+            return {"builds": self._stats["builds"], "failed": self._stats["failed"], "merged": self._stats["merged"],
+                    "pending": len(self._pending), "building": int(self._state == "building"),
+                    "last_seconds": last.get("seconds"), "last_warnings": last.get("warnings")}
+
+
+# ---------------------- FILESYSTEM WATCHER ----------------------
+class _BuildEventHandler(FileSystemEventHandler):
+    def __init__(self, builder: SphinxBuilder):
+        self.builder = builder
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write") or event.is_directory and event.event_type == "modified":
+            return
+        paths = [event.src_path] + ([event.dest_path] if event.event_type == "moved" else [])
+        for path in map(os.fsdecode, paths):
+            self.builder.notify(path)
+
+
+def watch_builds(observer, builder: SphinxBuilder):
+    """Feed changes made outside the editor (checkouts, other tools, Sphinx config edits) to the builder."""
+    observer.schedule(_BuildEventHandler(builder), builder.source_dir, recursive=True)
+    if os.path.isdir(builder.conf_dir):
+        observer.schedule(_BuildEventHandler(builder), builder.conf_dir, recursive=True)
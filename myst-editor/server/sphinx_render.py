@@ -0,0 +1,261 @@
+import hashlib
+import itertools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import List, Optional
+
+from watchdog.events import FileSystemEventHandler
+
+# How long a new worker may take to load the Sphinx project before it is given up on
+STARTUP_TIMEOUT_SECONDS = 120
+RENDER_TIMEOUT_SECONDS = 30
+# A worker is replaced after this many renders, so what its environment gathers stays bounded
+RENDERS_PER_WORKER = 500
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sphinx_render_worker.py")
+
+
+class RenderError(Exception):
+    """The worker crashed, timed out or could not be started."""
+
+
+def config_stamp(conf_dir: str) -> str:
+    """Fingerprint of every file of the Sphinx configuration; it changes whenever one of them does."""
+    entries = []
+    for folder, dirs, files in os.walk(conf_dir):
+        dirs.sort()
+        for name in sorted(files):
+            try:
+                st = os.stat(os.path.join(folder, name))
+            except FileNotFoundError:
+                continue
+            entries.append(f"{os.path.relpath(os.path.join(folder, name), conf_dir)}:{st.st_mtime_ns}:{st.st_size}")
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+# ---------------------- RENDER WORKER ----------------------
+class RenderWorker:
+    """One ``sphinx_render_worker.py`` process with the project loaded, and the thread reading its replies."""
+
+    def __init__(self, python: str, sphinx_dir: str, conf_dir: str, source_dir: str,
+                 seed_environment: Optional[str], stamp: str, stderr):
+        self.stamp = stamp
+        self.renders = 0
+        self.ready_seconds = None
+        self._ids = itertools.count(1)
+        self._replies: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self.scratch_dir = tempfile.mkdtemp(prefix="myst-render-")
+        doctree_dir = os.path.join(self.scratch_dir, "doctrees")
+        os.makedirs(doctree_dir)
+        if seed_environment and os.path.exists(seed_environment):
+            # Start from the background build's environment: titles, toctrees and labels of every
+            # document are known without reading them. A copy torn by a running build is simply ignored by Sphinx.
+            shutil.copyfile(seed_environment, os.path.join(doctree_dir, "environment.pickle"))
+        try:
+            self.process = subprocess.Popen(
+                [python, WORKER_SCRIPT, conf_dir, source_dir, os.path.join(self.scratch_dir, "html"), doctree_dir],
+                cwd=sphinx_dir, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        except OSError as e:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+            raise RenderError(f"cannot start the render worker: {e}")
+        threading.Thread(target=self._read, name="render-replies", daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            try:
+                self._replies.put(json.loads(line))
+            except ValueError:
+                continue
+        self._replies.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _reply(self, timeout: float) -> dict:
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise RenderError("the render worker timed out")
+        if reply is None:
+            self._replies.put(None)
+            raise RenderError(f"the render worker exited with status {self.process.wait()}")
+        return reply
+
+    def render(self, docname: str, text: str) -> dict:
+        if self.ready_seconds is None:
+            self.ready_seconds = self._reply(STARTUP_TIMEOUT_SECONDS).get("seconds")
+        request_id = next(self._ids)
+        try:
+            self.process.stdin.write((json.dumps({"id": request_id, "docname": docname, "text": text}) + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError:
+            raise RenderError("the render worker exited")
+        self.renders += 1
+        while True:
+            reply = self._reply(RENDER_TIMEOUT_SECONDS)
+            if reply.get("id") == request_id:
+                return reply
+
+    def close(self):
+        if self.alive:
+            self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+
+
+# ---------------------- RENDER POOL ----------------------
+class RenderPool:
+    """
+    A fixed number of render workers, each a Sphinx process with the project already loaded,
+    so a single document is turned into HTML in milliseconds instead of a build. The workers
+    run the Python of the Sphinx virtual environment, as the builds do.
+
+    Workers are started ahead of the first request. One that renders with a configuration
+    that has since changed (conf.py, the JSON files beside it, templates) is replaced, as is
+    one that has rendered ``RENDERS_PER_WORKER`` documents or died. ``recycle`` replaces the
+    idle ones right away, so the next request does not wait for a fresh worker to load.
+    """
+
+    def __init__(self, python: Optional[str], sphinx_dir: str, conf_dir: str, source_dir: str,
+                 seed_environment: Optional[str], size: int, log_path: str):
+        self.python = python
+        self.sphinx_dir = sphinx_dir
+        self.conf_dir = conf_dir
+        self.source_dir = source_dir
+        self.seed_environment = seed_environment
+        self.size = size
+        self.log_path = log_path
+        self._idle: "queue.Queue[Optional[RenderWorker]]" = queue.Queue()
+        self._log = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {"renders": 0, "failed": 0, "started": 0, "recycled": 0, "ms": 0.0}
+        for _ in range(size):
+            self._idle.put(None)
+
+    @property
+    def available(self) -> bool:
+        """Whether documents can be rendered: Sphinx's configuration and interpreter exist."""
+        return (self.size > 0 and bool(self.python) and os.path.exists(self.python)
+                and os.path.exists(os.path.join(self.conf_dir, "conf.py")))
+
+    def stamp(self) -> str:
+        return config_stamp(self.conf_dir)
+
+    def start(self):
+        """Start every worker now, so they load the project before the first request."""
+        if self.available:
+            self.recycle()
+
+    def _spawn(self, stamp: str) -> RenderWorker:
+        with self._lock:
+            if self._log is None:
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+                self._log = open(self.log_path, "ab")
+            self._stats["started"] += 1
+        return RenderWorker(self.python, self.sphinx_dir, self.conf_dir, self.source_dir,
+                            self.seed_environment, stamp, self._log)
+
+    def _fresh(self, worker: Optional[RenderWorker], stamp: str) -> RenderWorker:
+        """``worker`` if it is still good to use, or a new one in its place."""
+        if worker is not None and worker.alive and worker.stamp == stamp and worker.renders < RENDERS_PER_WORKER:
+            return worker
+        if worker is not None:
+            worker.close()
+            with self._lock:
+                self._stats["recycled"] += 1
+        return self._spawn(stamp)
+
+    def recycle(self):
+        """Replace the idle workers that are outdated, and start the missing ones."""
+        stamp = self.stamp()
+        workers: List[Optional[RenderWorker]] = []
+        while True:
+            try:
+                workers.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in workers:
+            try:
+                worker = self._fresh(worker, stamp)
+            except RenderError:
+                worker = None
+            self._idle.put(worker)
+
+    def render(self, docname: str, text: str) -> dict:
+        """The HTML body, title and warnings of ``text`` rendered as the document ``docname``."""
+        stamp = self.stamp()
+        # The render work pool lets at most ``size`` callers in, so there is always a worker to take
+        worker = self._idle.get()
+        started = time.monotonic()
+        try:
+            worker = self._fresh(worker, stamp)
+            reply = worker.render(docname, text)
+        except RenderError:
+            if worker is not None:
+                worker.close()
+            worker = None
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        finally:
+            if self._closed and worker is not None:
+                worker.close()
+                worker = None
+            self._idle.put(worker)
+        with self._lock:
+            self._stats["renders"] += 1
+            self._stats["ms"] += (time.monotonic() - started) * 1000
+        return reply
+
+    def close(self):
+        self._closed = True
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get(timeout=RENDER_TIMEOUT_SECONDS)
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+        if self._log is not None:
+            self._log.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        renders = stats.pop("ms")
+        return {**stats, "workers": self.size, "average_ms": round(renders / stats["renders"], 1) if stats["renders"] else None}
+
+
+# ---------------------- FILESYSTEM WATCHER ----------------------
+class _ConfigEventHandler(FileSystemEventHandler):
+    def __init__(self, pool: RenderPool):
+        self.pool = pool
+        self._timer = None
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        # An editor saving conf.py makes several events; recycle once they are over
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(1.0, self.pool.recycle)
+        self._timer.daemon = True
+        self._timer.start()
+
+
+def watch_render_config(observer, pool: RenderPool):
+    """Replace idle render workers soon after the Sphinx configuration changes."""
+    if pool.available:
+        observer.schedule(_ConfigEventHandler(pool), pool.conf_dir, recursive=True)
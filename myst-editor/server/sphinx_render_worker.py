@@ -0,0 +1,116 @@
+"""
+Render worker behind /api/render, started by the editor server with the Python of the Sphinx
+virtual environment:
+
+    python sphinx_render_worker.py <conf dir> <docs dir> <output dir> <doctree dir>
+
+It loads the Sphinx project (conf.py, its extensions and the saved environment in the
+doctree dir) once, answers ``{"ready": ...}``, then renders one document per line read
+from stdin and writes one JSON reply line per request to stdout. Only Sphinx and the
+standard library are available here: this file must not import the server's modules.
+"""
+import io
+import json
+import os
+import sys
+import time
+import traceback
+
+
+class Renderer:
+    """A loaded Sphinx application turning the text of one document into its HTML body."""
+
+    def __init__(self, conf_dir: str, source_dir: str, out_dir: str, doctree_dir: str):
+        from sphinx.application import Sphinx
+        from sphinx.util.console import nocolor
+
+        nocolor()
+        self.source_dir = source_dir
+        self.warnings = io.StringIO()
+        self.app = Sphinx(source_dir, conf_dir, out_dir, doctree_dir, "html",
+                          status=None, warning=self.warnings, freshenv=False)
+        # Ahead of the project's own source-read handlers (rewrite_mermaid_blocks), so they see the posted text
+        self.app.connect("source-read", self._substitute, priority=100)
+        self.app.builder.prepare_writing(set())
+        self._docname = None
+        self._text = None
+        self._rendered = None  # the document whose posted text the environment holds
+
+    def _substitute(self, app, docname, source):
+        if docname == self._docname:
+            source[0] = self._text
+
+    def _purge(self, docname: str):
+        # As a build does before reading a document again: drop what was recorded from it last time
+        self.app.events.emit("env-purge-doc", self.app.env, docname)
+        self.app.env.clear_doc(docname)
+
+    def _restore(self):
+        """Read the last rendered document again as saved, so other documents never see its unsaved text."""
+        docname, self._rendered = self._rendered, None
+        self._purge(docname)
+        if os.path.exists(self.app.env.doc2path(docname)):
+            self.app.builder.read_doc(docname)
+
+    def render(self, docname: str, text: str) -> dict:
+        from docutils import nodes
+        from docutils.io import StringOutput
+
+        app, env, builder = self.app, self.app.env, self.app.builder
+        # Rendering the same document again replaces its text anyway, which keeps edits to one document cheap
+        if self._rendered not in (None, docname):
+            self._restore()
+        self.warnings.seek(0)
+        self.warnings.truncate()
+        self._docname, self._text = docname, text
+        self._rendered = docname
+        try:
+            self._purge(docname)
+            builder.read_doc(docname)
+            doctree = env.get_and_resolve_doctree(docname, builder)
+        finally:
+            self._docname = self._text = None
+        for image in doctree.findall(nodes.image):
+            uri = image["uri"]
+            # Relative to the docs folder after reading; made absolute so the editor server's /_static route serves them
+            if "://" not in uri and not uri.startswith(("data:", "/")):
+                image["uri"] = "/" + uri
+        doctree.settings = builder.docsettings
+        builder.secnumbers = env.toc_secnumbers.get(docname, {})
+        builder.fignumbers = env.toc_fignumbers.get(docname, {})
+        builder.current_docname = docname
+        builder.docwriter.write(doctree, StringOutput(encoding="utf-8"))
+        builder.docwriter.assemble_parts()
+        title = env.titles.get(docname)
+        warnings = [line.replace(self.source_dir + os.sep, "") for line in self.warnings.getvalue().splitlines() if line]
+        return {"html": builder.docwriter.parts["fragment"], "title": title.astext() if title else None,
+                "warnings": warnings}
+
+
+def main():
+    conf_dir, source_dir, out_dir, doctree_dir = sys.argv[1:5]
+    # stdout carries the replies; whatever Sphinx or an extension prints goes to stderr instead
+    replies = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    def reply(data: dict):
+        replies.write(json.dumps(data) + "\n")
+        replies.flush()
+
+    started = time.monotonic()
+    renderer = Renderer(conf_dir, source_dir, out_dir, doctree_dir)
+    reply({"ready": True, "seconds": round(time.monotonic() - started, 3)})
+    for line in sys.stdin:
+        request = json.loads(line)
+        started = time.monotonic()
+        try:
+            result = renderer.render(request["docname"], request["text"])
+        except Exception as e:
+            traceback.print_exc()
+            result = {"error": f"{type(e).__name__}: {e}"}
+        reply({"id": request.get("id"), "ms": round((time.monotonic() - started) * 1000, 1), **result})
+
+
+if __name__ == "__main__":
+    main()
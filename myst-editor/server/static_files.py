@@ -0,0 +1,87 @@
+import hashlib
+import mimetypes
+import os
+import threading
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+
+# Only for URLs whose content can never change (hashed names, ?v=<content hash>)
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Everything else may be cached but is revalidated with its ETag on every use
+REVALIDATE = "no-cache"
+
+# Precompressed variants written at build time by precompress.py, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Folder of the build holding Vite's content-hashed output, e.g. assets/yamlLSPWorker-CWDbMF7j.js;
+# nothing else in the build has a hash in its name, whatever the name looks like
+HASHED_ASSETS_DIR = "assets"
+
+# path -> (mtime_ns, size, content hash); a file is hashed again only once it changes
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """True if the client already holds the representation identified by ``etag``."""
+    if_none_match = request.headers.get("if-none-match", "")
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def content_hash(path: str, stat_result=None) -> str:
+    st = stat_result or os.stat(path)
+    with _hashes_lock:
+        cached = _hashes.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    digest = hashlib.blake2b(digest_size=12)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    value = digest.hexdigest()
+    with _hashes_lock:
+        _hashes[path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def _negotiate(request: Request, path: str):
+    """Pick a fresh precompressed variant the client accepts, or the file itself."""
+    accepted = {token.split(";")[0].strip() for token in request.headers.get("accept-encoding", "").split(",")}
+    source_mtime = os.path.getmtime(path)
+    for encoding, suffix in ENCODINGS:
+        variant = path + suffix
+        if encoding in accepted and os.path.isfile(variant) and os.path.getmtime(variant) >= source_mtime:
+            return variant, encoding
+    return path, None
+
+
+def serve_file(request: Request, path: str, cache_control: str = REVALIDATE) -> Response:
+    """
+    FileResponse with a content-hash ETag (304 when it matches), Range support and, where
+    one was built, a precompressed variant chosen by Accept-Encoding.
+    """
+    send_path, encoding = _negotiate(request, path)
+    etag = f'"{content_hash(send_path)}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return FileResponse(send_path, media_type=media_type, headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles serving through ``serve_file``: Vite's hashed assets are immutable, the rest revalidated."""
+
+    def hashed(self, full_path) -> bool:
+        rel = os.path.relpath(os.path.realpath(full_path), os.path.realpath(self.directory))
+        return rel.split(os.sep)[0] == HASHED_ASSETS_DIR
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        cache_control = IMMUTABLE if self.hashed(full_path) else REVALIDATE
+        return serve_file(Request(scope), str(full_path), cache_control)
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# The server modules are imported as top-level modules, as app.py does when run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def git(cwd: str, *args: str) -> str:
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """A repository with two commits of a small docs folder."""
+    repo = str(tmp_path)
+    git(repo, "init", "-q", "-b", "main")
+    git(repo, "config", "user.email", "test@example.com")
+    git(repo, "config", "user.name", "test")
+    os.makedirs(os.path.join(repo, "docs", "sub"))
+    for rel, text in {"docs/index.md": "# Index\n", "docs/sub/a.md": "# A\n\nfirst\n",
+                      "docs/with space.md": "# Space\n"}.items():
+        with open(os.path.join(repo, rel), "w", encoding="utf-8") as f:
+            f.write(text)
+    git(repo, "add", "-A")
+    git(repo, "commit", "-q", "-m", "first")
+    with open(os.path.join(repo, "docs", "sub", "a.md"), "w", encoding="utf-8") as f:
+        f.write("# A\n\nsecond\n")
+    git(repo, "commit", "-q", "-am", "second")
+    return repo
+
+
+@pytest.fixture
+def app_client(git_repo, monkeypatch):
+    """The server (app.py) run from ``myst-editor/server`` inside ``git_repo``, as it is deployed."""
+    from fastapi.testclient import TestClient
+
+    server_dir = os.path.join(git_repo, "myst-editor", "server")
+    os.makedirs(server_dir)
+    os.makedirs(os.path.join(git_repo, "myst-editor", "dist"))
+    monkeypatch.chdir(server_dir)
+    monkeypatch.setenv("MYST_RENDER_WORKERS", "0")
+    monkeypatch.setenv("MYST_SPHINX_AUTOBUILD", "0")
+    sys.modules.pop("app", None)
+    import app
+
+    with TestClient(app.app) as client:
+        yield client
+    sys.modules.pop("app", None)
@@ -0,0 +1,26 @@
+import os
+
+from conftest import git
+
+
+def test_non_utf8_blob_is_served_with_replacement_characters(git_repo, app_client):
+    with open(os.path.join(git_repo, "docs", "latin1.md"), "wb") as f:
+        f.write("# Café\n\nnaïve\n".encode("latin-1"))
+    git(git_repo, "add", "docs/latin1.md")
+    git(git_repo, "commit", "-q", "-m", "latin-1")
+
+    r = app_client.get("/api/git-file", params={"ref": "HEAD", "filename": "latin1.md"})
+    assert r.status_code == 200
+    assert r.json()["content"] == "# Caf�\n\nna�ve\n"
+
+    r = app_client.post("/api/git-line-diff", json={"filename": "latin1.md", "text": "# Café\n\nnaïve\n"})
+    assert r.status_code == 200
+    assert r.json()["hunks"] == [[1, 1, 1, 1], [3, 1, 3, 1]]
+
+
+def test_diff_tree_route(git_repo, app_client):
+    r = app_client.get("/api/git-diff-tree", params={"commit_left": "HEAD~1", "commit_right": "HEAD"})
+    assert r.json() == [{"old_path": "docs/sub/a.md", "new_path": "docs/sub/a.md", "status": "M"}]
+    r = app_client.get("/api/git-diff-tree", params={"commit_left": "nope", "commit_right": "HEAD"})
+    assert r.status_code == 404
+    assert 'command="diff-tree"' not in app_client.get("/metrics").text
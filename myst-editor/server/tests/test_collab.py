@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+pycrdt = pytest.importorskip("pycrdt")
+
+from collab import TEXT_NAME, CollabRelay, CollabStore, _replace_text
+
+
+@pytest.mark.parametrize("old, new", [
+    ("héllo wörld\n", "héllo WÖRLD!\n"),
+    ("😀 emoji 😀\n", "😀 emoji, more 😀 ü\n"),
+    ("日本語のテキスト", "日本語テキスト"),
+    ("ä", ""),
+    ("", "ß"),
+    ("é combined", "é decombined"),
+])
+def test_replace_text_with_non_ascii(old, new):
+    doc = pycrdt.Doc()
+    text = doc.get(TEXT_NAME, type=pycrdt.Text)
+    text += old
+    peer = pycrdt.Doc()
+    peer.apply_update(doc.get_update())
+    before = doc.get_state()
+
+    _replace_text(text, old, new)
+
+    assert str(text) == new
+    peer.apply_update(doc.get_update(before))
+    assert str(peer.get(TEXT_NAME, type=pycrdt.Text)) == new
+
+
+def test_file_changed_on_disk_replaces_the_room_text(tmp_path):
+    store = CollabStore(str(tmp_path / "collab.sqlite"))
+    update, _ = store.open_room("a.md", "# Ünïcode\n\nfirst 😀\n")
+    doc = pycrdt.Doc()
+    doc.apply_update(update)
+    text = doc.get(TEXT_NAME, type=pycrdt.Text)
+    # Not written yet when the file is changed by something else: the file wins
+    before = doc.get_state()
+    text += "peer ✓\n"
+    store.append("a.md", doc.get_update(before))
+
+    fix = store.sync_file("a.md", "# Ünïcode — edited\n\nfirst 😀\n")
+
+    doc.apply_update(fix)
+    assert str(text) == "# Ünïcode — edited\n\nfirst 😀\n"
+    assert store.sync_file("a.md", "# Ünïcode — edited\n\nfirst 😀\n") is None
+
+
+def test_flush_writes_the_room_now(tmp_path):
+    files = {"a.md": "start\n"}
+    relay = CollabRelay(CollabStore(str(tmp_path / "collab.sqlite")), files.get, files.__setitem__)
+
+    async def edit_and_flush():
+        room = await relay._room("a.md")
+        before = room.doc.get_state()
+        room.text += "typed by a peer\n"
+        await relay._changed(room, room.doc.get_update(before))
+        assert files["a.md"] == "start\n"  # still within the quiet period
+        assert await relay.flush("a.md")
+        assert not await relay.flush("b.md")
+
+    asyncio.run(edit_and_flush())
+    assert files["a.md"] == "start\ntyped by a peer\n"
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from file_batch import BatchError, Journal, PlannedTree
+
+
+@pytest.fixture
+def docs(tmp_path):
+    root = tmp_path / "docs"
+    (root / "sub").mkdir(parents=True)
+    (root / "sub" / "a.md").write_text("a", encoding="utf-8")
+    (root / "index.md").write_text("index", encoding="utf-8")
+    return str(root)
+
+
+def test_planned_tree_follows_moves_and_deletes(docs):
+    tree = PlannedTree()
+    j = lambda *parts: os.path.join(docs, *parts)
+    tree.move(j("sub"), j("moved", "deep"))
+    assert tree.kind(j("moved")) == "folder"
+    assert tree.kind(j("moved", "deep", "a.md")) == "file"
+    assert not tree.exists(j("sub", "a.md"))
+
+    tree.delete(j("moved", "deep"))
+    assert not tree.exists(j("moved", "deep", "a.md"))
+    tree.create(j("sub"), "folder")
+    assert tree.kind(j("sub")) == "folder" and not tree.exists(j("sub", "a.md"))
+    # Nothing was touched on disk
+    assert os.path.isfile(j("sub", "a.md")) and not os.path.exists(j("moved"))
+
+
+def test_planned_tree_rejects_a_file_as_folder(docs):
+    tree = PlannedTree()
+    with pytest.raises(BatchError) as e:
+        tree.create(os.path.join(docs, "index.md", "child.md"), "file")
+    assert e.value.status == 400
+
+
+def snapshot(root):
+    found = {}
+    for folder, dirs, files in os.walk(root):
+        for name in dirs + files:
+            path = os.path.join(folder, name)
+            found[os.path.relpath(path, root)] = open(path, encoding="utf-8").read() if name in files else None
+    return found
+
+
+def test_journal_rollback_restores_everything(tmp_path, docs):
+    before = snapshot(docs)
+    journal = Journal(str(tmp_path / "trash"))
+    journal.create(os.path.join(docs, "new", "deeper", "b.md"), "file")
+    journal.move(os.path.join(docs, "sub"), os.path.join(docs, "elsewhere", "sub"))
+    journal.park(os.path.join(docs, "index.md"))
+    assert not os.path.exists(os.path.join(docs, "index.md"))
+    assert [os.path.relpath(f, docs) for f in journal.created] == ["new", os.path.join("new", "deeper"), "elsewhere"]
+
+    journal.rollback()
+
+    assert snapshot(docs) == before
+    assert not os.path.exists(journal.trash)
+
+
+def test_journal_commit_empties_the_trash(tmp_path, docs):
+    journal = Journal(str(tmp_path / "trash"))
+    journal.park(os.path.join(docs, "index.md"))
+    assert os.listdir(journal.trash)
+    journal.commit()
+    assert not os.path.exists(journal.trash)
+    journal.rollback()  # nothing left to undo
+    assert not os.path.exists(os.path.join(docs, "index.md"))
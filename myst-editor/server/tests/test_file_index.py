@@ -0,0 +1,24 @@
+from watchdog.events import FileModifiedEvent, FileMovedEvent, FileOpenedEvent
+
+from file_index import _IndexEventHandler
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.updated = []
+
+    def update(self, path):
+        self.updated.append(path)
+
+
+def test_only_the_leader_reindexes_on_file_events():
+    index, leader = RecordingIndex(), [False]
+    handler = _IndexEventHandler(index, lambda: leader[0])
+    handler.on_any_event(FileModifiedEvent("/docs/a.md"))
+    assert index.updated == []
+
+    leader[0] = True
+    handler.on_any_event(FileModifiedEvent("/docs/a.md"))
+    handler.on_any_event(FileOpenedEvent("/docs/a.md"))
+    handler.on_any_event(FileMovedEvent("/docs/b.md", "/docs/c.md"))
+    assert index.updated == ["/docs/a.md", "/docs/b.md", "/docs/c.md"]
@@ -0,0 +1,67 @@
+import pytest
+
+from conftest import git
+from git_reader import GitReaderPool
+
+
+@pytest.fixture
+def reader(git_repo):
+    pool = GitReaderPool(git_repo, 1)
+    yield pool
+    pool.close()
+
+
+def queue_extra_answer(pool: GitReaderPool, spec: str):
+    """Leave an answer nobody asked for on the reader's processes, as a two-line spec used to."""
+    reader = pool._idle.get()
+    for cat_file in (reader.batch, reader.check):
+        proc = cat_file.ensure()
+        proc.stdin.write(spec.encode() + b"\n")
+        proc.stdin.flush()
+    pool._idle.put(reader)
+
+
+def test_read_and_info(git_repo, reader):
+    head = git(git_repo, "rev-parse", "HEAD")
+    sha, obj_type, data = reader.read("HEAD:docs/sub/a.md")
+    assert (obj_type, data) == ("blob", b"# A\n\nsecond\n")
+    assert sha == git(git_repo, "rev-parse", "HEAD:docs/sub/a.md")
+    assert reader.read("HEAD:docs/none.md") is None
+    assert reader.resolve("HEAD^{commit}") == head
+    infos = reader.info(["HEAD:docs/index.md", "HEAD:docs/none.md", "HEAD:docs/with space.md", "HEAD:docs"])
+    assert [info and info[1] for info in infos] == ["blob", None, "blob", "tree"]
+
+
+@pytest.mark.parametrize("spec", ["HEAD:docs/index.md\nHEAD:docs/sub/a.md", "HEAD\r", "HEAD\0"])
+def test_multi_line_specs_are_rejected(reader, spec):
+    with pytest.raises(ValueError):
+        reader.read(spec)
+    with pytest.raises(ValueError):
+        reader.info(["HEAD", spec])
+    assert reader.read("HEAD:docs/index.md")[2] == b"# Index\n"
+
+
+def test_queued_answer_is_not_returned_for_the_next_read(reader):
+    queue_extra_answer(reader, "HEAD:docs/sub/a.md")
+    assert reader.read("HEAD:docs/index.md")[2] == b"# Index\n"
+    assert reader.read("HEAD:docs/index.md")[2] == b"# Index\n"
+    assert reader.stats()["restarts"] == 1
+
+
+def test_queued_answer_is_not_returned_for_a_missing_object(reader):
+    queue_extra_answer(reader, "HEAD:docs/sub/a.md")
+    assert reader.read("HEAD:docs/none.md") is None
+    assert reader.info(["HEAD:docs/none.md"]) == [None]
+
+
+def test_blob_at_returns_the_blob_at_the_path(git_repo, reader):
+    """Regression: the blob cache stored another file's content under (tree, path) after a desync."""
+    tree = reader.resolve("HEAD^{tree}")
+    queue_extra_answer(reader, "HEAD:docs/sub/a.md")
+    sha, data = reader.blob_at(tree, "docs/index.md")
+    assert data == b"# Index\n"
+    assert sha == git(git_repo, "rev-parse", "HEAD:docs/index.md")
+    first = reader.resolve("HEAD~1^{tree}")
+    assert reader.blob_at(first, "docs/sub/a.md")[1] == b"# A\n\nfirst\n"
+    assert reader.blob_at(tree, "docs/none.md") is None
+    assert reader.blob_at(tree, "docs/sub") is None
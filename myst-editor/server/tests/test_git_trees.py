@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import git
+from git_reader import GitReaderPool
+from git_trees import diff_trees
+
+
+@pytest.fixture
+def reader(git_repo):
+    pool = GitReaderPool(git_repo, 1)
+    yield pool
+    pool.close()
+
+
+def write(repo, rel, text):
+    path = os.path.join(repo, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def git_name_status(repo, left, right):
+    """What ``git diff-tree -r -M`` reports for the docs folder, in diff_trees's form."""
+    changes = []
+    for line in git(repo, "diff-tree", "-r", "-M", "--name-status", left, right, "--", "docs").splitlines():
+        status, *paths = line.split("\t")
+        changes.append({"old_path": paths[0], "new_path": paths[-1], "status": status[0]})
+    return sorted(changes, key=lambda change: (change["new_path"], change["old_path"]))
+
+
+def test_matches_git_diff_tree(git_repo, reader):
+    body = "".join(f"line {i}\n" for i in range(20))
+    write(git_repo, "docs/long.md", body)
+    write(git_repo, "docs/moved/keep.md", "exact\n")
+    write(git_repo, "docs/gone.md", "bye\n")
+    write(git_repo, "docs/folder/inner.md", "inner\n")
+    write(git_repo, "outside.md", "not in docs\n")
+    git(git_repo, "add", "-A")
+    git(git_repo, "commit", "-q", "-m", "more")
+    left = git(git_repo, "rev-parse", "HEAD")
+
+    os.rename(os.path.join(git_repo, "docs/moved/keep.md"), os.path.join(git_repo, "docs/kept.md"))
+    os.remove(os.path.join(git_repo, "docs/long.md"))
+    write(git_repo, "docs/sub/longer.md", body.replace("line 3\n", "line three\n") + "more\n")
+    os.remove(os.path.join(git_repo, "docs/gone.md"))
+    write(git_repo, "docs/index.md", "# Index changed\n")
+    write(git_repo, "docs/new.md", "new\n")
+    shutil.rmtree(os.path.join(git_repo, "docs/folder"))
+    write(git_repo, "docs/folder", "now a file\n")
+    write(git_repo, "outside.md", "changed, still not in docs\n")
+    git(git_repo, "add", "-A")
+    git(git_repo, "commit", "-q", "-m", "changes")
+    right = git(git_repo, "rev-parse", "HEAD")
+
+    trees = [git(git_repo, "rev-parse", f"{commit}:docs") for commit in (left, right)]
+    changes = diff_trees(reader, *trees, prefix="docs/")
+    assert changes == git_name_status(git_repo, left, right)
+    assert {change["status"] for change in changes} == {"A", "D", "M", "R"}
+    assert diff_trees(reader, trees[0], trees[0]) == []
+
+
+def test_missing_docs_folder(git_repo, reader):
+    tree = git(git_repo, "rev-parse", "HEAD:docs")
+    assert [change["status"] for change in diff_trees(reader, None, tree, prefix="docs/")] == ["A", "A", "A"]
+    assert [change["new_path"] for change in diff_trees(reader, tree, None)] == ["index.md", "sub/a.md",
+                                                                                  "with space.md"]
+
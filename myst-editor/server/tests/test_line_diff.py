@@ -0,0 +1,43 @@
+from line_diff import compute_hunks, merge3, text_blob_sha
+
+BASE = "# Title\n\none\ntwo\nthree\nfour\n"
+
+
+def test_blob_sha_matches_git():
+    # git hash-object of "hello\n"
+    assert text_blob_sha("hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+
+
+def test_hunks():
+    assert compute_hunks("a\nb\nc", "a\nB\nc") == [[2, 1, 2, 1]]
+    assert compute_hunks("a\nc", "a\nb\nc") == [[2, 0, 2, 1]]
+    assert compute_hunks("same", "same") == []
+
+
+def test_merge_of_edits_to_different_lines():
+    ours = BASE.replace("one", "ONE")
+    theirs = BASE.replace("four", "FOUR") + "five\n"
+    assert merge3(BASE, ours, theirs) == ("# Title\n\nONE\ntwo\nthree\nFOUR\nfive\n", 0)
+
+
+def test_merge_when_one_side_is_unchanged():
+    edited = BASE.replace("two\n", "")
+    assert merge3(BASE, edited, BASE) == (edited, 0)
+    assert merge3(BASE, BASE, edited) == (edited, 0)
+
+
+def test_same_edit_on_both_sides_is_not_a_conflict():
+    edited = BASE.replace("three", "3")
+    assert merge3(BASE, edited, edited) == (edited, 0)
+
+
+def test_conflict_is_marked():
+    merged, conflicts = merge3(BASE, BASE.replace("two", "mine"), BASE.replace("two", "saved"))
+    assert conflicts == 1
+    assert merged == "# Title\n\none\n<<<<<<< yours\nmine\n=======\nsaved\n>>>>>>> saved\nthree\nfour\n"
+
+
+def test_conflict_on_last_line_without_newline():
+    merged, conflicts = merge3("a\nb", "a\nx", "a\ny")
+    assert conflicts == 1
+    assert merged == "a\n<<<<<<< yours\nx\n=======\ny\n>>>>>>> saved\n"
@@ -0,0 +1,47 @@
+from link_graph import path_mapping, rewrite_links
+
+DOC = """# Guide
+
+See [the intro](intro.md#start), ![diagram](img/flow.png) and [site](https://example.com).
+Also {doc}`Setup <setup>` and `[not a link](intro.md)` in code.
+
+```{figure} img/flow.png
+Caption
+```
+
+```python
+open("img/flow.png")
+```
+
+[ref]: /img/flow.png
+"""
+
+
+def test_moved_targets_are_rewritten():
+    mapping = path_mapping([("guide/img", "media"), ("guide/intro.md", "guide/start/intro.md")])
+    new = rewrite_links(DOC, "guide/index.md", "guide/index.md", mapping)
+    assert "[the intro](start/intro.md#start)" in new
+    assert "![diagram](../media/flow.png)" in new
+    assert "```{figure} ../media/flow.png" in new
+    # Unchanged: URLs, unmoved documents, code, and an absolute path outside the moved folder
+    assert "[site](https://example.com)" in new and "{doc}`Setup <setup>`" in new
+    assert "`[not a link](intro.md)`" in new and 'open("img/flow.png")' in new
+    assert "[ref]: /img/flow.png" in new
+
+
+def test_moved_document_keeps_its_links_pointing_at_the_same_files():
+    new = rewrite_links(DOC, "guide/index.md", "other/deeper/index.md", path_mapping([]))
+    assert "[the intro](../../guide/intro.md#start)" in new
+    assert "{doc}`Setup <../../guide/setup>`" in new
+    assert "[ref]: /img/flow.png" in new
+
+
+def test_spaces_are_quoted_where_markdown_needs_it():
+    text = "[a](a.md) and [b](<b.md>)\n"
+    mapping = path_mapping([("a.md", "with space/a.md"), ("b.md", "with space/b.md")])
+    assert rewrite_links(text, "index.md", "index.md", mapping) == \
+        "[a](with%20space/a.md) and [b](<with space/b.md>)\n"
+
+
+def test_text_without_changes_is_returned_as_is():
+    assert rewrite_links(DOC, "guide/index.md", "guide/index.md", path_mapping([("x", "y")])) is DOC
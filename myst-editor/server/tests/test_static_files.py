@@ -0,0 +1,20 @@
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from static_files import IMMUTABLE, REVALIDATE, CachedStaticFiles
+
+
+def test_only_vite_assets_are_immutable(tmp_path):
+    files = ["assets/yamlLSPWorker-CWDbMF7j.js", "PFXStyle-Override.css", "my-template.json", "index.html"]
+    for rel in files:
+        os.makedirs(os.path.dirname(tmp_path / rel), exist_ok=True)
+        (tmp_path / rel).write_text(rel, encoding="utf-8")
+    app = FastAPI()
+    app.mount("/", CachedStaticFiles(directory=str(tmp_path), html=True))
+    client = TestClient(app)
+
+    assert [client.get("/" + rel).headers["cache-control"] for rel in files] == \
+        [IMMUTABLE, REVALIDATE, REVALIDATE, REVALIDATE]
+    assert client.get("/").headers["cache-control"] == REVALIDATE
@@ -0,0 +1,32 @@
+import pytest
+
+from text_edits import EditError, apply_edits
+
+
+def test_edits_refer_to_the_original_text():
+    assert apply_edits("hello world", [(0, 5, "goodbye"), (6, 11, "moon")]) == "goodbye moon"
+    assert apply_edits("abc", [(1, 1, "X"), (1, 2, "")]) == "aXc"
+    assert apply_edits("abc", []) == "abc"
+
+
+def test_offsets_are_utf16_code_units():
+    # "😀" is two UTF-16 code units, "é" one
+    text = "é😀 end"
+    assert apply_edits(text, [(3, 3, "!")]) == "é😀! end"
+    assert apply_edits(text, [(1, 3, "🎉🎉")]) == "é🎉🎉 end"
+    assert apply_edits(text, [(4, 7, "fin")]) == "é😀 fin"
+
+
+@pytest.mark.parametrize("edits", [
+    [(2, 1, "")],  # backwards
+    [(0, 3, ""), (2, 4, "")],  # overlapping
+    [(5, 9, "")],  # past the end
+])
+def test_edits_that_do_not_fit_are_rejected(edits):
+    with pytest.raises(EditError):
+        apply_edits("short", edits)
+
+
+def test_edit_inside_a_surrogate_pair_is_rejected():
+    with pytest.raises(EditError):
+        apply_edits("a😀b", [(2, 2, "x")])
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import thumbnails
+from thumbnails import ThumbnailCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ThumbnailCache(str(tmp_path / "thumbnails"), 10 * 1024 * 1024)
+
+
+def image(tmp_path, name, size):
+    path = str(tmp_path / name)
+    Image.new("RGB", size, (200, 30, 30)).save(path)
+    return path
+
+
+def test_concurrent_requests_make_one_thumbnail(tmp_path, cache, monkeypatch):
+    source = image(tmp_path, "big.png", (1200, 800))
+    render = cache._render
+    started = threading.Event()
+
+    def slow_render(*args):
+        started.set()
+        threading.Event().wait(0.2)
+        return render(*args)
+
+    monkeypatch.setattr(cache, "_render", slow_render)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.make(source, "ab" * 32, 256)))
+               for _ in range(8)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert cache.stats()["generated"] == 1
+    assert len(set(results)) == 1 and results[0] == cache.path("ab" * 32, 256)
+    assert not cache._making
+    with Image.open(results[0]) as thumb:
+        assert max(thumb.size) == 256
+
+
+def test_small_image_is_opened_once(tmp_path, cache, monkeypatch):
+    source = image(tmp_path, "small.png", (100, 50))
+    opened = []
+    open_image = Image.open
+
+    def counting_open(*args):
+        opened.append(args)
+        return open_image(*args)
+
+    monkeypatch.setattr(thumbnails.Image, "open", counting_open)
+    assert not cache.serves_original("cd" * 32, 128)
+    for _ in range(3):
+        assert cache.make(source, "cd" * 32, 128) is None
+    assert len(opened) == 1
+    assert cache.serves_original("cd" * 32, 128)
+    assert cache.stats()["originals"] == 4
+
@@ -0,0 +1,67 @@
+import io
+import os
+
+import pytest
+
+from uploads import ResumableUploads, UploadTooLarge, save_stream
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return ResumableUploads(str(tmp_path / "staging"), max_bytes=100, ttl_seconds=60)
+
+
+def append(uploads, upload_id, offset, data):
+    with uploads.open_at(upload_id, offset) as f:
+        f.write(data)
+
+
+def test_chunks_resume_from_the_received_offset(uploads):
+    upload = uploads.start("img/a.png", 10, "check")
+    upload_id = upload["upload_id"]
+    assert upload["offset"] == 0
+    append(uploads, upload_id, 0, b"01234")
+    # A retried chunk, or one sent ahead, gets the offset to resume from
+    for offset in (0, 7):
+        with pytest.raises(ValueError) as e:
+            uploads.open_at(upload_id, offset)
+        assert e.value.args[0] == 5
+    with pytest.raises(ValueError):
+        uploads.finish(upload_id)
+
+    append(uploads, upload_id, uploads.status(upload_id)["offset"], b"56789")
+    part_path, meta = uploads.finish(upload_id)
+    assert (meta["path"], meta["size"], meta["offset"]) == ("img/a.png", 10, 10)
+    assert open(part_path, "rb").read() == b"0123456789"
+
+    uploads.discard(upload_id)
+    with pytest.raises(KeyError):
+        uploads.status(upload_id)
+
+
+def test_limits_and_unknown_ids(uploads):
+    with pytest.raises(UploadTooLarge):
+        uploads.start("big.bin", 101, "check")
+    for upload_id in ("0" * 32, "../escape"):
+        with pytest.raises(KeyError):
+            uploads.status(upload_id)
+
+
+def test_expire_removes_stale_uploads(uploads):
+    stale = uploads.start("old.png", 1, "check")["upload_id"]
+    fresh = uploads.start("new.png", 1, "check")["upload_id"]
+    for path in uploads._paths(stale):
+        os.utime(path, (0, 0))
+    uploads.expire()
+    with pytest.raises(KeyError):
+        uploads.status(stale)
+    assert uploads.status(fresh)["offset"] == 0
+
+
+def test_save_stream_is_all_or_nothing(tmp_path):
+    dest = str(tmp_path / "out" / "file.bin")
+    assert save_stream(io.BytesIO(b"x" * 10), dest, max_bytes=10) == 10
+    with pytest.raises(UploadTooLarge):
+        save_stream(io.BytesIO(b"y" * 11), dest, max_bytes=10)
+    assert open(dest, "rb").read() == b"x" * 10
+    assert os.listdir(os.path.dirname(dest)) == ["file.bin"]
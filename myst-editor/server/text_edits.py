@@ -0,0 +1,36 @@
+from typing import Iterable, Tuple
+
+# (from, to, insert): replace [from, to) of the base text, offsets in UTF-16 code units
+Edit = Tuple[int, int, str]
+
+
+class EditError(ValueError):
+    """The edits do not fit the text they were made against."""
+
+
+def apply_edits(text: str, edits: Iterable[Edit]) -> str:
+    """
+    Apply ``edits`` to ``text``. Every edit refers to positions in the original text,
+    as CodeMirror reports them (UTF-16 code units, so a character outside the BMP
+    counts twice). Edits must be sorted and must not overlap.
+    """
+    data = text.encode("utf-16-le")
+    length = len(data) // 2
+    edits = list(edits)
+    end = 0
+    for start, stop, _ in edits:
+        if start < end or stop < start or stop > length:
+            raise EditError(f"Edit {start}-{stop} is out of order or outside the text ({length})")
+        end = stop
+
+    parts = []
+    end = length
+    for start, stop, insert in reversed(edits):
+        parts.append(data[stop * 2:end * 2])
+        parts.append(insert.encode("utf-16-le"))
+        end = start
+    parts.append(data[:end * 2])
+    try:
+        return b"".join(reversed(parts)).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise EditError("Edit splits a surrogate pair") from None
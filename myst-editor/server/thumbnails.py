@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+import metrics
+
+# Longest side of the derivatives served; requests are rounded up to one of these
+SIZES = (128, 256, 512)
+QUALITY = 80
+# The cache is trimmed back to this share of its limit, so it is not trimmed again on the next write
+EVICT_TO = 0.9
+# A hit refreshes an entry's modification time (its age for eviction) at most this often
+TOUCH_SECONDS = 60 * 60
+# Images remembered as served as they are at a size, so they are not opened again on every request
+ORIGINALS_MAX = 10000
+
+
+def fit_size(size: int) -> int:
+    """The smallest fixed size covering ``size``, or the largest."""
+    return next((fixed for fixed in SIZES if fixed >= size), SIZES[-1])
+
+
+class ThumbnailCache:
+    """
+    Resized, recompressed copies of images, stored as ``<content hash>-<size>.webp`` below
+    ``cache_dir``. A changed image has a new hash, so its old thumbnails are never served
+    again; they age out with the rest. The cache is trimmed back under ``max_bytes``,
+    least recently used first, when a write takes it over and whenever ``evict`` runs.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total: Optional[int] = None  # bytes on disk as of the last scan, plus what this worker wrote since
+        self._lock = threading.Lock()
+        self._making: Dict[str, List] = {}  # [lock, requests holding or waiting for it] per thumbnail
+        self._originals: Dict[Tuple[str, int], bool] = {}
+        self._stats = {"hits": 0, "generated": 0, "originals": 0, "evicted": 0, "failed": 0}
+
+    @property
+    def available(self) -> bool:
+        """Whether thumbnails can be made at all (it needs the Pillow package)."""
+        return Image is not None
+
+    def path(self, digest: str, size: int) -> str:
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{size}.webp")
+
+    def cached(self, digest: str, size: int) -> Optional[str]:
+        """The thumbnail if it was made already; counted as a hit."""
+        path = self.path(digest, size)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if time.time() - st.st_mtime > TOUCH_SECONDS:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._stats["hits"] += 1
+        return path
+
+    def serves_original(self, digest: str, size: int) -> bool:
+        """Whether the image was found to need no thumbnail at ``size``; counted as an original served."""
+        with self._lock:
+            if (digest, size) not in self._originals:
+                return False
+            self._stats["originals"] += 1
+        return True
+
+    def make(self, source: str, digest: str, size: int) -> Optional[str]:
+        """
+        The thumbnail of ``source`` (whose content hash is ``digest``), made now if needed.
+        None when the original is as good: small enough already, a vector image, or not
+        something Pillow reads.
+        """
+        key = f"{digest}-{size}"
+        with self._lock:
+            making = self._making.setdefault(key, [threading.Lock(), 0])
+            making[1] += 1
+        # Requests for the same thumbnail wait for the first one instead of making it again; the
+        # lock stays shared until the last of them is done, so none starts over beside another
+        try:
+            with making[0]:
+                if self.serves_original(digest, size):
+                    return None
+                path = self.cached(digest, size)
+                if path is None:
+                    path = self._render(source, digest, size)
+        finally:
+            with self._lock:
+                making[1] -= 1
+                if not making[1]:
+                    del self._making[key]
+        return path
+
+    def _render(self, source: str, digest: str, size: int) -> Optional[str]:
+        if not self.available or source.lower().endswith(".svg"):
+            return self._original(digest, size)
+        try:
+            with Image.open(source) as img:
+                if max(img.size) <= size:
+                    return self._original(digest, size)
+                # JPEG decodes straight at a fraction of its size, far faster than decoding it whole
+                img.draft("RGB", (size, size))
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+                if img.mode not in ("RGB", "RGBA"):
+                    img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+                path = self.path(digest, size)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+                try:
+                    img.save(tmp_path, "WEBP", quality=QUALITY, method=4)
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        except (OSError, ValueError, Image.DecompressionBombError):
+            with self._lock:
+                self._stats["failed"] += 1
+            return None
+        written = os.path.getsize(path)
+        metrics.file_bytes("written", "thumbnails", written)
+        with self._lock:
+            self._stats["generated"] += 1
+            over = self._total is None or self._total + written > self.max_bytes
+            if self._total is not None:
+                self._total += written
+        if over:
+            self.evict()
+        return path
+
+    def _original(self, digest: str, size: int) -> None:
+        with self._lock:
+            self._stats["originals"] += 1
+            if len(self._originals) >= ORIGINALS_MAX:
+                del self._originals[next(iter(self._originals))]
+            self._originals[(digest, size)] = True
+        return None
+
+    def evict(self):
+        """Scan the cache and remove the least recently used thumbnails while it is over its limit."""
+        entries, total = [], 0
+        for folder, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(folder, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        evicted = 0
+        if total > self.max_bytes:
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+        with self._lock:
+            self._total = total
+            self._stats["evicted"] += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "bytes": self._total, "max_bytes": self.max_bytes, "available": self.available}
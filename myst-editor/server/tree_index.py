@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import uuid
+from typing import AbstractSet, List, Optional
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+# ---------------------- TREE INDEX ----------------------
+class TreeIndex:
+    """In-memory mirror of a directory tree, built once and kept current incrementally.
+
+    Serializes to the same nested format as ``scan_dir`` so the left panel does not
+    need to know whether the tree came from the disk or from the index.
+    """
+
+    def __init__(self, base: str, ext_filter: Optional[List[str]] = None):
+        self.base = base
+        self.ext_filter = ext_filter
+        self.version = 0
+        self._lock = threading.RLock()
+        # rel folder path ("" for root) -> {"folders": set of names, "files": set of names}
+        self._dirs = {}
+        # Distinguishes versions of different server runs, so a stale browser cache never matches
+        self._epoch = uuid.uuid4().hex[:8]
+        self._snapshot = None
+
+    # ---------------------- BUILD ----------------------
+    def rebuild(self):
+        with self._lock:
+            self._dirs = {}
+            if os.path.isdir(self.base):
+                self._scan_into("")
+            self._changed()
+
+    def _scan_into(self, rel: str):
+        node = self._dirs.setdefault(rel, {"folders": set(), "files": set()})
+        with os.scandir(self._full(rel)) as it:
+            for entry in it:
+                child = f"{rel}/{entry.name}" if rel else entry.name
+                if entry.is_dir():
+                    node["folders"].add(entry.name)
+                    self._scan_into(child)
+                elif self._accepts(entry.name):
+                    node["files"].add(entry.name)
+
+    def _accepts(self, name: str) -> bool:
+        return not self.ext_filter or os.path.splitext(name)[1].lower() in self.ext_filter
+
+    def _full(self, rel: str) -> str:
+        return os.path.join(self.base, rel) if rel else self.base
+
+    def _rel(self, full_path: str) -> Optional[str]:
+        full_path = os.path.abspath(full_path)
+        if full_path == self.base:
+            return ""
+        if not full_path.startswith(self.base + os.sep):
+            return None
+        return os.path.relpath(full_path, self.base).replace("\\", "/")
+
+    # ---------------------- INCREMENTAL UPDATES ----------------------
+    def refresh(self, full_path: str):
+        """Bring the entry at ``full_path`` in line with the disk (added, removed or unchanged)."""
+        rel = self._rel(full_path)
+        if not rel:
+            return
+        with self._lock:
+            changed = False
+            parent, _, name = rel.rpartition("/")
+            if os.path.isdir(full_path):
+                changed |= self._ensure_folder(parent)
+                if rel not in self._dirs:
+                    self._dirs[parent]["folders"].add(name)
+                    self._scan_into(rel)
+                    changed = True
+            elif os.path.isfile(full_path):
+                changed |= self._ensure_folder(parent)
+                files = self._dirs[parent]["files"]
+                if self._accepts(name) and name not in files:
+                    files.add(name)
+                    changed = True
+            else:
+                changed |= self._remove(rel)
+            if changed:
+                self._changed()
+
+    def _ensure_folder(self, rel: str) -> bool:
+        if rel in self._dirs:
+            return False
+        parent, _, name = rel.rpartition("/")
+        self._ensure_folder(parent)
+        self._dirs[parent]["folders"].add(name)
+        self._dirs[rel] = {"folders": set(), "files": set()}
+        return True
+
+    def _remove(self, rel: str) -> bool:
+        parent, _, name = rel.rpartition("/")
+        node = self._dirs.get(parent)
+        if node is None:
+            return False
+        if name in node["files"]:
+            node["files"].discard(name)
+            return True
+        if name in node["folders"]:
+            node["folders"].discard(name)
+            prefix = rel + "/"
+            for key in [k for k in self._dirs if k == rel or k.startswith(prefix)]:
+                del self._dirs[key]
+            return True
+        return False
+
+    def _changed(self):
+        self.version += 1
+        self._snapshot = None
+
+    # ---------------------- SERIALIZATION ----------------------
+    @property
+    def etag(self) -> str:
+        return f'"tree-{self._epoch}-{self.version}"'
+
+    def to_list(self, rel: str = "", only: Optional[AbstractSet[str]] = None):
+        """Nested entries below ``rel``; with ``only``, just those files and the folders leading to them."""
+        with self._lock:
+            return self._build(rel, only)
+
+    def _build(self, rel: str, only: Optional[AbstractSet[str]] = None):
+        node = self._dirs.get(rel)
+        if node is None:
+            return []
+        entries = []
+        for name in sorted(node["folders"], key=str.lower):
+            path = f"{rel}/{name}" if rel else name
+            children = self._build(path, only)
+            if children or only is None:
+                entries.append({"type": "folder", "name": name, "path": path, "children": children})
+        for name in sorted(node["files"], key=str.lower):
+            path = f"{rel}/{name}" if rel else name
+            if only is None or path in only:
+                entries.append({"type": "file", "name": name, "path": path})
+        return entries
+
+    def snapshot(self):
+        """Return ``(etag, json bytes)`` of the whole tree, serialized once per version."""
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = (self.etag, json.dumps(self._build("")).encode("utf-8"))
+            return self._snapshot
+
+
+# ---------------------- FILESYSTEM WATCHER ----------------------
+class _TreeEventHandler(FileSystemEventHandler):
+    def __init__(self, index: TreeIndex):
+        self.index = index
+
+    def on_any_event(self, event):
+        # Content modifications never change the tree shape
+        if event.event_type not in ("created", "deleted", "moved"):
+            return
+        try:
+            self.index.refresh(os.fsdecode(event.src_path))
+            if event.event_type == "moved":
+                self.index.refresh(os.fsdecode(event.dest_path))
+        except OSError:
+            # The path vanished while being scanned; its own "deleted" event follows
+            pass
+
+
+def start_watcher(index: TreeIndex):
+    observer = Observer()
+    observer.schedule(_TreeEventHandler(index), index.base, recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
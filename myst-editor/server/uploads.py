@@ -0,0 +1,166 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from coordination import FileLock
+
+# Size of the pieces uploads are copied in; nothing larger is held in memory
+COPY_CHUNK = 1024 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+def save_stream(src: BinaryIO, dest: str, max_bytes: Optional[int] = None) -> int:
+    """
+    Copy ``src`` to ``dest`` in chunks through a temporary file in the same folder, then
+    rename it into place, so readers never see a partial file. Returns the number of bytes.
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest), prefix=".upload-", suffix=".part")
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := src.read(COPY_CHUNK):
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                f.write(chunk)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+# ---------------------- REQUEST SIZE LIMIT ----------------------
+class BodySizeLimit:
+    """ASGI middleware rejecting request bodies above a per-path-prefix limit while they stream in."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http":
+            limit = next((size for prefix, size in self.limits.items() if scope["path"].startswith(prefix)), None)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            response = JSONResponse({"error": f"Upload exceeds the limit of {limit} bytes"}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLarge(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# ---------------------- RESUMABLE UPLOADS ----------------------
+class ResumableUploads:
+    """
+    Chunked uploads staged on disk, so a large asset can be sent in pieces and resumed
+    after a dropped connection. Each upload is a ``<id>.part`` file plus ``<id>.json``
+    metadata; the received offset is simply the size of the part file. All state is on
+    disk, so any worker process can take the next chunk.
+    """
+
+    def __init__(self, staging_dir: str, max_bytes: int, ttl_seconds: int):
+        self.staging_dir = staging_dir
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+    def _paths(self, upload_id: str):
+        if not upload_id.isalnum():
+            raise KeyError(upload_id)
+        base = os.path.join(self.staging_dir, upload_id)
+        return base + ".part", base + ".json"
+
+    def start(self, path: str, size: int, action: str) -> dict:
+        if size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, "wb").close()
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"path": path, "size": size, "action": action, "created": time.time()}, f)
+        return {"upload_id": upload_id, "offset": 0, "size": size, "chunk_size": COPY_CHUNK}
+
+    def status(self, upload_id: str) -> dict:
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            meta["offset"] = os.path.getsize(part_path)
+        except FileNotFoundError:
+            raise KeyError(upload_id)
+        meta["upload_id"] = upload_id
+        return meta
+
+    def lock(self, upload_id: str) -> FileLock:
+        """Lock taken while a chunk is appended, so two requests cannot write the same upload at once."""
+        self._paths(upload_id)
+        return FileLock(os.path.join(self.staging_dir, upload_id + ".lock"))
+
+    def open_at(self, upload_id: str, offset: int) -> BinaryIO:
+        """Open the part file for appending at ``offset``; raises ValueError if it is not the received size."""
+        meta = self.status(upload_id)
+        if offset != meta["offset"]:
+            raise ValueError(meta["offset"])
+        return open(self._paths(upload_id)[0], "ab")
+
+    def finish(self, upload_id: str):
+        """Return ``(part path, metadata)`` once every byte has arrived; raises ValueError otherwise."""
+        meta = self.status(upload_id)
+        if meta["offset"] != meta["size"]:
+            raise ValueError(meta["offset"])
+        return self._paths(upload_id)[0], meta
+
+    def discard(self, upload_id: str):
+        for path in (*self._paths(upload_id), os.path.join(self.staging_dir, upload_id + ".lock")):
+            try:
+                os.remove(path)
+            except OSError:
+                # Gone already, or (Windows) a lock still held by a chunk request
+                pass
+
+    def expire(self):
+        """Remove uploads untouched for longer than the TTL."""
+        if not os.path.isdir(self.staging_dir):
+            return
+        cutoff = time.time() - self.ttl_seconds
+        for entry in os.scandir(self.staging_dir):
+            # The part file is touched by every chunk, so it decides for its metadata too
+            part_path = os.path.splitext(entry.path)[0] + ".part"
+            try:
+                last_active = os.path.getmtime(part_path)
+            except FileNotFoundError:
+                last_active = entry.stat().st_mtime
+            if last_active < cutoff:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+import functools
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+class PoolSaturated(Exception):
+    """Raised instead of queueing when a pool already holds its maximum of pending tasks."""
+
+    def __init__(self, pool: str, retry_after: int):
+        super().__init__(f"{pool} pool saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+# ---------------------- WORK POOL ----------------------
+class WorkPool:
+    """Bounded thread pool for one category of blocking work (git reads, disk I/O, ...).
+
+    At most ``max_workers`` tasks run at once and at most ``max_queue`` wait behind them;
+    anything beyond that is rejected with ``PoolSaturated`` so callers can answer 503
+    rather than pile up requests on the event loop.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self._avg_seconds = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f"{name}-pool")
+
+    async def run(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(self.name, self.retry_after())
+            self.pending += 1
+        loop = asyncio.get_running_loop()
+        # Carry the request's context (its profile) into the worker thread
+        task = functools.partial(contextvars.copy_context().run, self._timed, time.perf_counter(), fn, *args, **kwargs)
+        try:
+            return await loop.run_in_executor(self._executor, task)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def offload(self, fn):
+        """Decorator turning a blocking route function into an async one that runs in this pool."""
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(fn, *args, **kwargs)
+        return wrapper
+
+    def _timed(self, submitted: float, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.pool_task(self.name, start - submitted, elapsed)
+            with self._lock:
+                # Exponential moving average, only used to estimate the retry hint
+                self._avg_seconds = elapsed if not self._avg_seconds else 0.9 * self._avg_seconds + 0.1 * elapsed
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (at least 1)."""
+        return max(1, math.ceil(self._avg_seconds * self.pending / self.max_workers))
+
+    def stats(self) -> dict:
+        return {"workers": self.max_workers, "max_queue": self.max_queue, "pending": self.pending,
+                "rejected": self.rejected, "avg_seconds": round(self._avg_seconds, 4)}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,173 @@
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+from watchdog.events import FileSystemEventHandler
+
+import metrics
+
+# Base commits whose status is kept; the file tree only ever compares against a couple
+MAX_BASES = 4
+# Past this many changed paths one full recompute is cheaper than a long pathspec
+MAX_INCREMENTAL_PATHS = 256
+
+
+class _BaseStatus:
+    """Changes of the working tree against one base commit, plus the paths changed since."""
+
+    def __init__(self):
+        # Keyed by the path shown in the tree: new_path, or old_path for deletions
+        self.entries: Dict[str, dict] = {}
+        self.index_stamp = None
+        self.dirty: Set[str] = set()
+        self.complete = False
+
+
+# ---------------------- WORKING TREE STATUS ----------------------
+class WorkingTreeStatus:
+    """Result of ``git diff --name-status <commit>`` plus untracked Markdown files, per base commit.
+
+    The full computation runs once per base commit and again only when the git index
+    changes (staging, commits, checkouts); otherwise only paths reported through ``mark``
+    (filesystem events, the server's own writes) are re-checked.
+    """
+
+    def __init__(self, repo_dir: str, git_dir: str, docs_dir: str):
+        self.repo_dir = repo_dir
+        self.index_path = os.path.join(git_dir, "index")
+        self.docs_dir = docs_dir
+        self.docs_full = os.path.abspath(os.path.join(repo_dir, docs_dir))
+        self._bases: "OrderedDict[str, _BaseStatus]" = OrderedDict()
+        # Serializes recomputation; marking only needs the short-lived one, so watchers never wait on git
+        self._lock = threading.Lock()
+        self._mark_lock = threading.Lock()
+        self._stats = {"full": 0, "incremental": 0, "cached": 0}
+
+    def _git(self, *args) -> str:
+        with metrics.git_command(args[0]):
+            result = subprocess.run(
+                ["git", "--literal-pathspecs", "-C", self.repo_dir, *args],
+                capture_output=True, text=True, encoding="utf-8", errors="replace", check=True,
+            )
+        return result.stdout
+
+    def _index_stamp(self):
+        try:
+            st = os.stat(self.index_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    # ---------------------- INVALIDATION ----------------------
+    def mark(self, full_path: str):
+        """Record that ``full_path`` (file or folder inside the docs folder) may have changed."""
+        rel = os.path.relpath(os.path.abspath(full_path), os.path.abspath(self.repo_dir)).replace("\\", "/")
+        if rel != self.docs_dir and not rel.startswith(self.docs_dir + "/"):
+            return
+        with self._mark_lock:
+            for base in self._bases.values():
+                base.dirty.add(rel)
+
+    # ---------------------- QUERY ----------------------
+    def status(self, commit: str) -> List[dict]:
+        """Changed files under the docs folder against ``commit`` (a full sha)."""
+        with self._lock:
+            with self._mark_lock:
+                base = self._bases.pop(commit, None) or _BaseStatus()
+                self._bases[commit] = base
+                while len(self._bases) > MAX_BASES:
+                    self._bases.popitem(last=False)
+                # Paths marked from here on are picked up by the next call
+                dirty, base.dirty = base.dirty, set()
+
+            stamp = self._index_stamp()
+            # .gitignore changes what counts as untracked anywhere below it
+            if (not base.complete or stamp != base.index_stamp or len(dirty) > MAX_INCREMENTAL_PATHS
+                    or any(path.rsplit("/", 1)[-1] == ".gitignore" for path in dirty)):
+                base.complete = False
+                base.entries = self._collect(commit, [self.docs_dir])
+                base.index_stamp = stamp
+                base.complete = True
+                self._stats["full"] += 1
+            elif dirty:
+                try:
+                    self._update(base, commit, dirty)
+                except Exception:
+                    # Entries for the dirty paths are already gone; start over next time
+                    base.complete = False
+                    raise
+                self._stats["incremental"] += 1
+            else:
+                self._stats["cached"] += 1
+            return list(base.entries.values())
+
+    def _update(self, base: _BaseStatus, commit: str, dirty: Set[str]):
+        # A rename pairs two paths; re-check its other half too so the pair is detected again
+        for entry in base.entries.values():
+            if entry["status"] == "R" and (_touches(entry["old_path"], dirty) or _touches(entry["new_path"], dirty)):
+                dirty.update((entry["old_path"], entry["new_path"]))
+        for key in [key for key, entry in base.entries.items()
+                    if _touches(entry["old_path"], dirty) or _touches(entry["new_path"], dirty)]:
+            del base.entries[key]
+        base.entries.update(self._collect(commit, sorted(dirty)))
+
+    def _collect(self, commit: str, paths: List[str]) -> Dict[str, dict]:
+        entries = {}
+        fields = self._git("diff", "--name-status", "-z", commit, "--", *paths).split("\0")
+        i = 0
+        while i < len(fields) - 1:
+            status = fields[i]
+            if status.startswith(("R", "C")):
+                old, new = fields[i + 1], fields[i + 2]
+                i += 3
+                entries[new] = {"old_path": old, "new_path": new, "status": status[0]}
+            else:
+                path = fields[i + 1]
+                i += 2
+                entries[path] = {
+                    "old_path": path if status != "A" else None,
+                    "new_path": path if status != "D" else None,
+                    "status": status,
+                }
+        # Untracked Markdown files count as added
+        for path in self._git("ls-files", "-z", "--others", "--exclude-standard", "--", *paths).split("\0"):
+            if path.endswith(".md"):
+                entries[path] = {"old_path": None, "new_path": path, "status": "A"}
+        return entries
+
+    def stats(self) -> dict:
+        with self._mark_lock:
+            return dict(self._stats, bases=len(self._bases))
+
+
+def _touches(path: Optional[str], dirty: Set[str]) -> bool:
+    if path is None:
+        return False
+    if path in dirty:
+        return True
+    # A changed folder covers everything below it
+    parts = path.split("/")
+    return any("/".join(parts[:n]) in dirty for n in range(1, len(parts)))
+
+
+# ---------------------- FILESYSTEM WATCHER ----------------------
+class _StatusEventHandler(FileSystemEventHandler):
+    def __init__(self, status: WorkingTreeStatus):
+        self.status = status
+
+    def on_any_event(self, event):
+        if event.event_type in ("opened", "closed_no_write"):
+            return
+        # A folder's own "modified" only echoes changes to its children, which report themselves
+        if event.is_directory and event.event_type == "modified":
+            return
+        self.status.mark(os.fsdecode(event.src_path))
+        if event.event_type == "moved":
+            self.status.mark(os.fsdecode(event.dest_path))
+
+
+def watch_status(observer, status: WorkingTreeStatus):
+    """Mark paths changed on disk, on an existing observer."""
+    observer.schedule(_StatusEventHandler(status), status.docs_full, recursive=True)
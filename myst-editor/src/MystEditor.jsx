@@ -17,6 +17,7 @@ import ErrorModal from "./components/ErrorModal";
 import ErrorBoundary from "./components/ErrorBoundary";
 import { createLogger, Logger } from "./logger";
 import { fetchGitTree } from "./pfx_override/js/leftPanelFileTree.js"
+import { getGitHead, onChangeEvent } from "./pfx_override/js/changeEvents.js";
 
 
 
@@ -159,14 +160,14 @@ const MystEditor = () => {
   const firstRender = useRef(true);
 
   useEffect(() => {
-    fetch("/api/git-head")
-      .then((res) => res.json())
+    getGitHead()
       .then((data) => {
         if (data.active_branch) {
           setHeadBranch(data.active_branch);
         }
       })
       .catch((err) => console.error("Failed to load HEAD branch", err));
+    onChangeEvent("head-moved", (event) => event.active_branch && setHeadBranch(event.active_branch));
   }, []);
 
 
@@ -97,23 +97,10 @@ const Gitdiff = () => {
 
         if (mode === "local") {
           // Compare HEAD vs working tree file
-          const headRes = await fetch("/api/git-head");
-          const headJson = await headRes.json();
-          const headCommit = headJson.head;
-
-          const gitRes = await fetch("/get-file-from-git", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-              filename,
-              branch_left: "", // unused
-              commit_left: headCommit,
-              branch_right: "", // unused
-              commit_right: headCommit,
-            }),
-          });
+          // HEAD is resolved on the server, one request for the committed version
+          const gitRes = await fetch(`/api/git-file?ref=HEAD&filename=${encodeURIComponent(filename)}`);
           const gitJson = await gitRes.json();
-          const headContent = gitJson.right_content ?? "// Failed to fetch HEAD";
+          const headContent = gitJson.content ?? `// ${gitJson.error ?? "Failed to fetch HEAD"}`;
 
           let localContent = text.text.value;
           try {
@@ -1,19 +1,46 @@
-import { ViewPlugin, EditorView } from "@codemirror/view";
-import * as merge from "@codemirror/merge";
+import { ViewPlugin, EditorView, Decoration } from "@codemirror/view";
+import { StateField, StateEffect, ChangeSet } from "@codemirror/state";
 import { mergeCompartment } from "../components/CodeMirror";
+import { onChangeEvent } from "../pfx_override/js/changeEvents.js";
+import { savedVersionOf } from "../pfx_override/js/saveEditorText.js";
 
 // Global plugin instance
 export let pluginInstance = null;
 
-// Custom theme: hide old text and red markers
+// Changed lines are computed on the server (/api/git-line-diff) and only their ranges come back. They are
+// asked for when the diff is shown, after a save and when HEAD moves; edits in between only move them along.
+const setChangedLines = StateEffect.define();
+const changedLineMark = Decoration.line({ class: "cm-gitChangedLine" });
+
+const changedLinesField = StateField.define({
+  create: () => Decoration.none,
+  update(decorations, tr) {
+    decorations = decorations.map(tr.changes);
+    for (const effect of tr.effects) {
+      if (effect.is(setChangedLines)) decorations = effect.value;
+    }
+    return decorations;
+  },
+  provide: (field) => EditorView.decorations.from(field),
+});
+
+// Custom theme: only green markers for added/changed lines
 const onlyGreenTheme = EditorView.baseTheme({
-  ".cm-mergeView .cm-panels": { display: "none" },
-  ".cm-change-deleted": { display: "none" },
-  ".cm-deletedChunk": { display: "none" },
-  ".cm-merge-revert": { display: "none" },
-  ".cm-original": { display: "none" },
+  "&light .cm-gitChangedLine": { backgroundColor: "rgba(136, 221, 136, 0.2)" },
+  "&dark .cm-gitChangedLine": { backgroundColor: "rgba(136, 221, 136, 0.15)" },
 });
 
+// Hunks are [leftStart, leftCount, rightStart, rightCount] with 1-based lines
+function hunksToDecorations(doc, hunks) {
+  const ranges = [];
+  for (const [, , rightStart, rightCount] of hunks) {
+    for (let n = rightStart; n < rightStart + rightCount && n <= doc.lines; n++) {
+      ranges.push(changedLineMark.range(doc.line(n).from));
+    }
+  }
+  return Decoration.set(ranges, true);
+}
+
 let pluginReadyResolve;
 export let pluginReady = new Promise((res) => {
   pluginReadyResolve = res;
@@ -24,7 +51,8 @@ class MystPluginClass {
     this.view = view;
     this.mystEditor = null; // will store the editor instance
     this.isGitdiffMode = false;
-    this.leftContent = ""; // Git HEAD content
+    this.hunks = null; // Changed ranges against Git HEAD, null when not shown
+    this.pending = null; // edits made while changed lines are being fetched, which they are mapped through
     pluginInstance = this;
 
     if (pluginReadyResolve) {
@@ -33,6 +61,10 @@ class MystPluginClass {
     }
   }
 
+  update(update) {
+    if (update.docChanged && this.pending) this.pending.changes = this.pending.changes.compose(update.changes);
+  }
+
   setEditorInstance(mystEditor) {
     this.mystEditor = mystEditor;
   }
@@ -55,44 +87,41 @@ class MystPluginClass {
     const filename = localStorage.getItem("currentPath");
     if (!filename) return;
 
-    const headResp = await fetch("/api/git-head");
-    const headData = await headResp.json();
-    if (!headData.head) return;
+    const view = mystEditor.editorView.v;
+    const doc = view.state.doc;
+    const rightContent = doc.toString();
+    const pending = this.pending = { changes: ChangeSet.empty(doc.length) };
 
-    const diffResp = await fetch("/get-file-from-git", {
+    const lineDiff = (right) => fetch("/api/git-line-diff", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        filename,
-        branch_left: headData.active_branch,
-        commit_left: headData.head,
-        branch_right: headData.active_branch,
-        commit_right: headData.head,
-      }),
-    });
-
-    const diffData = await diffResp.json();
-    const leftContent = diffData.left_content || "";
-    if (leftContent.startsWith("// File not found")) return;
-
-    this.leftContent = leftContent;
-
-    const rightContent = mystEditor.editorView.v.state.doc.toString();
-
-    mystEditor.editorView.v.dispatch({
-      effects: mergeCompartment.reconfigure([
-        merge.unifiedMergeView({
-          original: leftContent,
-          doc: rightContent,
-          mergeControls: false,
-        }),
-        onlyGreenTheme,
-      ]),
+      body: JSON.stringify({ filename, ref: "HEAD", ...right }),
     });
+    // The saved version is enough when the text is what was saved; the server sends a 409 if it forgot it
+    const version = savedVersionOf(rightContent);
+    let diffResp = version ? await lineDiff({ version }) : null;
+    if (!diffResp || diffResp.status === 409) diffResp = await lineDiff({ text: rightContent });
+    if (this.pending !== pending) return; // a newer request is on its way
+    this.pending = null;
+    if (!diffResp.ok || this.isGitdiffMode) return;
+
+    const { hunks } = await diffResp.json();
+    if (this.hunks === null) {
+      view.dispatch({ effects: mergeCompartment.reconfigure([changedLinesField, onlyGreenTheme]) });
+    }
+    this.hunks = hunks;
+    // Typed while waiting: the ranges belong to the text as it was sent
+    const decorations = hunksToDecorations(doc, hunks).map(pending.changes);
+    view.dispatch({ effects: setChangedLines.of(decorations) });
 
     this.updateRevertButton();
   }
 
+  refresh() {
+    if (this.isGitdiffMode || this.hunks === null || !this.mystEditor) return;
+    this.show(this.mystEditor);
+  }
+
   updateRevertButton() {
     if (!this.mystEditor) return;
 
@@ -101,8 +130,7 @@ class MystPluginClass {
     );
 
     if (revertBtn) {
-      const rightContent = this.mystEditor.editorView.v.state.doc.toString();
-      const visible = this.leftContent !== rightContent;
+      const visible = this.hunks !== null && this.hunks.length > 0;
 
       if (revertBtn.visible !== visible) {
         revertBtn.visible = visible;
@@ -114,6 +142,8 @@ class MystPluginClass {
   }
 
   clearMergeView(mystEditor) {
+    this.pending = null;
+    this.hunks = null;
     mystEditor.editorView.v.dispatch({
       effects: mergeCompartment.reconfigure([]),
     });
@@ -129,25 +159,11 @@ class MystPluginClass {
     if (!filename) return;
 
     try {
-      const headResp = await fetch("/api/git-head");
-      const headData = await headResp.json();
-      if (!headData.head) return;
-
-      const diffResp = await fetch("/get-file-from-git", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          filename,
-          branch_left: headData.active_branch,
-          commit_left: headData.head,
-          branch_right: headData.active_branch,
-          commit_right: headData.head,
-        }),
-      });
+      const headResp = await fetch(`/api/git-file?ref=HEAD&filename=${encodeURIComponent(filename)}`);
+      if (!headResp.ok) return;
 
-      const diffData = await diffResp.json();
-      const gitContent = diffData.left_content || "";
-      if (gitContent.startsWith("// File not found")) return;
+      const headData = await headResp.json();
+      const gitContent = headData.content || "";
 
       const view = this.mystEditor.editorView.v;
       const currentDoc = view.state.doc;
@@ -156,7 +172,7 @@ class MystPluginClass {
         selection: { anchor: 0 },
       });
 
-      this.updateRevertButton();
+      this.show(this.mystEditor);
     } catch (error) {
       console.error("Error reverting file:", error);
       alert("Failed to revert file to git version");
@@ -216,23 +232,26 @@ class MystPluginClass {
   }
 
   destroy() { 
+    this.pending = null;
   }
 }
 
-// Plugin instance + live update listener
+// Plugin instance; edits are followed by changedLinesField without asking the server
 export const markChangedLinesPlugin = ViewPlugin.fromClass(MystPluginClass);
-export const mystExtension = [
-  markChangedLinesPlugin,
-  EditorView.updateListener.of((update) => {
-    if (update.docChanged) pluginInstance?.updateRevertButton();
-  }),
-];
+export const mystExtension = [markChangedLinesPlugin];
+
+// A commit or checkout changes what the lines are compared against
+onChangeEvent("head-moved", () => pluginInstance?.refresh());
 
 // Convenience functions
 export function showLatestCommitDiff(mystEditor) {
   pluginInstance?.show(mystEditor);
 }
 
+export function refreshChangedLines() {
+  pluginInstance?.refresh();
+}
+
 export function revertFileChanges() {
   pluginInstance?.revert();
 }
@@ -224,7 +224,8 @@ const defaults = {
     enabled: false,
     commentsEnabled: false,
     resolvingCommentsEnabled: false,
-    wsUrl: "ws://localhost:4444",
+    // The relay built into the editor server (/api/collab/<room>)
+    wsUrl: typeof window !== "undefined" ? `${window.location.protocol === "https:" ? "wss" : "ws"}://${window.location.host}/api/collab` : "",
     username: "",
     room: "0",
     color: "#ff0000",
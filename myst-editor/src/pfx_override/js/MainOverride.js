@@ -3,11 +3,12 @@ import '../css/PFXStyleOverride.css';
 import { setupGitPanel } from "./gitDiffUI.js";
 import "./leftPanelButtons.js";
 import "./leftPanelFileTree.js";
+import "./docSearch.js";
 import "./editorContextMenu.js";
 
 import * as txFormat from "./textFormatButtons.js";
 import { openImagePicker } from "./projectImagePicker.js";
-import { waitForEditorReady, saveCurrentEditorContent, bindFocusBlurHandlers, setLastSavedTimestamp } from "./saveEditorText.js"
+import { waitForEditorReady, saveCurrentEditorContent, bindFocusBlurHandlers, setLastSavedTimestamp, setCollaborationRoom } from "./saveEditorText.js"
 
 import MystEditor, { defaultButtons, autosaveEnabled } from '../../MystEditor.jsx';
 import { showLatestCommitDiff, revertFileChanges, pluginReady, pluginInstance } from "../../extensions/markChangedLines.js";
@@ -48,6 +49,30 @@ function normalizePath(path) {
   return path.replace(/\\/g, '/');
 }
 
+// Documents are edited through the server's collaboration relay when it is turned on (MYST_COLLAB=1, and pycrdt)
+let collabStatus = null;
+function collaborationEnabled() {
+  collabStatus ||= fetch('/api/collab-status')
+    .then((res) => (res.ok ? res.json() : { enabled: false }))
+    .then((status) => status.enabled)
+    .catch(() => false);
+  return collabStatus;
+}
+
+function collaborationUser() {
+  let name = localStorage.getItem('collabUsername');
+  if (!name) {
+    name = `Editor ${Math.floor(Math.random() * 10000)}`;
+    localStorage.setItem('collabUsername', name);
+  }
+  let color = localStorage.getItem('collabColor');
+  if (!color) {
+    color = `hsl(${Math.floor(Math.random() * 360)}, 70%, 45%)`;
+    localStorage.setItem('collabColor', color);
+  }
+  return { name, color };
+}
+
 export async function loadFile(filename) {
   const res = await fetch(`/api/file?path=${encodeURIComponent(normalizePath(filename))}`);
   if (res.status === 404) {
@@ -62,7 +87,7 @@ export async function loadFile(filename) {
   }
 
   const data = await res.json();
-  setLastSavedTimestamp(data.last_modified);
+  setLastSavedTimestamp(data.last_modified, data.version, data.content);
   const old = document.getElementById("myst");
   const newContainer = document.createElement("div");
   newContainer.id = "myst";
@@ -78,6 +103,9 @@ export async function loadFile(filename) {
   document.adoptedStyleSheets = [...document.adoptedStyleSheets, sheet];
 
   const title = filename.split('\\').pop().split('/').pop();
+  const collaborative = await collaborationEnabled();
+  const user = collaborationUser();
+  setCollaborationRoom(collaborative ? normalizePath(filename) : null);
   requestAnimationFrame(async() => {
     mystEditorInstance = MystEditor({
       templatelist: "linkedtemplatelist.json",
@@ -95,9 +123,20 @@ export async function loadFile(filename) {
       ]),
       spellcheckOpts: false,
       syncScroll: true,
+      collaboration: {
+        enabled: collaborative,
+        commentsEnabled: false,
+        resolvingCommentsEnabled: false,
+        wsUrl: `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}/api/collab`,
+        username: user.name,
+        color: user.color,
+        room: normalizePath(filename),
+        mode: "websocket",
+      },
     }, newContainer);
     const view = await waitForEditorReady();
-    bindFocusBlurHandlers(view);
+    // With collaboration the server writes the file itself; the external-change checks would flag its writes
+    if (!collaborative) bindFocusBlurHandlers(view);
     // Wait for plugin to be ready before setting up mode subscription
     await pluginReady;
     // Always re-inject merge view when file loads for non-Gitdiff modes
@@ -0,0 +1,58 @@
+// Server-pushed change notifications (/api/events), shared by the whole UI instead of polling
+
+const listeners = {};
+// path -> last_modified (ms) as last reported by the server, valid only while the stream is open
+const lastModified = new Map();
+let gitHead = null;
+let headReady;
+const headPromise = new Promise((resolve) => (headReady = resolve));
+
+const source = new EventSource("/api/events");
+
+source.onmessage = (message) => {
+  const event = JSON.parse(message.data);
+  switch (event.type) {
+    case "hello":
+    case "resync":
+      // (Re)connected or fell behind: anything cached may have changed unseen
+      lastModified.clear();
+      break;
+    case "file-modified":
+      lastModified.set(event.path, event.last_modified);
+      break;
+  }
+  if (event.type === "hello" || event.type === "head-moved") {
+    gitHead = { head: event.head, active_branch: event.active_branch };
+    headReady(gitHead);
+  }
+  (listeners[event.type] || []).forEach((callback) => callback(event));
+};
+
+export function onChangeEvent(type, callback) {
+  (listeners[type] ||= []).push(callback);
+}
+
+// { head, active_branch }, as pushed by the server; falls back to a request if the stream is down
+export async function getGitHead() {
+  if (gitHead && source.readyState === EventSource.OPEN) return gitHead;
+  if (source.readyState === EventSource.CONNECTING && !gitHead) {
+    const pushed = await Promise.race([headPromise, new Promise((resolve) => setTimeout(resolve, 2000))]);
+    if (pushed) return pushed;
+  }
+  const response = await fetch("/api/git-head");
+  return response.json();
+}
+
+// Modification time of a docs file; asked for once, then kept current by file-modified events
+export async function getLastModified(path) {
+  path = path.replace(/\\/g, '/');
+  const open = source.readyState === EventSource.OPEN;
+  if (open && lastModified.has(path)) return lastModified.get(path);
+
+  const res = await fetch(`/api/file/meta?path=${encodeURIComponent(path)}`);
+  if (!res.ok) return null;
+  const { last_modified } = await res.json();
+  // An event that arrived meanwhile is newer than this answer
+  if (open && !lastModified.has(path)) lastModified.set(path, last_modified);
+  return last_modified;
+}
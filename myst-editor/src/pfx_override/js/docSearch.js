@@ -0,0 +1,84 @@
+import { loadFile } from "./MainOverride.js";
+import { saveCurrentEditorContent, setLastSavedTimestamp } from "./saveEditorText.js";
+import { autosaveEnabled } from '../../MystEditor.jsx';
+
+// ----------------------- Docs Search ----------------------- //
+
+/* Full-text search over the docs (/api/search). While there is a query the results
+replace the file tree; clearing the box brings the tree back. */
+const SEARCH_DELAY_MS = 200;
+
+const input = document.getElementById("doc-search");
+const results = document.getElementById("search-results");
+const tree = document.getElementById("tree");
+let timer = null;
+let latestQuery = "";
+
+function showResults(visible) {
+  results.classList.toggle("hidden", !visible);
+  tree.classList.toggle("hidden", visible);
+}
+
+async function openResult(path) {
+  const currentPath = localStorage.getItem('currentPath');
+  if (autosaveEnabled.value && currentPath && currentPath !== path) {
+    await saveCurrentEditorContent();
+  }
+  setLastSavedTimestamp(null);
+  loadFile(path);
+}
+
+function renderResults(data) {
+  results.innerHTML = "";
+  if (!data.results.length) {
+    results.textContent = "No matches";
+    return;
+  }
+  for (const result of data.results) {
+    const item = document.createElement("div");
+    item.className = "search-result";
+    item.title = result.path;
+
+    const title = document.createElement("div");
+    title.className = "search-result-title";
+    title.textContent = result.title || result.path.split("/").pop();
+    const path = document.createElement("div");
+    path.className = "search-result-path";
+    path.textContent = result.path;
+    const snippet = document.createElement("div");
+    snippet.className = "search-result-snippet";
+    snippet.innerHTML = result.snippet; // escaped by the server, matches in <mark>
+
+    item.append(title, path, snippet);
+    item.onclick = () => openResult(result.path);
+    results.appendChild(item);
+  }
+}
+
+async function runSearch(query) {
+  latestQuery = query;
+  if (!query.trim()) {
+    showResults(false);
+    return;
+  }
+  try {
+    const res = await fetch(`/api/search?q=${encodeURIComponent(query)}&limit=50`);
+    if (!res.ok || query !== latestQuery) return;
+    renderResults(await res.json());
+    showResults(true);
+  } catch (err) {
+    console.error("Search failed:", err);
+  }
+}
+
+input.addEventListener("input", () => {
+  clearTimeout(timer);
+  timer = setTimeout(() => runSearch(input.value), SEARCH_DELAY_MS);
+});
+
+input.addEventListener("keydown", (e) => {
+  if (e.key === "Escape") {
+    input.value = "";
+    runSearch("");
+  }
+});
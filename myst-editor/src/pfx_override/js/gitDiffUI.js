@@ -1,12 +1,15 @@
 import { fetchGitTree } from "./leftPanelFileTree.js";
 
+// Newest-N commits listed per branch in the commit dropdowns
+const COMMIT_LIST_LIMIT = 500;
+
 // Update commit list for a branch
 export function updateCommits(selectedBranch, commitDropdown, gitData, savedCommit = null, suppressEvent = false) {
   if (!selectedBranch || !commitDropdown || !gitData) return;
 
   try {
     const commitsForBranch = gitData.commits[selectedBranch] || [];
-    const total = commitsForBranch.length;
+    const total = gitData.total_commits?.[selectedBranch] ?? commitsForBranch.length;
     const commitItems = commitsForBranch.map(c => ({
       value: c.hash,
       label: (c.summary || c.message || c).split("\n")[0],
@@ -41,7 +44,7 @@ async function fetchGitData() {
   const res = await fetch("/search-file", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ filename: currentPath })
+    body: JSON.stringify({ filename: currentPath, limit: COMMIT_LIST_LIMIT })
   });
   return await res.json();
 }
@@ -1,5 +1,35 @@
 import { fetchLocalTree, activeFolderPath, normalizePath, ignoredFolders, clearActiveStates } from "./leftPanelFileTree.js";
 import { loadFile, insertImageMarkdown } from "./MainOverride.js";
+import { saveCurrentEditorContent } from "./saveEditorText.js";
+import { autosaveEnabled } from '../../MystEditor.jsx';
+
+// ----------------------- Batch File Operations ----------------------- //
+
+/* Applies create / rename / move / delete operations in one request. The server checks the
+whole list first and rolls everything back if one of them fails, so the tree is never left half-changed. */
+async function runBatch(operations) {
+  const res = await fetch("/api/batch", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ operations }),
+  });
+  const data = await res.json();
+  if (!res.ok) throw new Error(data.collision ? "An item with that name already exists" : data.error || res.statusText);
+  return data;
+}
+
+// Keep the open document's path in step with moves of it or of a folder above it
+function followMoves(results, updatedLinks = []) {
+  let currentPath = localStorage.getItem('currentPath') || "";
+  for (const { oldPath, newPath } of results) {
+    if (!oldPath) continue;
+    if (currentPath === oldPath) currentPath = newPath;
+    else if (currentPath.startsWith(oldPath + "/")) currentPath = newPath + currentPath.slice(oldPath.length);
+  }
+  if (currentPath) localStorage.setItem('currentPath', currentPath);
+  // The server rewrote links in the open document: saving merges them into the editor (a manual save does too)
+  if (currentPath && updatedLinks.includes(currentPath) && autosaveEnabled.value) saveCurrentEditorContent();
+}
 
 // ----------------------- Move To Dialog ----------------------- //
 
@@ -64,19 +94,12 @@ function openMoveToDialog(itemPath) {
     }
     const name = itemPath.replace(/\\/g, "/").split("/").pop();
     const newPath = selectedMovePath ? `${selectedMovePath}/${name}` : name;
-    const res = await fetch("/api/rename", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ oldPath: itemPath, newPath }),
-    });
-    if (!res.ok) {
-      alert("Error while moving.");
-    } else {
-      let currentPath = localStorage.getItem('currentPath') || "";
-      if (currentPath === itemPath) {
-        localStorage.setItem('currentPath', newPath);
-      }
+    try {
+      const { results, updatedLinks } = await runBatch([{ op: "move", oldPath: itemPath, newPath }]);
+      followMoves(results, updatedLinks);
       fetchLocalTree();
+    } catch (err) {
+      alert(`Error while moving: ${err.message}`);
     }
     modal.remove();
   };
@@ -147,16 +170,7 @@ document.getElementById("delete").onclick = async () => {
     : `Are you sure you want to delete the file "${path}"?`;
   if (!confirm(confirmText)) return;
   try {
-    const res = await fetch('/api/delete', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ path }),
-    });
-    if (!res.ok) {
-      const error = await res.text();
-      alert(`Error while deleting: ${error}`);
-      return;
-    }
+    await runBatch([{ op: "delete", path }]);
     clearActiveStates();
     let currentPath = localStorage.getItem('currentPath') || "";
     if (currentPath) {
@@ -203,19 +217,13 @@ document.getElementById("rename").onclick = async () => {
   const newName = oldName.endsWith(".md") && !inputName.endsWith(".md")
     ? `${inputName}.md` : inputName;
   const newPath = dirPath ? `${dirPath}/${newName}` : newName;
-  const res = await fetch("/api/rename", {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ oldPath, newPath }),
-  });
-  if (!res.ok) {
-    alert("Rename error.");
+  try {
+    const { results, updatedLinks } = await runBatch([{ op: "rename", oldPath, newPath }]);
+    followMoves(results, updatedLinks);
+  } catch (err) {
+    alert(`Rename error: ${err.message}`);
     return;
   }
-  let currentPath = localStorage.getItem('currentPath') || "";
-  if (currentPath === oldPath) {
-    localStorage.setItem("currentPath", newPath);
-  }
   fetchLocalTree();
 };
 
@@ -1,6 +1,7 @@
 import "./gitDiffUI.js";
 import { loadFile, insertImageMarkdown } from "./MainOverride.js";
 import { saveCurrentEditorContent, setLastSavedTimestamp } from './saveEditorText.js';
+import { getGitHead, onChangeEvent } from "./changeEvents.js";
 import { autosaveEnabled } from '../../MystEditor.jsx';
 import { useContext } from "preact/hooks";
 import { MystState } from "../../mystState.js";
@@ -463,8 +464,7 @@ class TreeOperations {
 
 class TreeAPI {
   static async getHeadCommit() {
-    const response = await fetch("/api/git-head");
-    const { head } = await response.json();
+    const { head } = await getGitHead();
     return head;
   }
 
@@ -579,4 +579,11 @@ export const ignoredFolders = CONFIG.ignoredFolders;
 export let activeFolderPath = treeState.getActiveFolderPath();
 
 // Initialize
-fetchLocalTree(true);
\ No newline at end of file
+fetchLocalTree(true);
+
+// Local mode shows the working tree against HEAD, so either one moving makes it stale
+function refreshLocalTree() {
+  if (localStorage.getItem("gitLeftListToggle") === "false") fetchLocalTree(false);
+}
+onChangeEvent("tree-changed", refreshLocalTree);
+onChangeEvent("head-moved", refreshLocalTree);
\ No newline at end of file
@@ -44,21 +44,52 @@ export function openImagePicker(startFolder = '') {
   imagePickerModal.style.display = 'flex';
   currentFolder = startFolder;
   loadImagePickerFolder(currentFolder);
-  const selectedParts = startFolder ? startFolder.split('/') : [];
-  fetch('/api/image_tree')
-    .then(res => res.json())
-    .then(data => {
-      folderList.innerHTML = '';
-      renderFolderTree(data, folderList, selectedParts);
-    });
+  folderList.innerHTML = '';
+  renderFolderLevel('', folderList, startFolder ? startFolder.split('/') : []);
 }
 
-// Render folders and images in the modal
-function renderFolderTree(nodes, parent, selectedPathParts = []) {
-  const ul = document.createElement("ul");
+const STATIC_ROOT = '_static';
+const IMAGE_EXTS = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg'];
+const PAGE_SIZE = 200;
+
+// One page of a folder level from /api/list; folder is relative to _static
+async function fetchListing(folder, kind, cursor = null) {
+  const params = new URLSearchParams({ path: folder ? `${STATIC_ROOT}/${folder}` : STATIC_ROOT, kind, limit: PAGE_SIZE });
+  if (cursor) params.set('cursor', cursor);
+  if (kind === 'file') IMAGE_EXTS.forEach(ext => params.append('ext', ext));
+  const res = await fetch(`/api/list?${params}`);
+  if (!res.ok) throw new Error('Failed to load list of images/folders');
+  return res.json();
+}
+
+function toStaticPath(path) {
+  return path.slice(STATIC_ROOT.length + 1);
+}
+
+function highlightSelectedFolder() {
+  folderList.querySelectorAll('[data-folder]').forEach(label => {
+    label.style.fontWeight = label.dataset.folder === currentFolder ? 'bold' : '';
+  });
+}
+
+// Render the sub-folders of one folder, fetching deeper levels only when expanded
+async function renderFolderLevel(folder, parent, selectedPathParts = [], cursor = null) {
+  let listing;
+  try {
+    listing = await fetchListing(folder, 'folder', cursor);
+  } catch (err) {
+    alert('Error: ' + err.message);
+    return;
+  }
 
-  for (const node of nodes) {
-    if (node.type !== "folder") continue;
+  let ul = parent.querySelector(':scope > ul');
+  if (!ul) {
+    ul = document.createElement("ul");
+    parent.appendChild(ul);
+  }
+
+  for (const entry of listing.entries) {
+    const nodePath = toStaticPath(entry.path);
 
     const li = document.createElement("li");
     const container = document.createElement("div");
@@ -66,38 +97,45 @@ function renderFolderTree(nodes, parent, selectedPathParts = []) {
     container.style.alignItems = "center";
 
     const toggle = document.createElement("span");
-    toggle.textContent = "➕";
+    toggle.textContent = entry.folders > 0 ? "➕" : "";
     toggle.style.cursor = "pointer";
     toggle.style.width = "20px";
 
     const label = document.createElement("span");
-    label.textContent = node.name;
+    label.textContent = entry.name;
+    label.dataset.folder = nodePath;
     label.style.cursor = "pointer";
     label.style.userSelect = "none";
     label.style.padding = "2px 4px";
 
-    if (node.path === selectedPathParts.join('/')) {
+    if (nodePath === selectedPathParts.join('/')) {
       label.style.fontWeight = "bold";
     }
 
     const subtree = document.createElement("div");
     subtree.style.marginLeft = "16px";
     subtree.style.display = "none";
+    let loaded = false;
 
-    // Expand only matching selectedPathParts
-    const nodeParts = node.path.split('/');
-    const shouldAutoExpand = selectedPathParts.length >= nodeParts.length &&
-                             selectedPathParts.slice(0, nodeParts.length).join('/') === node.path;
-
-    if (shouldAutoExpand) {
+    const expand = () => {
       subtree.style.display = "block";
       toggle.textContent = "➖";
-    }
+      if (!loaded) {
+        loaded = true;
+        renderFolderLevel(nodePath, subtree, selectedPathParts);
+      }
+    };
+
+    // Expand only matching selectedPathParts
+    const nodeParts = nodePath.split('/');
+    const shouldAutoExpand = entry.folders > 0 && selectedPathParts.length > nodeParts.length &&
+                             selectedPathParts.slice(0, nodeParts.length).join('/') === nodePath;
+    if (shouldAutoExpand) expand();
 
     toggle.onclick = () => {
+      if (entry.folders === 0) return;
       if (subtree.style.display === "none") {
-        subtree.style.display = "block";
-        toggle.textContent = "➖";
+        expand();
       } else {
         subtree.style.display = "none";
         toggle.textContent = "➕";
@@ -105,59 +143,82 @@ function renderFolderTree(nodes, parent, selectedPathParts = []) {
     };
 
     label.onclick = () => {
-      currentFolder = node.path;
+      currentFolder = nodePath;
       loadImagePickerFolder(currentFolder);
-      fetch('/api/image_tree')
-        .then(res => res.json())
-        .then(data => {
-          folderList.innerHTML = '';
-          renderFolderTree(data, folderList, node.path.split('/'));
-        });
+      highlightSelectedFolder();
     };
 
     container.appendChild(toggle);
     container.appendChild(label);
     li.appendChild(container);
-
-    if (node.children && node.children.length > 0) {
-      renderFolderTree(node.children, subtree, selectedPathParts);
-    }
-
     li.appendChild(subtree);
     ul.appendChild(li);
   }
-  parent.appendChild(ul);
+
+  if (listing.next_cursor) {
+    const more = document.createElement("li");
+    more.textContent = "…more";
+    more.style.cursor = "pointer";
+    more.onclick = () => {
+      more.remove();
+      renderFolderLevel(folder, parent, selectedPathParts, listing.next_cursor);
+    };
+    ul.appendChild(more);
+  }
 }
 
 function renderImageList(items) {
   if (!imageList) return;
-  imageList.innerHTML = '';
-  items.filter(i => i.type === 'file').forEach(fileItem => {
+  items.forEach(fileItem => {
     const img = document.createElement('img');
-    img.src = `/_static/${fileItem.path}`;
+    // Tiles are 100px wide: a small thumbnail instead of the full image, a larger one on high-density screens
+    const thumbnail = size => `/api/thumbnail?path=${encodeURIComponent(fileItem.path)}&size=${size}`;
+    img.src = thumbnail(128);
+    img.srcset = `${thumbnail(128)} 1x, ${thumbnail(256)} 2x`;
+    img.loading = 'lazy';
     img.style.width = '100px';
     img.style.height = 'fit-content';
     img.style.cursor = 'pointer';
     img.title = fileItem.name;
     img.alt = fileItem.name;
     img.onclick = () => {
-      insertImageMarkdown(`_static/${fileItem.path}`);
+      insertImageMarkdown(fileItem.path);
       imagePickerModal.style.display = 'none';
     };
     imageList.appendChild(img);
   });
 }
 
+// Images of the current folder are fetched a page at a time as the list is scrolled
+let imagesCursor = null;
+let imagesLoading = false;
+
+async function loadImagePage(folder) {
+  imagesLoading = true;
+  try {
+    const listing = await fetchListing(folder, 'file', imagesCursor);
+    // Another folder was picked while waiting
+    if (folder !== currentFolder) return;
+    renderImageList(listing.entries);
+    imagesCursor = listing.next_cursor;
+  } finally {
+    imagesLoading = false;
+  }
+  // Keep going until the list overflows, so there is something to scroll
+  if (imagesCursor && imageList.scrollHeight <= imageList.clientHeight) loadImagePage(folder);
+}
+
 // Load folder content from server and render
 async function loadImagePickerFolder(folder) {
+  if (!imageList) return;
+  imageList.innerHTML = '';
+  imagesCursor = null;
+  imageList.onscroll = () => {
+    const nearBottom = imageList.scrollTop + imageList.clientHeight >= imageList.scrollHeight - 200;
+    if (nearBottom && imagesCursor && !imagesLoading) loadImagePage(folder);
+  };
   try {
-    const res = await fetch(`/api/images_in_folder?folder=${encodeURIComponent(folder)}`);
-    if (!res.ok) {
-      alert('Failed to load list of images/folders');
-      return;
-    }
-    const items = await res.json();
-    renderImageList(items);
+    await loadImagePage(folder);
   } catch (err) {
     alert('Error: ' + err.message);
   }
@@ -1,11 +1,29 @@
 import { autosaveEnabled } from '../../MystEditor.jsx';
 import { mystEditorInstance } from "./MainOverride.js";
+import { getLastModified } from "./changeEvents.js";
+import { refreshChangedLines } from "../../extensions/markChangedLines.js";
 
-// Track last saved timestamp
+// Track last saved timestamp, and the server version and text it belongs to (base of delta saves)
 let lastSavedTimestamp = null;
+let lastSavedVersion = null;
+let lastSavedContent = null;
 
-export function setLastSavedTimestamp(timestamp) {
+export function setLastSavedTimestamp(timestamp, version = null, content = null) {
   lastSavedTimestamp = timestamp;
+  lastSavedVersion = version;
+  lastSavedContent = content;
+}
+
+// Server version of ``content`` if it is the text last loaded or saved, so it need not be sent again
+export function savedVersionOf(content) {
+  return lastSavedVersion && content === lastSavedContent ? lastSavedVersion : null;
+}
+
+// Collaboration room of the open document; while set, the server writes the file from the room
+let collaborationRoom = null;
+
+export function setCollaborationRoom(room) {
+  collaborationRoom = room;
 }
 
 function isAutosaveOn() {
@@ -27,10 +45,8 @@ export async function bindFocusBlurHandlers(view) {
     if (!path) return;
 
     try {
-      const res = await fetch(`/api/file/meta?path=${encodeURIComponent(path)}`); 
-      if (!res.ok) return;
-      const latest = await res.json();
-      if (latest.last_modified && latest.last_modified !== lastSavedTimestamp) {
+      const latest = await getLastModified(path);
+      if (latest && latest !== lastSavedTimestamp) {
         saveCurrentEditorContent();
       }
     } catch (err) {
@@ -107,6 +123,10 @@ export async function bindFocusBlurHandlers(view) {
     if (!path) return;
 
     try {
+      // Only download the file when the server reported a change since the last save
+      const modified = await getLastModified(path);
+      if (!modified || modified === lastSavedTimestamp) return;
+
       const res = await fetch(`/api/file?path=${encodeURIComponent(path)}`);
       if (!res.ok) return;
       const latest = await res.json();
@@ -120,10 +140,10 @@ export async function bindFocusBlurHandlers(view) {
             changes: { from: 0, to: view.state?.doc.length, insert: latest.content },
             selection: { anchor: 0 }
           });
-          lastSavedTimestamp = latest.last_modified;
+          setLastSavedTimestamp(latest.last_modified, latest.version, latest.content);
           saveCurrentEditorContent(true);
         } else {
-          saveCurrentEditorContent(true);
+          saveCurrentEditorContent(true, true);
         }
       }
     } catch (err) {
@@ -146,8 +166,71 @@ export function waitForEditorReady() {
   });
 }
 
+// Single replacement covering everything between the common prefix and suffix, in UTF-16 offsets like CodeMirror's
+function diffEdits(before, after) {
+  let start = 0;
+  const max = Math.min(before.length, after.length);
+  while (start < max && before.charCodeAt(start) === after.charCodeAt(start)) start++;
+  let end = 0;
+  while (end < max - start && before.charCodeAt(before.length - 1 - end) === after.charCodeAt(after.length - 1 - end)) end++;
+  // Never cut a surrogate pair in two
+  if (start > 0 && /[\uD800-\uDBFF]/.test(before[start - 1])) start--;
+  if (end > 0 && /[\uDC00-\uDFFF]/.test(before[before.length - end])) end--;
+  if (start === before.length - end && start === after.length - end) return [];
+  return [{ from: start, to: before.length - end, insert: after.slice(start, after.length - end) }];
+}
+
+// Send only the edits since the last save; null when the server could not apply them
+async function patchFile(path, content) {
+  if (lastSavedVersion === null || lastSavedContent === null) return null;
+  const res = await fetch(`/api/file?path=${encodeURIComponent(path)}`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ base: lastSavedVersion, edits: diffEdits(lastSavedContent, content) }),
+  });
+  return res.ok || res.status === 409 ? res : null;
+}
+
+// Full-body save, conditional on the last saved version unless overwriting
+function postFile(path, content, overwrite = false) {
+  const headers = { 'Content-Type': 'application/json' };
+  if (!overwrite && lastSavedVersion !== null) headers['If-Match'] = `"${lastSavedVersion}"`;
+  return fetch(`/api/file?path=${encodeURIComponent(path)}`, {
+    method: 'POST',
+    headers,
+    body: JSON.stringify({ content }),
+  });
+}
+
+// Put `after` in the editor as the smallest change, unless the text moved on from `before` meanwhile
+function replaceEditorText(view, before, after) {
+  if (view.v.state.doc.toString() !== before) return false;
+  view.v.dispatch({ changes: diffEdits(before, after) });
+  return true;
+}
+
+// Changes saved elsewhere conflict with ours: let the user choose how to go on
+function resolveConflict(view, path, content, conflict) {
+  if (conflict.merged !== null) {
+    const showBoth = confirm(
+      'This file was saved elsewhere with changes that conflict with yours.\n\n' +
+      'OK: show both versions in the editor, between <<<<<<< and >>>>>>> markers.\n' +
+      'Cancel: overwrite the saved file with your version.'
+    );
+    if (showBoth) {
+      if (replaceEditorText(view, content, conflict.merged)) {
+        setLastSavedTimestamp(conflict.last_modified, conflict.version, conflict.content);
+      }
+      return null;
+    }
+  } else if (!confirm('This file was changed or deleted elsewhere since you opened it.\n\nOverwrite it with your version?')) {
+    return null;
+  }
+  return postFile(path, content, true);
+}
+
 // Save current editor content and update timestamp
-export async function saveCurrentEditorContent(manual = false) {
+export async function saveCurrentEditorContent(manual = false, overwrite = false) {
   const view = mystEditorInstance?.editorView;
   if (!view) {
     if (manual) alert("Editor is not ready.");
@@ -157,16 +240,38 @@ export async function saveCurrentEditorContent(manual = false) {
   const content = view.v.state.sliceDoc(0, view.state?.doc.length);
   const path = localStorage.getItem('currentPath');
 
+  // Writing this editor's text would drop what the others in the room typed since; the room is saved instead
+  if (collaborationRoom) {
+    try {
+      const res = await fetch('/api/collab-save', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ path: collaborationRoom })
+      });
+      if (res.ok) refreshChangedLines();
+      else if (manual) alert("Save failed: " + ((await res.json()).error ?? res.status));
+    } catch (err) {
+      if (manual) alert("Save failed: " + err.message);
+    }
+    return;
+  }
+
   try {
-    const res = await fetch(`/api/file?path=${encodeURIComponent(path)}`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ content }),
-    });
+    // Full-body save when there is no known base or the delta could not be applied
+    let res = overwrite
+      ? await postFile(path, content, true)
+      : await patchFile(path, content).catch(() => null) ?? await postFile(path, content);
+    if (res.status === 409) {
+      res = await resolveConflict(view, path, content, await res.json());
+      if (!res) return;
+    }
 
     if (res.ok) {
       const saved = await res.json();
-      setLastSavedTimestamp(saved.last_modified);
+      // A clean merge with changes saved elsewhere: show them, or merge again on the next save if we typed meanwhile
+      if (saved.status === 'merged' && !replaceEditorText(view, content, saved.content)) return;
+      setLastSavedTimestamp(saved.last_modified, saved.version, saved.content ?? content);
+      refreshChangedLines();
     }
   } catch (err) {
     if (manual) alert("Save failed: " + err.message);